@@ -15,8 +15,32 @@ def make_metrics_client(raw_config):
     ``metrics.namespace``
         The root key to namespace all metrics in this application under.
     ``metrics.endpoint``
-        A ``host:port`` pair, e.g. ``localhost:2014``. If an empty string, a
-        client that discards all metrics will be returned.
+        A ``host:port`` pair, e.g. ``localhost:2014``, or the path to a Unix
+        domain datagram socket, e.g. ``/var/run/statsd.sock``. If an empty
+        string, a client that discards all metrics will be returned.
+
+    and optionally:
+
+    ``metrics.aggregate_interval``
+        A timespan, e.g. ``10 seconds``. If set, metrics are aggregated in
+        process and sent at this interval rather than as they happen. See
+        :py:class:`baseplate.metrics.AggregatingTransport`.
+    ``metrics.max_packet_size``
+        The maximum size, in bytes, of each datagram sent. Defaults to
+        :py:data:`baseplate.metrics.DEFAULT_MAX_PACKET_SIZE`.
+    ``metrics.queue_size``
+        If set, metrics are sent from a background thread and up to this many
+        datagrams are queued for it. See
+        :py:class:`baseplate.metrics.QueuedTransport`.
+    ``metrics.shared_memory_path``
+        The path to a file, e.g. ``/dev/shm/myservice-metrics``, shared by
+        every worker process of the application on the host. If set, metrics
+        are aggregated across the workers and sent by one of them every
+        ``metrics.aggregate_interval`` (one second by default). See
+        :py:class:`baseplate.metrics.SharedMemoryTransport`.
+    ``metrics.use_sendmmsg``
+        If ``true``, several datagrams are sent at once with ``sendmmsg(2)``
+        where available. See :py:class:`baseplate.metrics.RawTransport`.
 
     :param dict raw_config: The app configuration which should have settings
         for the metrics client.
@@ -28,11 +52,25 @@ def make_metrics_client(raw_config):
         "metrics": {
             "namespace": config.String,
             "endpoint": config.Optional(config.Endpoint),
+            "aggregate_interval": config.Optional(config.Timespan),
+            "max_packet_size": config.Optional(
+                config.Integer, default=metrics.DEFAULT_MAX_PACKET_SIZE),
+            "queue_size": config.Optional(config.Integer),
+            "shared_memory_path": config.Optional(config.String),
+            "use_sendmmsg": config.Optional(config.Boolean, default=False),
         },
     })
 
     # pylint: disable=no-member
-    return metrics.make_client(cfg.metrics.namespace, cfg.metrics.endpoint)
+    aggregate_interval = None
+    if cfg.metrics.aggregate_interval:
+        aggregate_interval = cfg.metrics.aggregate_interval.total_seconds()
+
+    return metrics.make_client(cfg.metrics.namespace, cfg.metrics.endpoint,
+                               aggregate_interval, cfg.metrics.max_packet_size,
+                               cfg.metrics.queue_size,
+                               cfg.metrics.shared_memory_path,
+                               cfg.metrics.use_sendmmsg)
 
 
 __all__ = [
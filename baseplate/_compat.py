@@ -6,21 +6,112 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import re
 import sys
+import threading
+import weakref
 
 
 if sys.version_info.major == 3:  # pragma: nocover
     import configparser
     import queue
     from io import BytesIO
+    text_type = str
 else:  # pragma: nocover
     import ConfigParser as configparser
     import Queue as queue
     from cStringIO import StringIO as BytesIO
+    text_type = unicode  # pylint: disable=undefined-variable
+
+
+def _contextvars_are_greenlet_local():
+    # greenlets only got their own context in greenlet 0.4.17. before that,
+    # every greenlet in a thread shares one, so concurrent requests in a
+    # gevent server would see each other's context variables.
+    try:
+        import greenlet
+    except ImportError:
+        return True
+    version = tuple(int(part) for part in
+                    re.findall(r"\d+", greenlet.__version__)[:3])
+    return version >= (0, 4, 17)
+
+
+def _current_task():  # pragma: nocover
+    try:
+        from greenlet import getcurrent
+    except ImportError:
+        return threading.current_thread()
+    return getcurrent()
+
+
+class _Token(object):
+    __slots__ = ("var", "old_value")
+
+    def __init__(self, var, old_value):
+        self.var = var
+        self.old_value = old_value
+
+
+_MISSING = object()
+
+
+try:
+    from contextvars import ContextVar as _NativeContextVar
+except ImportError:  # pragma: nocover
+    _NativeContextVar = None
+
+
+class _GreenletContextVar(object):
+    """A minimal stand-in for :py:class:`contextvars.ContextVar`.
+
+    Before Python 3.7 there are no context variables, and before greenlet
+    0.4.17 they aren't separate per greenlet. Values are instead stored
+    per greenlet, or per thread if greenlet isn't installed, which gives
+    the same semantics for thread- or greenlet-per-request servers
+    whether or not gevent patched :py:mod:`threading` before the variable
+    was created.
+
+    """
+    def __init__(self, name, default=_MISSING):
+        self.name = name
+        self.default = default
+        self.values = weakref.WeakKeyDictionary()
+
+    def get(self, default=_MISSING):
+        value = self.values.get(_current_task(), _MISSING)
+        if value is not _MISSING:
+            return value
+        if default is not _MISSING:
+            return default
+        if self.default is not _MISSING:
+            return self.default
+        raise LookupError(self.name)
+
+    def set(self, value):
+        task = _current_task()
+        token = _Token(self, self.values.get(task, _MISSING))
+        self.values[task] = value
+        return token
+
+    def reset(self, token):
+        task = _current_task()
+        if token.old_value is _MISSING:
+            self.values.pop(task, None)
+        else:
+            self.values[task] = token.old_value
+
+
+if _NativeContextVar is not None and _contextvars_are_greenlet_local():
+    ContextVar = _NativeContextVar
+else:  # pragma: nocover
+    ContextVar = _GreenletContextVar
 
 
 __all__ = [
     "configparser",
     "queue",
     "BytesIO",
+    "ContextVar",
+    "text_type",
 ]
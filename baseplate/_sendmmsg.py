@@ -0,0 +1,139 @@
+"""Sending several datagrams with one system call.
+
+Linux's ``sendmmsg(2)`` isn't exposed by the :py:mod:`socket` module, so it
+is called through :py:mod:`ctypes`. On other platforms, or if the call isn't
+available, :py:data:`sendmmsg` is :py:data:`None` and callers should fall
+back to sending datagrams one at a time.
+
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import socket
+import sys
+import threading
+
+
+# the number of messages to preallocate headers for. larger sends are split.
+_CAPACITY = 64
+
+
+class _MsgHdr(ctypes.Structure):
+    _fields_ = [
+        ("msg_name", ctypes.c_void_p),
+        ("msg_namelen", ctypes.c_uint32),
+        ("msg_iov", ctypes.c_void_p),
+        ("msg_iovlen", ctypes.c_size_t),
+        ("msg_control", ctypes.c_void_p),
+        ("msg_controllen", ctypes.c_size_t),
+        ("msg_flags", ctypes.c_int),
+    ]
+
+
+class _MMsgHdr(ctypes.Structure):
+    _fields_ = [
+        ("msg_hdr", _MsgHdr),
+        ("msg_len", ctypes.c_uint),
+    ]
+
+
+class _Headers(object):
+    """Message headers for up to ``_CAPACITY`` single-buffer datagrams.
+
+    Building ctypes structures is far more expensive than the system call
+    they're for, so the headers are built once, each pointing at its own
+    (base, length) pair in a flat array of iovecs, and only the iovecs are
+    filled in for each send.
+
+    """
+    def __init__(self):
+        # an iovec is a pointer followed by a size_t.
+        self.iovecs = (ctypes.c_size_t * (2 * _CAPACITY))()
+        iovecs_address = ctypes.addressof(self.iovecs)
+        iovec_size = 2 * ctypes.sizeof(ctypes.c_size_t)
+        self.messages = (_MMsgHdr * _CAPACITY)(*[
+            ((None, 0, iovecs_address + i * iovec_size, 1, None, 0, 0), 0)
+            for i in range(_CAPACITY)
+        ])
+        self.address = ctypes.addressof(self.messages)
+        self.lock = threading.Lock()
+
+
+def _load_sendmmsg():
+    if not sys.platform.startswith("linux"):
+        return None
+
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        function = libc.sendmmsg
+    except (AttributeError, OSError):  # pragma: nocover
+        return None
+
+    function.argtypes = [
+        ctypes.c_int, ctypes.c_void_p, ctypes.c_uint, ctypes.c_int]
+    function.restype = ctypes.c_int
+    return function
+
+
+_libc_sendmmsg = _load_sendmmsg()
+_shared_headers = _Headers() if _libc_sendmmsg is not None else None
+
+
+def _sendmmsg(fileno, datagrams):
+    """Send datagrams on a connected socket with as few calls as possible.
+
+    :param int fileno: The socket's file descriptor.
+    :param list datagrams: The datagrams to send, each a :py:class:`bytes`.
+    :return: The number of datagrams sent. This is less than requested only
+        if an error occurred after some datagrams were sent.
+    :raises: :py:exc:`socket.error` if no datagrams could be sent.
+
+    """
+    headers = _shared_headers
+    if not headers.lock.acquire(False):
+        # another thread is mid-send, don't wait for it.
+        headers = _Headers()
+        headers.lock.acquire()
+
+    try:
+        sent = 0
+        while sent < len(datagrams):
+            chunk = datagrams[sent:sent + _CAPACITY]
+
+            # point the iovecs into one buffer holding all the datagrams. it
+            # stays alive for the duration of the call because of this name.
+            buf = b"".join(chunk)
+            address = ctypes.cast(ctypes.c_char_p(buf), ctypes.c_void_p).value
+            iovecs = headers.iovecs
+            i = 0
+            for datagram in chunk:
+                size = len(datagram)
+                iovecs[i] = address
+                iovecs[i + 1] = size
+                address += size
+                i += 2
+
+            result = _libc_sendmmsg(fileno, headers.address, len(chunk), 0)
+            if result < 0:
+                error = ctypes.get_errno()
+                if error == errno.EINTR:
+                    continue
+                if sent:
+                    return sent
+                raise socket.error(error, os.strerror(error))
+
+            sent += result
+        return sent
+    finally:
+        headers.lock.release()
+
+
+#: Send a list of datagrams on a connected socket's file descriptor with as
+#: few system calls as possible. :py:data:`None` where not supported.
+sendmmsg = _sendmmsg if _libc_sendmmsg is not None else None
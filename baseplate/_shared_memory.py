@@ -0,0 +1,284 @@
+"""A memory-mapped file divided into per-process slots of numeric entries.
+
+Each process using the segment claims a slot by taking an ``fcntl`` lock on
+its first byte. The lock is released by the kernel when the process exits, so
+the slots of dead processes can be reclaimed. Only a slot's owner appends
+entries to it, so writers never need to coordinate with each other.
+
+Entries are an 8 byte header, a name padded to a multiple of 8 bytes, and a
+fixed number of doubles. An entry is completely written before the slot's
+used size is advanced past it, so readers in other processes only ever see
+whole entries::
+
+    header | slot 0 | slot 1 | ...
+
+    slot: generation, used size, pid | entry | entry | ...
+
+    entry: size, kind, name length | name | doubles
+
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import array
+import contextlib
+import errno
+import fcntl
+import mmap
+import os
+import struct
+
+
+_MAGIC = b"BPSHMEM1"
+_HEADER = struct.Struct(str("=8sII"))
+_HEADER_SIZE = mmap.PAGESIZE
+_SLOT_HEADER = struct.Struct(str("=QQQ"))
+_SLOT_HEADER_SIZE = 64
+_ENTRY_HEADER = struct.Struct(str("=IBBH"))
+_DOUBLE = struct.Struct(str("=d"))
+
+# bytes of the header locked with fcntl to coordinate between processes.
+_LAYOUT_LOCK = 0
+_ELECTION_LOCK = 1
+
+#: The longest name an entry can have, in bytes.
+MAX_NAME_LENGTH = 255
+
+
+# fcntl locks belong to the process, so a process never conflicts with
+# itself. keep track of which slots each segment in this process has taken so
+# several segments on the same file in one process don't share a slot.
+_claims = {"pid": None, "slots": set(), "elected": set()}
+
+
+def _process_claims():
+    if _claims["pid"] != os.getpid():
+        # locks aren't inherited across fork.
+        _claims["pid"] = os.getpid()
+        _claims["slots"] = set()
+        _claims["elected"] = set()
+    return _claims
+
+
+def _try_lock(fd, offset):
+    try:
+        fcntl.lockf(fd, fcntl.LOCK_EX | fcntl.LOCK_NB, 1, offset, os.SEEK_SET)
+    except (IOError, OSError) as exc:
+        if exc.errno in (errno.EACCES, errno.EAGAIN):
+            return False
+        raise
+    return True
+
+
+class SharedSegment(object):
+    """A slotted, memory-mapped file shared between processes.
+
+    The file is created and sized if necessary. Files are sparse, so memory
+    is only used for the parts of slots that have been written to.
+
+    :param str path: The path of the file, ideally on a memory-backed
+        filesystem such as ``/dev/shm``.
+    :param int slot_count: The number of slots.
+    :param int slot_size: The size, in bytes, of each slot.
+    :raises: :py:exc:`ValueError` if the file already exists with a different
+        layout.
+
+    """
+    def __init__(self, path, slot_count, slot_size):
+        self.path = path
+        self.slot_count = slot_count
+        self.slot_size = slot_size
+        self.size = _HEADER_SIZE + slot_count * slot_size
+        self.elected_pid = None
+        self.memory = None
+
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        stat = os.fstat(self.fd)
+        self.key = (stat.st_dev, stat.st_ino)
+
+        with self.layout_lock():
+            if os.fstat(self.fd).st_size < self.size:
+                os.ftruncate(self.fd, self.size)
+            self.memory = mmap.mmap(self.fd, self.size)
+
+            magic, existing_count, existing_size = _HEADER.unpack_from(
+                self.memory, 0)
+            if magic != _MAGIC:
+                existing_count, existing_size = slot_count, slot_size
+                _HEADER.pack_into(
+                    self.memory, 0, _MAGIC, slot_count, slot_size)
+
+        if (existing_count, existing_size) != (slot_count, slot_size):
+            self.close()
+            raise ValueError(
+                "{} has {:d} slots of {:d} bytes, not {:d} of {:d}".format(
+                    path, existing_count, existing_size, slot_count, slot_size))
+
+    def close(self):
+        """Unmap and close the file, releasing any locks held on it."""
+        if self.fd is None:
+            return
+
+        claims = _process_claims()
+        claims["slots"] = set(
+            claim for claim in claims["slots"] if claim[0] != self.key)
+        if self.elected_pid == os.getpid():
+            claims["elected"].discard(self.key)
+        self.elected_pid = None
+        if self.memory is not None:
+            self.memory.close()
+            self.memory = None
+        os.close(self.fd)
+        self.fd = None
+
+    @contextlib.contextmanager
+    def layout_lock(self):
+        """Hold a lock which prevents slots being reset.
+
+        This only excludes other processes.
+
+        """
+        fcntl.lockf(self.fd, fcntl.LOCK_EX, 1, _LAYOUT_LOCK, os.SEEK_SET)
+        try:
+            yield
+        finally:
+            fcntl.lockf(self.fd, fcntl.LOCK_UN, 1, _LAYOUT_LOCK, os.SEEK_SET)
+
+    def elect(self):
+        """Try to become the one process reading this segment.
+
+        Once elected, the process stays elected until it closes the segment
+        or exits.
+
+        :return: Whether or not this process is elected.
+
+        """
+        if self.memory is None:
+            return False
+        if self.elected_pid == os.getpid():
+            return True
+
+        claims = _process_claims()
+        if self.key in claims["elected"]:
+            return False
+        if _try_lock(self.fd, _ELECTION_LOCK):
+            claims["elected"].add(self.key)
+            self.elected_pid = os.getpid()
+            return True
+        return False
+
+    def _slot_offset(self, slot):
+        return _HEADER_SIZE + slot * self.slot_size
+
+    def claim(self):
+        """Claim a free slot and clear it out.
+
+        Slots that have never been claimed are preferred over those left by
+        exited processes.
+
+        :return: The index of the slot, or :py:data:`None` if every slot is in
+            use by a live process.
+
+        """
+        # prefer slots that have never been used so the last metrics written
+        # by exited processes stay around to be read.
+        def was_used(slot):
+            offset = self._slot_offset(slot)
+            return _SLOT_HEADER.unpack_from(self.memory, offset)[0] > 0
+
+        claims = _process_claims()
+        for slot in sorted(range(self.slot_count), key=was_used):
+            if (self.key, slot) in claims["slots"]:
+                continue
+
+            offset = self._slot_offset(slot)
+            if not _try_lock(self.fd, offset):
+                continue
+
+            claims["slots"].add((self.key, slot))
+            with self.layout_lock():
+                generation, _, _ = _SLOT_HEADER.unpack_from(self.memory, offset)
+                _SLOT_HEADER.pack_into(
+                    self.memory, offset, generation + 1, 0, os.getpid())
+            return slot
+        return None
+
+    def append(self, slot, kind, name, count):
+        """Add an entry to a slot this process owns.
+
+        :param int slot: The slot.
+        :param int kind: A number from 0 to 255 identifying the type of entry.
+        :param bytes name: The entry's name.
+        :param int count: The number of doubles to allocate, all zero.
+        :return: The offset of the entry's doubles, or :py:data:`None` if
+            the slot is full or the name is too long.
+
+        """
+        if len(name) > MAX_NAME_LENGTH:
+            return None
+
+        slot_offset = self._slot_offset(slot)
+        generation, used, pid = _SLOT_HEADER.unpack_from(
+            self.memory, slot_offset)
+
+        padded_length = (len(name) + 7) & ~7
+        size = _ENTRY_HEADER.size + padded_length + count * _DOUBLE.size
+        offset = slot_offset + _SLOT_HEADER_SIZE + used
+        if offset + size > slot_offset + self.slot_size:
+            return None
+
+        data_offset = offset + _ENTRY_HEADER.size + padded_length
+        _ENTRY_HEADER.pack_into(self.memory, offset, size, kind, len(name), 0)
+        self.memory[offset + _ENTRY_HEADER.size:data_offset] = (
+            name.ljust(padded_length, b"\0"))
+        self.memory[data_offset:offset + size] = b"\0" * (count * _DOUBLE.size)
+
+        # publish the entry now that it's all there.
+        _SLOT_HEADER.pack_into(
+            self.memory, slot_offset, generation, used + size, pid)
+        return data_offset
+
+    def entries(self, slot):
+        """Yield the ``(kind, name, offset, count)`` of each entry in a slot.
+
+        ``offset`` and ``count`` are the location and number of the entry's
+        doubles.
+
+        """
+        slot_offset = self._slot_offset(slot)
+        _, used, _ = _SLOT_HEADER.unpack_from(self.memory, slot_offset)
+        offset = slot_offset + _SLOT_HEADER_SIZE
+        end = offset + min(used, self.slot_size - _SLOT_HEADER_SIZE)
+        while offset < end:
+            size, kind, name_length, _ = _ENTRY_HEADER.unpack_from(
+                self.memory, offset)
+            if size < _ENTRY_HEADER.size:
+                break  # pragma: nocover
+
+            name_offset = offset + _ENTRY_HEADER.size
+            name = self.memory[name_offset:name_offset + name_length]
+            data_offset = name_offset + ((name_length + 7) & ~7)
+            count = (offset + size - data_offset) // _DOUBLE.size
+            yield kind, name, data_offset, count
+            offset += size
+
+    def read(self, offset, count):
+        """Return ``count`` doubles starting at ``offset`` as an array."""
+        return array.array(
+            str("d"), self.memory[offset:offset + count * _DOUBLE.size])
+
+    def write(self, offset, values):
+        """Overwrite doubles starting at ``offset`` with an array's values."""
+        self.memory[offset:offset + len(values) * _DOUBLE.size] = (
+            values.tostring() if str is bytes else values.tobytes())
+
+    def add(self, offset, delta):
+        """Add to the double at ``offset``."""
+        _DOUBLE.pack_into(
+            self.memory, offset, _DOUBLE.unpack_from(self.memory, offset)[0] + delta)
+
+    def set(self, offset, value):
+        """Overwrite the double at ``offset``."""
+        _DOUBLE.pack_into(self.memory, offset, value)
@@ -0,0 +1,138 @@
+"""Clocks for measuring elapsed time.
+
+Durations measured with the wall clock (:py:func:`time.time`) are thrown off
+whenever the system time is stepped or slewed, e.g. by NTP, and its resolution
+is coarser than is useful for timing fast operations. Everything in Baseplate
+that measures elapsed time does so with a :py:class:`Clock` instead, which
+defaults to a monotonic, high-resolution source.
+
+Components that measure time take an optional ``clock`` argument so a
+:py:class:`FakeClock` can be swapped in for tests and benchmarks::
+
+    clock = FakeClock()
+    policy = RetryPolicy.new(budget=5, clock=clock)
+    clock.advance(2)
+
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import os
+import sys
+import time
+
+
+def _load_clock_gettime_ns():
+    """Return a function which reads ``CLOCK_MONOTONIC`` in nanoseconds.
+
+    Python 2 has no monotonic clock in the standard library, so this calls
+    ``clock_gettime(2)`` through :py:mod:`ctypes`. Returns :py:data:`None` if
+    the call isn't available.
+
+    """
+    import ctypes
+    import ctypes.util
+
+    class _Timespec(ctypes.Structure):
+        _fields_ = [("tv_sec", ctypes.c_long), ("tv_nsec", ctypes.c_long)]
+
+    for library in ("c", "rt"):
+        path = ctypes.util.find_library(library)
+        if path is None:
+            continue
+        try:
+            clock_gettime = ctypes.CDLL(path, use_errno=True).clock_gettime
+        except (OSError, AttributeError):
+            continue
+        break
+    else:
+        return None
+
+    clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(_Timespec)]
+    clock_gettime.restype = ctypes.c_int
+    clock_id = 6 if sys.platform == "darwin" else 1  # CLOCK_MONOTONIC
+
+    def monotonic_ns():
+        spec = _Timespec()
+        if clock_gettime(clock_id, ctypes.byref(spec)) != 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        return spec.tv_sec * 1000000000 + spec.tv_nsec
+    return monotonic_ns
+
+
+if hasattr(time, "perf_counter"):
+    _monotonic = time.perf_counter
+    if hasattr(time, "perf_counter_ns"):
+        _monotonic_ns = time.perf_counter_ns
+    else:  # pragma: nocover
+        def _monotonic_ns():
+            return int(_monotonic() * 1e9)
+else:  # pragma: nocover
+    _monotonic_ns = _load_clock_gettime_ns()
+    if _monotonic_ns is not None:
+        def _monotonic():
+            return _monotonic_ns() / 1e9
+    else:
+        # no monotonic clock to be had, the wall clock is the best there is.
+        _monotonic = time.time
+
+        def _monotonic_ns():
+            return int(time.time() * 1e9)
+
+
+class Clock(object):
+    """Interface for a source of time for measuring durations.
+
+    The values returned by a clock are only meaningful relative to one another
+    and have no relationship to the time of day.
+
+    """
+
+    def now(self):  # pragma: nocover
+        """Return the current time, in seconds, as a float."""
+        raise NotImplementedError
+
+    def now_ns(self):  # pragma: nocover
+        """Return the current time, in integer nanoseconds."""
+        raise NotImplementedError
+
+
+class MonotonicClock(Clock):
+    """A clock that never goes backwards.
+
+    This uses :py:func:`time.perf_counter`, which has nanosecond resolution
+    on most platforms. On Python 2, which doesn't have it, this reads
+    ``CLOCK_MONOTONIC`` with ``clock_gettime(2)`` instead. Only where that
+    isn't available either does it fall back to :py:func:`time.time`, which
+    is not monotonic.
+
+    """
+    now = staticmethod(_monotonic)
+    now_ns = staticmethod(_monotonic_ns)
+
+
+class FakeClock(Clock):
+    """A clock that only moves when told to.
+
+    :param float now: The initial time, in seconds.
+
+    """
+    def __init__(self, now=0.):
+        self.time = now
+
+    def now(self):
+        return self.time
+
+    def now_ns(self):
+        return int(self.time * 1e9)
+
+    def advance(self, seconds):
+        """Move the clock forward by ``seconds``."""
+        self.time += seconds
+
+
+#: The clock used when none is specified.
+default_clock = MonotonicClock()
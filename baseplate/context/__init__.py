@@ -46,6 +46,9 @@ class ContextFactory(object):
 
 
 class ContextObserver(BaseplateObserver):
+    # the application relies on the context object regardless of sampling
+    observe_unsampled = True
+
     def __init__(self, name, context_factory):
         self.name = name
         self.context_factory = context_factory
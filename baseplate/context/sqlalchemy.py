@@ -3,15 +3,23 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
-import threading
-
 from sqlalchemy import event
 from sqlalchemy.orm import Session
 
+from .._compat import ContextVar
 from ..context import ContextFactory
 from ..core import RootSpanObserver
 
 
+class _RequestState(object):
+    __slots__ = ("context_name", "root_span", "current_span")
+
+    def __init__(self, context_name, root_span):
+        self.context_name = context_name
+        self.root_span = root_span
+        self.current_span = None
+
+
 class SQLAlchemyEngineContextFactory(ContextFactory):
     """SQLAlchemy core engine context factory.
 
@@ -37,29 +45,30 @@ class SQLAlchemyEngineContextFactory(ContextFactory):
 
         # i'm not at all thrilled about this. is there another way to get
         # request context into the event handlers without "global" state?
-        self.threadlocal = threading.local()
+        # a context variable at least keeps it correct for asyncio tasks as
+        # well as threads and greenlets.
+        self.request_state = ContextVar("baseplate_sqlalchemy_state")
 
         event.listen(engine, "before_cursor_execute", self.on_before_execute, retval=True)
         event.listen(engine, "after_cursor_execute", self.on_after_execute)
 
     def make_object_for_context(self, name, root_span):
-        self.threadlocal.context_name = name
-        self.threadlocal.root_span = root_span
-        self.threadlocal.current_span = None
+        self.request_state.set(_RequestState(name, root_span))
         return self.engine
 
     # pylint: disable=unused-argument, too-many-arguments
     def on_before_execute(self, conn, cursor, statement, parameters, context, executemany):
         """Handle the engine's before_cursor_execute event."""
         # http://docs.sqlalchemy.org/en/latest/orm/session_basics.html#is-the-session-thread-safe
-        assert self.threadlocal.current_span is None, \
+        state = self.request_state.get()
+        assert state.current_span is None, \
             "sqlalchemy sessions cannot be used concurrently"
 
-        trace_name = "{}.{}".format(self.threadlocal.context_name, "execute")
-        span = self.threadlocal.root_span.make_child(trace_name)
+        trace_name = "{}.{}".format(state.context_name, "execute")
+        span = state.root_span.make_child(trace_name)
         span.annotate("statement", statement)
         span.start()
-        self.threadlocal.current_span = span
+        state.current_span = span
 
         # add a comment to the sql statement with the trace and span ids
         # this is useful for slow query logs and active query views
@@ -70,8 +79,9 @@ class SQLAlchemyEngineContextFactory(ContextFactory):
     # pylint: disable=unused-argument, too-many-arguments
     def on_after_execute(self, conn, cursor, statement, parameters, context, executemany):
         """Handle the engine's after_cursor_execute event."""
-        self.threadlocal.current_span.stop()
-        self.threadlocal.current_span = None
+        state = self.request_state.get()
+        state.current_span.stop()
+        state.current_span = None
 
 
 class SQLAlchemySessionContextFactory(SQLAlchemyEngineContextFactory):
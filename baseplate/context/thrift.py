@@ -98,6 +98,7 @@ class PooledClientProxy(object):
                         prot.trans.set_header("Trace", str(span.trace_id))
                         prot.trans.set_header("Parent", str(span.parent_id))
                         prot.trans.set_header("Span", str(span.id))
+                        prot.trans.set_header("Sampled", "1" if span.sampled else "0")
 
                         client = self.client_cls(prot)
                         method = getattr(client, name)
@@ -4,13 +4,27 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 import collections
+import os
 import random
+import time
+import weakref
 
+from ._compat import ContextVar
+from .clock import default_clock
 from ._utils import warn_deprecated
 
 
 class BaseplateObserver(object):
-    """Interface for an observer that watches Baseplate."""
+    """Interface for an observer that watches Baseplate.
+
+    By default, observers are only notified of requests whose trace was
+    sampled. Observers that need to see every request, e.g. to count them,
+    should set :py:attr:`observe_unsampled` to :py:data:`True`.
+
+    """
+
+    #: Whether this observer should also be notified of unsampled requests.
+    observe_unsampled = False
 
     def on_root_span_created(self, context, root_span):  # pragma: nocover
         """Called when a root span is created.
@@ -28,6 +42,8 @@ class BaseplateObserver(object):
 class SpanObserver(object):  # pragma: nocover
     """Interface for an observer that watches a span."""
 
+    __slots__ = ()
+
     def on_start(self):
         """Called when the observed span is started."""
         pass
@@ -49,6 +65,8 @@ class SpanObserver(object):  # pragma: nocover
 class RootSpanObserver(SpanObserver):
     """Interface for an observer that watches the root span."""
 
+    __slots__ = ()
+
     def on_child_span_created(self, span):  # pragma: nocover
         """Called when a child span is created.
 
@@ -61,7 +79,157 @@ class RootSpanObserver(SpanObserver):
         pass
 
 
-_TraceInfo = collections.namedtuple("_TraceInfo", "trace_id parent_id span_id")
+class SpanRecordObserver(object):  # pragma: nocover
+    """Interface for an observer that receives completed span records.
+
+    Unlike :py:class:`SpanObserver`, which is notified of every event on a
+    span as it happens, a record observer is only called once per span, when
+    it stops, with an immutable :py:class:`SpanRecord` summarizing the span.
+    Record observers are registered on a root span with
+    :py:meth:`RootSpan.register_record_observer` and receive records for the
+    root span and all of its children.
+
+    """
+
+    __slots__ = ()
+
+    def on_span_completed(self, record):
+        """Called when a child span of the observed root span stops.
+
+        :param baseplate.core.SpanRecord record: The completed span.
+
+        """
+        pass
+
+    def on_root_span_completed(self, record):
+        """Called when the observed root span stops.
+
+        This is always the last record delivered for a request.
+
+        :param baseplate.core.SpanRecord record: The completed root span.
+
+        """
+        pass
+
+
+class BufferedSpanRecordObserver(SpanRecordObserver):
+    """A record observer that delivers a whole request's records at once.
+
+    Records for child spans are collected as they complete and handed to
+    :py:meth:`on_trace_completed` along with the root span's record once the
+    request ends.
+
+    :param int max_records: The maximum number of child span records to hold
+        onto. Records beyond this are counted in ``dropped`` and discarded. If
+        :py:data:`None`, there is no limit.
+
+    """
+
+    __slots__ = ("records", "max_records", "dropped")
+
+    def __init__(self, max_records=None):
+        self.records = []
+        self.max_records = max_records
+        self.dropped = 0
+
+    def on_span_completed(self, record):
+        if self.max_records is not None and len(self.records) >= self.max_records:
+            self.dropped += 1
+            return
+        self.records.append(record)
+
+    def on_root_span_completed(self, record):
+        self.records.append(record)
+        self.on_trace_completed(self.records)
+
+    def on_trace_completed(self, records):  # pragma: nocover
+        """Called with all the records of a request when its root span stops.
+
+        :param list records: The :py:class:`SpanRecord` objects for the
+            request. The root span's record is last.
+
+        """
+        raise NotImplementedError
+
+
+_SpanRecord = collections.namedtuple("_SpanRecord",
+    "trace_id parent_id span_id name start_time end_time annotations error "
+    "monotonic_start monotonic_end")
+_SpanRecord.__new__.__defaults__ = (None, None)
+
+
+class SpanRecord(_SpanRecord):
+    """An immutable summary of a completed span.
+
+    ``start_time`` and ``end_time`` are UNIX timestamps in seconds, for
+    placing the span in time. ``monotonic_start`` and ``monotonic_end`` are
+    the same moments read from :py:data:`~baseplate.clock.default_clock`,
+    for measuring durations. ``annotations`` is a tuple of ``(key, value)``
+    pairs in the order they were added and ``error`` is the exception the
+    span stopped with, if any.
+
+    """
+
+    __slots__ = ()
+
+    @property
+    def duration(self):
+        """The span's duration in seconds, or :py:data:`None` if unknown.
+
+        This is measured with the monotonic times, if the record has them.
+
+        """
+        if self.monotonic_start is not None and self.monotonic_end is not None:
+            return self.monotonic_end - self.monotonic_start
+        if self.start_time is not None and self.end_time is not None:
+            return self.end_time - self.start_time
+        return None
+
+
+class RandomIDGenerator(object):
+    """A generator of random 64-bit trace and span IDs.
+
+    IDs come from a :py:class:`random.Random` of the generator's own, seeded
+    from the operating system. It is reseeded in the child after a fork so
+    that prefork workers never hand out the same IDs as their siblings.
+
+    """
+
+    def __init__(self):
+        self._random = random.Random()
+        self._pid = os.getpid()
+
+        # newer pythons can tell us about forks; otherwise we have to check
+        # whether the PID changed every time an ID is generated.
+        if hasattr(os, "register_at_fork"):
+            self._check_pid = False
+            reseed = weakref.WeakMethod(self._reseed)
+            os.register_at_fork(after_in_child=lambda: _call_weak(reseed))
+        else:  # pragma: nocover
+            self._check_pid = True
+
+    def _reseed(self):
+        self._random.seed()
+        self._pid = os.getpid()
+
+    def generate(self):
+        """Return a new random 64-bit integer ID."""
+        if self._check_pid and self._pid != os.getpid():  # pragma: nocover
+            self._reseed()
+        return self._random.getrandbits(64)
+
+
+def _call_weak(weak_method):
+    method = weak_method()
+    if method is not None:
+        method()
+
+
+_default_id_generator = RandomIDGenerator()
+
+
+_TraceInfo = collections.namedtuple(
+    "_TraceInfo", "trace_id parent_id span_id sampled")
 
 
 class TraceInfo(_TraceInfo):
@@ -71,25 +239,43 @@ class TraceInfo(_TraceInfo):
     service should have passed along trace information. This class is used for
     collecting the trace context and passing it along to the root span.
 
+    The ``sampled`` field holds the sampling decision for the trace. It is
+    :py:data:`None` if no decision has been made yet, in which case
+    :py:meth:`Baseplate.make_root_span` will make one locally.
+
     """
+    # pylint: disable=too-many-arguments
+    def __new__(cls, trace_id, parent_id, span_id, sampled=None):
+        return super(TraceInfo, cls).__new__(
+            cls, trace_id, parent_id, span_id, sampled)
+
     @classmethod
-    def new(cls):
+    def new(cls, sampled=None, id_generator=None):
         """Generate IDs for a new initial root span.
 
         This span has no parent and has a random ID. It cannot be correlated
         with any upstream requests.
 
+        :param bool sampled: The sampling decision for the new trace, or
+            :py:data:`None` to leave it undecided.
+        :param baseplate.core.RandomIDGenerator id_generator: Where to get the
+            new ID from. If :py:data:`None`, a shared default is used.
+
         """
-        trace_id = random.getrandbits(64)
-        return cls(trace_id=trace_id, parent_id=None, span_id=trace_id)
+        id_generator = id_generator or _default_id_generator
+        trace_id = id_generator.generate()
+        return cls(trace_id=trace_id, parent_id=None, span_id=trace_id,
+                   sampled=sampled)
 
     @classmethod
-    def from_upstream(cls, trace_id, parent_id, span_id):
+    def from_upstream(cls, trace_id, parent_id, span_id, sampled=None):
         """Build a TraceInfo from individual headers.
 
         :param int trace_id: The ID of the trace.
         :param int parent_id: The ID of the parent span.
         :param int span_id: The ID of this span within the tree.
+        :param bool sampled: The sampling decision made upstream, or
+            :py:data:`None` if the upstream service did not send one.
 
         :raises: :py:exc:`ValueError` if any of the values are inappropriate.
 
@@ -103,7 +289,10 @@ class TraceInfo(_TraceInfo):
         if parent_id is None or not 0 <= parent_id < 2**64:
             raise ValueError("invalid parent_id")
 
-        return cls(trace_id, parent_id, span_id)
+        if sampled is not None:
+            sampled = bool(sampled)
+
+        return cls(trace_id, parent_id, span_id, sampled)
 
 
 class Baseplate(object):
@@ -113,9 +302,21 @@ class Baseplate(object):
     and from this service. See :py:mod:`baseplate.integration` for how to
     integrate it with the application framework you are using.
 
+    :param float sample_rate: The fraction of traces, between 0 and 1, to
+        sample when the upstream service did not make a sampling decision.
+        Unsampled requests are only seen by observers which set
+        :py:attr:`~baseplate.core.BaseplateObserver.observe_unsampled`.
+    :param id_generator: An object with a ``generate`` method returning new
+        64-bit trace and span IDs. If :py:data:`None`, a shared
+        :py:class:`~baseplate.core.RandomIDGenerator` is used.
+
     """
-    def __init__(self):
+    def __init__(self, sample_rate=1.0, id_generator=None):
+        assert 0 <= sample_rate <= 1, "sample_rate must be between 0 and 1"
         self.observers = []
+        self.unsampled_observers = []
+        self.sample_rate = sample_rate
+        self.id_generator = id_generator or _default_id_generator
 
     def register(self, observer):
         """Register an observer.
@@ -124,13 +325,26 @@ class Baseplate(object):
 
         """
         self.observers.append(observer)
+        if getattr(observer, "observe_unsampled", False):
+            self.unsampled_observers.append(observer)
+
+    def _should_sample(self):
+        if self.sample_rate >= 1:
+            return True
+        return random.random() < self.sample_rate
+
+    def configure_logging(self, **kwargs):  # pragma: nocover
+        """Add request context to the logging system.
 
-    def configure_logging(self):  # pragma: nocover
-        """Add request context to the logging system."""
+        Keyword arguments are passed along to
+        :py:class:`~baseplate.diagnostics.logging.LoggingBaseplateObserver`.
+
+        """
         from .diagnostics.logging import LoggingBaseplateObserver
-        self.register(LoggingBaseplateObserver())
+        self.register(LoggingBaseplateObserver(**kwargs))
 
-    def configure_metrics(self, metrics_client):  # pragma: nocover
+    def configure_metrics(self, metrics_client, runtime_metrics_interval=None,
+                          **kwargs):  # pragma: nocover
         """Send timing metrics to the given client.
 
         This also adds a :py:class:`baseplate.metrics.Batch` object to the
@@ -138,12 +352,36 @@ class Baseplate(object):
         your own application-specific metrics. The batch is automatically
         flushed at the end of the request.
 
+        Additional keyword arguments are passed along to
+        :py:class:`~baseplate.diagnostics.metrics.MetricsBaseplateObserver`.
+
         :param baseplate.metrics.Client metrics_client: Metrics client to send
             request metrics to.
+        :param float runtime_metrics_interval: If given, also report the
+            process's resource usage every this many seconds with a
+            :py:class:`~baseplate.diagnostics.runtime.RuntimeMetricsCollector`.
 
         """
         from .diagnostics.metrics import MetricsBaseplateObserver
-        self.register(MetricsBaseplateObserver(metrics_client))
+        self.register(MetricsBaseplateObserver(metrics_client, **kwargs))
+
+        if runtime_metrics_interval:
+            from .diagnostics.runtime import RuntimeMetricsCollector
+            RuntimeMetricsCollector(
+                metrics_client, interval=runtime_metrics_interval)
+
+    def configure_tracing(self, sink, **kwargs):  # pragma: nocover
+        """Export spans from sampled requests to the given sink.
+
+        Spans are buffered in memory and exported in batches in the
+        background. Additional keyword arguments are passed along to
+        :py:class:`~baseplate.diagnostics.tracing.TracingBaseplateObserver`.
+
+        :param baseplate.diagnostics.sinks.Sink sink: Where to send the spans.
+
+        """
+        from .diagnostics.tracing import TracingBaseplateObserver
+        self.register(TracingBaseplateObserver(sink, **kwargs))
 
     def add_to_context(self, name, context_factory):  # pragma: nocover
         """Add an attribute to each request's context object.
@@ -175,6 +413,10 @@ class Baseplate(object):
             request as passed in from upstream. If :py:data:`None`, a new trace
             context will be generated.
 
+        If the trace context carries no sampling decision, one is made here
+        according to the configured ``sample_rate``. Unsampled root spans are
+        only passed to observers that asked to see unsampled requests.
+
         """
 
         if "trace_id" in kwargs:
@@ -188,29 +430,116 @@ class Baseplate(object):
                 span_id=kwargs["span_id"],
             )
         elif trace_info is None:
-            trace_info = TraceInfo.new()
+            trace_info = TraceInfo.new(id_generator=self.id_generator)
+
+        sampled = trace_info.sampled
+        if sampled is None:
+            sampled = self._should_sample()
+
+        if sampled:
+            observers = self.observers
+        else:
+            observers = self.unsampled_observers
 
         root_span = RootSpan(trace_info.trace_id, trace_info.parent_id,
-                             trace_info.span_id, name)
-        for observer in self.observers:
+                             trace_info.span_id, name, sampled=sampled,
+                             id_generator=self.id_generator)
+        for observer in observers:
             observer.on_root_span_created(context, root_span)
         return root_span
 
 
+_current_span = ContextVar("baseplate_current_span", default=None)
+
+
+def current_span():
+    """Return the span that is currently active, if any.
+
+    A span is active from when it is started until it is stopped. The active
+    span is tracked with :py:mod:`contextvars`, so each thread, greenlet, or
+    :py:mod:`asyncio` task sees its own, and tasks started while a span is
+    active see that span as their parent. Where context variables aren't
+    available or, with greenlet older than 0.4.17, aren't separate per
+    greenlet, it is tracked per greenlet or thread instead.
+
+    :rtype: :py:class:`Span` or :py:data:`None`
+
+    """
+    return _current_span.get()
+
+
+def _running(span):
+    # a span stopped while it wasn't the current span, i.e. out of order,
+    # stays in the chain of previous spans until the span started after it
+    # stops too. skip over such spans so they never become current again.
+    while span is not None and span.stopped:
+        span = span.previous_span
+    return span
+
+
+class _Completed(object):
+    """An awaitable which is immediately done.
+
+    This lets the async context manager methods be written without the
+    ``async`` syntax, which is not available in Python 2.
+
+    """
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __await__(self):
+        return self
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        raise StopIteration(self.value)
+
+    next = __next__
+
+
+# shared by every span that has no observers registered. it's immutable so
+# that registering an observer must replace it with a real list.
+_NO_OBSERVERS = ()
+
+
 class Span(object):
-    """A span represents a single RPC within a system."""
+    """A span represents a single RPC within a system.
+
+    The ``sampled`` attribute holds the sampling decision of the trace this
+    span belongs to and should be passed along to downstream services.
 
-    # pylint: disable=invalid-name
-    def __init__(self, trace_id, parent_id, span_id, name):
+    """
+
+    __slots__ = ("trace_id", "parent_id", "id", "name", "sampled", "observers",
+                 "record_observers", "start_time", "monotonic_start",
+                 "annotations", "previous_span", "stopped", "__weakref__")
+
+    # pylint: disable=invalid-name,too-many-arguments
+    def __init__(self, trace_id, parent_id, span_id, name, sampled=True,
+                 record_observers=_NO_OBSERVERS):
         self.trace_id = trace_id
         self.parent_id = parent_id
         self.id = span_id
         self.name = name
-        self.observers = []
+        self.sampled = sampled
+        self.observers = _NO_OBSERVERS
+        self.record_observers = record_observers
+        self.start_time = None
+        self.monotonic_start = None
+        self.annotations = None
+        self.previous_span = None
+        self.stopped = False
 
     def register(self, observer):
         """Register an observer to receive events from this span."""
-        self.observers.append(observer)
+        if self.observers is _NO_OBSERVERS:
+            self.observers = [observer]
+        else:
+            self.observers.append(observer)
 
     def start(self):
         """Record the start of the span.
@@ -221,12 +550,23 @@ class Span(object):
         Spans also support the `context manager protocol`_, for use with
         Python's ``with`` statement. When the context is entered, the span
         calls :py:meth:`start` and when the context is exited it automatically
-        calls :py:meth:`stop`.
+        calls :py:meth:`stop`. The same goes for ``async with`` in coroutines.
+
+        Until it is stopped, the span is returned by :py:func:`current_span`.
+        If spans are stopped out of order, the current span falls back to the
+        most recently started span that is still running.
 
         .. _context manager protocol:
             https://docs.python.org/3/reference/datamodel.html#context-managers
 
         """
+        self.previous_span = _running(_current_span.get())
+        _current_span.set(self)
+
+        if self.record_observers:
+            self.start_time = time.time()
+            self.monotonic_start = default_clock.now()
+
         for observer in self.observers:
             observer.on_start()
 
@@ -241,6 +581,11 @@ class Span(object):
         :param str value: The value of the annotation.
 
         """
+        if self.record_observers:
+            if self.annotations is None:
+                self.annotations = []
+            self.annotations.append((key, value))
+
         for observer in self.observers:
             observer.on_annotate(key, value)
 
@@ -252,9 +597,35 @@ class Span(object):
             normal exit.
 
         """
+        if self.record_observers:
+            self._notify_completed(self._make_record(error))
+
         for observer in self.observers:
             observer.on_stop(error=error)
 
+        self.stopped = True
+        if _current_span.get() is self:
+            _current_span.set(_running(self.previous_span))
+            self.previous_span = None
+
+    def _notify_completed(self, record):
+        for record_observer in self.record_observers:
+            record_observer.on_span_completed(record)
+
+    def _make_record(self, error):
+        return SpanRecord(
+            trace_id=self.trace_id,
+            parent_id=self.parent_id,
+            span_id=self.id,
+            name=self.name,
+            start_time=self.start_time,
+            end_time=time.time(),
+            annotations=tuple(self.annotations or ()),
+            error=error,
+            monotonic_start=self.monotonic_start,
+            monotonic_end=default_clock.now(),
+        )
+
     def __enter__(self):
         self.start()
         return self
@@ -262,6 +633,14 @@ class Span(object):
     def __exit__(self, exc_type, value, traceback):
         self.stop(error=value)
 
+    def __aenter__(self):
+        self.start()
+        return _Completed(self)
+
+    def __aexit__(self, exc_type, value, traceback):
+        self.stop(error=value)
+        return _Completed(None)
+
 
 class RootSpan(Span):
     """A root span represents a request this server is handling.
@@ -271,10 +650,44 @@ class RootSpan(Span):
 
     """
 
+    __slots__ = ("id_generator",)
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, trace_id, parent_id, span_id, name, sampled=True,
+                 id_generator=None):
+        super(RootSpan, self).__init__(
+            trace_id, parent_id, span_id, name, sampled)
+        self.id_generator = id_generator or _default_id_generator
+
+    def register_record_observer(self, observer):
+        """Register an observer to receive records of completed spans.
+
+        The observer will receive a :py:class:`SpanRecord` for each child span
+        of this root span created after registration, and one for the root
+        span itself.
+
+        :param baseplate.core.SpanRecordObserver observer: An observer.
+
+        """
+        if self.record_observers is _NO_OBSERVERS:
+            self.record_observers = [observer]
+        else:
+            self.record_observers.append(observer)
+
+    def _notify_completed(self, record):
+        for record_observer in self.record_observers:
+            record_observer.on_root_span_completed(record)
+
     def make_child(self, name):
         """Return a child span representing an outbound service call."""
-        span_id = random.getrandbits(64)
-        span = Span(self.trace_id, self.id, span_id, name)
+        span_id = self.id_generator.generate()
+        span = Span(self.trace_id, self.id, span_id, name, self.sampled,
+                    self.record_observers)
+        if not self.observers:
+            # nobody is watching this request (e.g. it wasn't sampled), so
+            # skip the observer fan-out entirely.
+            return span
+
         for observer in self.observers:
             observer.on_child_span_created(span)
         return span
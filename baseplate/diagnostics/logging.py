@@ -3,9 +3,15 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import atexit
+import collections
+import importlib
+import logging
+import sys
 import threading
+import time
 
-from ..core import BaseplateObserver
+from ..core import BaseplateObserver, current_span
 
 
 class LoggingBaseplateObserver(BaseplateObserver):
@@ -15,6 +21,133 @@ class LoggingBaseplateObserver(BaseplateObserver):
     log formatters can give more informative logs. Currently, this just sets
     the thread name to the current request's trace ID.
 
+    If log records get the trace ID from a :py:class:`TraceIdFilter` instead,
+    renaming the thread is unnecessary and can be turned off.
+
+    :param bool rename_thread: Whether or not to set the thread name to the
+        current request's trace ID.
+
     """
+    observe_unsampled = True
+
+    def __init__(self, rename_thread=True):
+        self.rename_thread = rename_thread
+
     def on_root_span_created(self, context, root_span):  # pragma: nocover
-        threading.current_thread().name = str(root_span.trace_id)
+        if self.rename_thread:
+            threading.current_thread().name = str(root_span.trace_id)
+
+
+class TraceIdFilter(logging.Filter):
+    """Add the trace ID of the current request to log records.
+
+    The ID of the trace that :py:func:`~baseplate.core.current_span` belongs
+    to is added to each record as ``trace_id``, or ``-`` outside of requests,
+    for use in format strings like ``%(trace_id)s``. Add the filter to a
+    handler, rather than a logger, so it sees records from every logger.
+
+    """
+
+    def filter(self, record):
+        span = current_span()
+        record.trace_id = span.trace_id if span is not None else "-"
+        return True
+
+
+def _native_threads():
+    # a writer on a greenlet would block the whole hub when the stream does,
+    # so get at real threads even if gevent has patched them.
+    thread_module = "thread" if sys.version_info.major == 2 else "_thread"
+    monkey = sys.modules.get("gevent.monkey")
+    if monkey is not None:
+        start_new_thread, allocate_lock = monkey.get_original(
+            thread_module, ["start_new_thread", "allocate_lock"])
+        sleep = monkey.get_original("time", "sleep")
+    else:
+        module = importlib.import_module(thread_module)
+        start_new_thread, allocate_lock = (
+            module.start_new_thread, module.allocate_lock)
+        sleep = time.sleep
+    return start_new_thread, allocate_lock, sleep
+
+
+class NonBlockingHandler(logging.Handler):
+    """A log handler which writes from a background thread.
+
+    Logging to a stream, such as a pipe to a log shipper, blocks the caller
+    whenever the stream's reader falls behind. This handler instead formats
+    each record as it's logged and puts the text in a bounded in-memory
+    queue. A dedicated operating system thread, even if gevent has patched
+    :py:mod:`threading`, writes queued lines out every ``poll_interval``
+    seconds. A stalled stream then only stalls that thread.
+
+    If the queue is full, records are dropped and counted in ``dropped``. The
+    number dropped is written out along with the next lines.
+
+    Queued lines are written out at exit, but are lost if the process dies
+    abruptly.
+
+    :param stream: The stream to write to. Defaults to :py:data:`sys.stderr`.
+    :param int max_queue_size: The maximum number of lines to queue.
+    :param float poll_interval: How long, in seconds, the writer waits when
+        the queue is empty.
+
+    """
+    def __init__(self, stream=None, max_queue_size=10000, poll_interval=.05):
+        logging.Handler.__init__(self)
+        self.stream = stream if stream is not None else sys.stderr
+        self.max_queue_size = max_queue_size
+        self.poll_interval = poll_interval
+
+        # a deque because it's safe to use across threads without locks,
+        # which would be gevent's locks if threading is patched.
+        self.queue = collections.deque()
+        self.dropped = 0
+        self.reported_dropped = 0
+        self.failed = 0
+
+        start_new_thread, allocate_lock, self.sleep = _native_threads()
+        self.write_lock = allocate_lock()
+        start_new_thread(self._write_forever, ())
+
+        atexit.register(self.flush)
+
+    def emit(self, record):
+        if len(self.queue) >= self.max_queue_size:
+            self.dropped += 1
+            return
+
+        try:
+            self.queue.append(self.format(record))
+        except Exception:  # pylint: disable=broad-except
+            self.handleError(record)
+
+    def flush(self):
+        """Write out all queued lines."""
+        with self.write_lock:
+            lines = []
+            while self.queue:
+                lines.append(self.queue.popleft())
+
+            dropped = self.dropped - self.reported_dropped
+            if dropped:
+                lines.append(
+                    "{:d} log records were dropped because the log queue was "
+                    "full.".format(dropped))
+                self.reported_dropped += dropped
+
+            if not lines:
+                return
+
+            try:
+                self.stream.write("\n".join(lines) + "\n")
+                self.stream.flush()
+            except Exception:  # pylint: disable=broad-except
+                # there's nowhere left to report this.
+                self.failed += len(lines)
+
+    def _write_forever(self):  # pragma: nocover
+        while True:
+            if not self.queue:
+                self.sleep(self.poll_interval)
+            self.flush()
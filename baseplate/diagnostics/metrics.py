@@ -3,7 +3,11 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
-from ..core import BaseplateObserver, SpanObserver
+import collections
+import weakref
+
+from ..core import BaseplateObserver, BufferedSpanRecordObserver, SpanObserver
+from ..metrics import MAX_CACHED_NAMES
 
 
 class MetricsBaseplateObserver(BaseplateObserver):
@@ -18,23 +22,240 @@ class MetricsBaseplateObserver(BaseplateObserver):
     The batch is accessible to your application during requests as the
     ``metrics`` attribute on the :term:`context object`.
 
+    Metrics are collected for every request, whether or not its trace was
+    sampled.
+
+    If ``report_critical_path`` is enabled, each request's wall time is also
+    broken down (see :py:func:`critical_path`) into timers named
+    ``server.<route>.self_time``, ``server.<route>.downstream_critical``, and
+    ``server.<route>.downstream_total``. Comparing these shows whether
+    speeding up local code, or making more downstream calls concurrently,
+    would actually cut the request's latency.
+
     :param baseplate.metrics.Client client: The client where metrics will be
         sent.
+    :param bool report_critical_path: Whether or not to report the breakdown
+        of each request's time.
+    :param bool histograms: Whether or not to record the ``server.*`` and
+        ``clients.*`` timings into :py:class:`~baseplate.metrics.Histogram`
+        metrics rather than timers. This only has an effect if the client
+        aggregates metrics.
+    :param bool deterministic_sampling: Whether or not to base the sampling
+        decisions for sampled metrics in each request's batch on its trace ID
+        so that they are kept or dropped together.
+    :param bool reuse_batches: Whether or not to reuse each request's batch,
+        and the observers timing its spans, for later requests once it has
+        been flushed rather than making new ones for every request. This
+        saves allocating a handful of objects per request, but means the
+        application must not hold onto the batch or use it after the request
+        ends, e.g. from a greenlet that outlives the request. A request's observers are kept only once
+        its root span has been stopped and garbage collected, and at most
+        ``MAX_POOLED_OBSERVERS`` of each kind are kept.
 
     """
-    def __init__(self, client):
+    observe_unsampled = True
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, client, report_critical_path=False, histograms=False,
+                 deterministic_sampling=False, reuse_batches=False):
         self.client = client
+        self.report_critical_path = report_critical_path
+        self.histograms = histograms
+        self.deterministic_sampling = deterministic_sampling
+        self.pool = _ObserverPool() if reuse_batches else None
 
     def on_root_span_created(self, context, root_span):
-        context.metrics = self.client.batch()
-        observer = MetricsRootSpanObserver(context.metrics, "server." + root_span.name)
+        trace_id = root_span.trace_id if self.deterministic_sampling else None
+        pool = self.pool
+        if pool is not None:
+            name = pool.server_name(root_span.name)
+            try:
+                observer = pool.root_observers.pop()
+            except IndexError:
+                observer = None
+            else:
+                observer.reset(name, trace_id)
+        else:
+            name = "server." + root_span.name
+            observer = None
+
+        if observer is None:
+            if trace_id is not None:
+                batch = self.client.batch(trace_id=trace_id)
+            else:
+                batch = self.client.batch()
+            observer = MetricsRootSpanObserver(
+                batch, name, self.histograms, pool)
+
+        if pool is not None:
+            # only reuse the observer once nothing can reach it through the
+            # span anymore, e.g. a late make_child after the request ended.
+            observer.span_ref = weakref.ref(root_span, observer.release)
+
+        context.metrics = observer.batch
         root_span.register(observer)
 
+        if self.report_critical_path:
+            root_span.register_record_observer(
+                CriticalPathRecordObserver(context.metrics, name))
+
+
+#: The most observers of each kind that an observer with ``reuse_batches``
+#: keeps around for reuse. Any more than that are left to be garbage collected.
+MAX_POOLED_OBSERVERS = 256
+
+
+class _ObserverPool(object):
+    """Span observers, and the names they use, kept for reuse."""
+
+    __slots__ = ("root_observers", "span_observers", "server_names",
+                 "client_names", "max_size")
+
+    def __init__(self, max_size=MAX_POOLED_OBSERVERS):
+        self.root_observers = []
+        self.span_observers = []
+        self.server_names = {}
+        self.client_names = {}
+        self.max_size = max_size
+
+    def release_root(self, observer):
+        if len(self.root_observers) < self.max_size:
+            self.root_observers.append(observer)
+
+    def release_span(self, observer):
+        if len(self.span_observers) < self.max_size:
+            self.span_observers.append(observer)
+
+    @staticmethod
+    def _prefixed(names, prefix, name):
+        try:
+            return names[name]
+        except KeyError:
+            prefixed = prefix + name
+            if len(names) < MAX_CACHED_NAMES:
+                names[name] = prefixed
+            return prefixed
+
+    def server_name(self, name):
+        return self._prefixed(self.server_names, "server.", name)
+
+    def client_name(self, name):
+        return self._prefixed(self.client_names, "clients.", name)
+
+
+_CriticalPath = collections.namedtuple("_CriticalPath",
+    "duration self_time downstream_critical downstream_total")
+
+
+class CriticalPath(_CriticalPath):
+    """A breakdown of where a request's wall time went.
+
+    All values are in seconds. ``downstream_critical`` is the time during
+    which at least one direct child span was running, i.e. the part of the
+    request spent waiting on downstream calls. ``self_time`` is the rest of
+    ``duration``, spent in the request's own code. ``downstream_total`` is
+    the sum of the direct child spans' durations; the more it exceeds
+    ``downstream_critical``, the more those calls overlapped.
+
+    """
+
+    __slots__ = ()
+
+
+def _interval(record):
+    if record.monotonic_end is not None:
+        return record.monotonic_start, record.monotonic_end
+    return record.start_time, record.end_time
+
+
+def critical_path(records):
+    """Compute the :py:class:`CriticalPath` of a completed request.
+
+    Times are measured with the records' monotonic times, if they have them,
+    so the results add up with timers measured by the metrics observers.
+
+    :param list records: The request's :py:class:`~baseplate.core.SpanRecord`
+        objects. The root span's record is last.
+
+    """
+    root = records[-1]
+    root_start, root_end = _interval(root)
+    if root_start is None:
+        root_start = root_end
+    duration = root_end - root_start
+
+    intervals = []
+    total = 0.
+    for record in records[:-1]:
+        record_start, record_end = _interval(record)
+        if record.parent_id != root.span_id or record_start is None:
+            continue
+        total += record_end - record_start
+        start = max(record_start, root_start)
+        end = min(record_end, root_end)
+        if end > start:
+            intervals.append((start, end))
+    intervals.sort()
+
+    critical = 0.
+    current_start = current_end = None
+    for start, end in intervals:
+        if current_end is None or start > current_end:
+            if current_end is not None:
+                critical += current_end - current_start
+            current_start, current_end = start, end
+        elif end > current_end:
+            current_end = end
+    if current_end is not None:
+        critical += current_end - current_start
+
+    return CriticalPath(
+        duration=duration,
+        self_time=duration - critical,
+        downstream_critical=critical,
+        downstream_total=total,
+    )
+
+
+class CriticalPathRecordObserver(BufferedSpanRecordObserver):
+    """Reports the :py:class:`CriticalPath` of a request to a metrics batch.
+
+    :param baseplate.metrics.Batch batch: The request's metrics batch.
+    :param str name: The prefix for the timers' names.
+
+    """
+
+    __slots__ = ("batch", "name")
+
+    def __init__(self, batch, name, max_records=1000):
+        super(CriticalPathRecordObserver, self).__init__(max_records)
+        self.batch = batch
+        self.name = name
+
+    def on_trace_completed(self, records):
+        breakdown = critical_path(records)
+        self.batch.timer(self.name + ".self_time").send(breakdown.self_time)
+        self.batch.timer(self.name + ".downstream_critical").send(
+            breakdown.downstream_critical)
+        self.batch.timer(self.name + ".downstream_total").send(
+            breakdown.downstream_total)
+
 
 class MetricsSpanObserver(SpanObserver):
-    def __init__(self, batch, name):
+    __slots__ = ("batch", "timer", "pool")
+
+    def __init__(self, batch, name, histogram=False, pool=None):
         self.batch = batch
-        self.timer = batch.timer(name)
+        self.pool = pool
+        if histogram:
+            self.timer = batch.histogram(name)
+        else:
+            self.timer = batch.timer(name)
+
+    def reset(self, batch, name):
+        """Prepare the observer to time another span."""
+        self.batch = batch
+        batch.reset_timer(self.timer, name)
 
     def on_start(self):
         self.timer.start()
@@ -44,13 +265,47 @@ class MetricsSpanObserver(SpanObserver):
 
     def on_stop(self, error):
         self.timer.stop()
+        if self.pool is not None:
+            self.pool.release_span(self)
 
 
 class MetricsRootSpanObserver(MetricsSpanObserver):
+    __slots__ = ("histogram", "span_ref")
+
+    def __init__(self, batch, name, histogram=False, pool=None):
+        super(MetricsRootSpanObserver, self).__init__(
+            batch, name, histogram, pool)
+        self.histogram = histogram
+        self.span_ref = None
+
+    def reset(self, name, trace_id=None):  # pylint: disable=arguments-differ
+        """Prepare the observer and its flushed batch for another request."""
+        self.batch.reset(trace_id)
+        super(MetricsRootSpanObserver, self).reset(self.batch, name)
+
     def on_child_span_created(self, span):  # pragma: nocover
-        observer = MetricsSpanObserver(self.batch, "clients." + span.name)
+        pool = self.pool
+        if pool is None:
+            observer = MetricsSpanObserver(
+                self.batch, "clients." + span.name, self.histogram)
+        else:
+            name = pool.client_name(span.name)
+            try:
+                observer = pool.span_observers.pop()
+            except IndexError:
+                observer = MetricsSpanObserver(
+                    self.batch, name, self.histogram, pool)
+            else:
+                observer.reset(self.batch, name)
         span.register(observer)
 
     def on_stop(self, error):
-        super(MetricsRootSpanObserver, self).on_stop(error)
+        self.timer.stop()
         self.batch.flush()
+
+    def release(self, span_ref):  # pylint: disable=unused-argument
+        """Return the observer to the pool once its root span is gone."""
+        self.span_ref = None
+        # a request that never finished may have left metrics in the batch.
+        if self.timer.stopped:
+            self.pool.release_root(self)
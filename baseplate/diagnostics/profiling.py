@@ -0,0 +1,182 @@
+"""Sampling profiler for finding out where slow requests spend their CPU.
+
+The profiler interrupts the process with ``SIGPROF`` at a regular interval of
+consumed CPU time and records the Python stack that was executing, attributed
+to the request whose span was active at the time. Stacks from requests that
+turn out to be slow are aggregated per root span name and periodically
+written out in the "folded" format understood by `FlameGraph`_::
+
+    route_name;outer_function (app.py:10);inner_function (app.py:20) 42
+
+.. _FlameGraph: https://github.com/brendangregg/FlameGraph
+
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import collections
+import logging
+import signal
+import threading
+import time
+
+from ..clock import default_clock
+from ..core import BaseplateObserver, RootSpan, RootSpanObserver, current_span
+
+
+logger = logging.getLogger(__name__)
+
+
+def fold_stack(frame, max_depth=64):
+    """Return the stack ending at ``frame`` as a folded stack string.
+
+    Frames are listed outermost first and separated by semicolons. Stacks
+    deeper than ``max_depth`` are truncated at the outer end.
+
+    """
+    names = []
+    while frame is not None and len(names) < max_depth:
+        code = frame.f_code
+        names.append("{} ({}:{:d})".format(
+            code.co_name, code.co_filename, code.co_firstlineno))
+        frame = frame.f_back
+    names.reverse()
+    return ";".join(names)
+
+
+def _request_key(span):
+    # parallel calls from one upstream request share a trace id, so requests
+    # are told apart by their root span's id. only root spans make children.
+    if isinstance(span, RootSpan):
+        return (span.trace_id, span.id)
+    return (span.trace_id, span.parent_id)
+
+
+class ProfilingBaseplateObserver(BaseplateObserver):
+    """Sampling profiler observer.
+
+    While a request's root span is open, CPU samples taken while any of its
+    spans is the :py:func:`~baseplate.core.current_span` are counted against
+    it. When a request that took at least ``threshold`` seconds ends, its
+    samples are merged into an aggregate for its root span name, which is
+    written to the sink every ``flush_interval`` seconds and then reset.
+
+    Samples are taken with ``SIGPROF``, so only code running on the main
+    thread (which includes all greenlets in a gevent server) is profiled and
+    the observer must be created on the main thread. The signal handler does
+    nothing unless a request is in flight, and the interval is measured in
+    CPU time, so an idle worker is never interrupted.
+
+    This observer sees every request, whether or not its trace was sampled.
+
+    :param baseplate.diagnostics.sinks.Sink sink: Where to write the folded
+        stacks.
+    :param float interval: The amount of CPU time, in seconds, between
+        samples.
+    :param float threshold: The minimum duration, in seconds, of a request
+        for its samples to be kept.
+    :param float flush_interval: How often, in seconds, to write out the
+        aggregated stacks.
+    :param int max_stacks: The maximum number of distinct stacks to keep per
+        request and per root span name. Samples of further stacks are
+        dropped.
+
+    """
+    observe_unsampled = True
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, sink, interval=0.01, threshold=1., flush_interval=60.,
+                 max_stacks=1000, clock=None):
+        self.sink = sink
+        self.interval = interval
+        self.threshold = threshold
+        self.flush_interval = flush_interval
+        self.max_stacks = max_stacks
+        self.clock = clock or default_clock
+
+        self.active = {}
+        self.aggregates = collections.defaultdict(collections.Counter)
+        self.dropped = 0
+
+        signal.signal(signal.SIGPROF, self._on_signal)
+        signal.siginterrupt(signal.SIGPROF, False)
+        signal.setitimer(signal.ITIMER_PROF, interval, interval)
+
+        self.flusher = threading.Thread(
+            target=self._flush_periodically, name="profile flusher")
+        self.flusher.daemon = True
+        self.flusher.start()
+
+    def on_root_span_created(self, context, root_span):
+        root_span.register(_ProfilingRootSpanObserver(self, root_span))
+
+    def _on_signal(self, _, frame):
+        span = current_span()
+        if span is None:
+            return
+
+        samples = self.active.get(_request_key(span))
+        if samples is None:
+            return
+
+        stack = fold_stack(frame)
+        if stack in samples or len(samples) < self.max_stacks:
+            samples[stack] += 1
+        else:
+            self.dropped += 1
+
+    def _on_request_completed(self, name, samples):
+        aggregate = self.aggregates[name]
+        for stack, count in samples.items():
+            if stack in aggregate or len(aggregate) < self.max_stacks:
+                aggregate[stack] += count
+            else:
+                self.dropped += count
+
+    def flush(self):
+        """Write out and reset the aggregated stacks."""
+        aggregates, self.aggregates = (
+            self.aggregates, collections.defaultdict(collections.Counter))
+
+        lines = []
+        for name, samples in aggregates.items():
+            for stack, count in samples.items():
+                line = "{};{} {:d}".format(name, stack, count)
+                lines.append(line.encode("utf-8"))
+
+        if not lines:
+            return
+
+        try:
+            self.dropped += self.sink.send(lines)
+        except Exception:  # pylint: disable=broad-except
+            logger.exception("Failed to write %d profile stacks.", len(lines))
+
+    def _flush_periodically(self):  # pragma: nocover
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+
+class _ProfilingRootSpanObserver(RootSpanObserver):
+    __slots__ = ("profiler", "root_span", "start_time")
+
+    def __init__(self, profiler, root_span):
+        self.profiler = profiler
+        self.root_span = root_span
+        self.start_time = None
+
+    def on_start(self):
+        self.start_time = self.profiler.clock.now()
+        self.profiler.active[_request_key(self.root_span)] = collections.Counter()
+
+    def on_stop(self, error):
+        samples = self.profiler.active.pop(_request_key(self.root_span), None)
+        if samples is None or self.start_time is None:
+            return
+
+        elapsed = self.profiler.clock.now() - self.start_time
+        if elapsed >= self.profiler.threshold and samples:
+            self.profiler._on_request_completed(self.root_span.name, samples)
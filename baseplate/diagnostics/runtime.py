@@ -0,0 +1,223 @@
+"""Periodic reporting of the process's own resource usage.
+
+Latency spikes often come from the runtime rather than the application: a
+long garbage collection pause, memory growth, or a backed up thread pool.
+:py:class:`RuntimeMetricsCollector` reports these through the application's
+metrics client so they can be lined up against request timings.
+
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import gc
+import logging
+import os
+import socket
+import sys
+import threading
+import time
+
+from ..clock import default_clock
+
+try:
+    import resource
+except ImportError:  # pragma: nocover
+    resource = None
+
+
+logger = logging.getLogger(__name__)
+
+
+def _read_rss():
+    try:
+        with open("/proc/self/statm") as statm:
+            resident_pages = int(statm.read().split()[1])
+        return resident_pages * os.sysconf(str("SC_PAGE_SIZE"))
+    except (IOError, OSError, ValueError, IndexError):
+        pass
+
+    if resource is not None:
+        # not the current rss, but the best we can do portably. linux reports
+        # kilobytes, other platforms bytes.
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return max_rss * 1024 if sys.platform.startswith("linux") else max_rss
+    return None  # pragma: nocover
+
+
+def _count_open_fds():
+    for path in ("/proc/self/fd", "/dev/fd"):
+        try:
+            return len(os.listdir(path))
+        except OSError:
+            continue
+    return None  # pragma: nocover
+
+
+def _read_cpu_time():
+    if resource is not None:
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        return usage.ru_utime, usage.ru_stime
+    times = os.times()  # pragma: nocover
+    return times[0], times[1]  # pragma: nocover
+
+
+class RuntimeMetricsCollector(object):
+    """Periodically report the process's resource usage as metrics.
+
+    Every ``interval`` seconds a background thread (or greenlet, if gevent
+    has patched :py:mod:`threading`) sends the following under
+    ``runtime.<hostname>.PID<pid>``, since these values only make sense per
+    process:
+
+    ``gc.gen<N>.collections`` (counter)
+        The number of collections of each generation since the last report.
+    ``gc.gen<N>.pause`` (timer)
+        The duration of each of those collections, i.e. how long the
+        process was stopped. Only available on Python 3.3+.
+    ``gc.gen<N>.objects`` (gauge)
+        The number of objects tracked in each generation.
+    ``memory.rss`` (gauge)
+        The resident set size of the process, in bytes.
+    ``fds.open`` (gauge)
+        The number of open file descriptors.
+    ``threads.active`` (gauge)
+        The number of live threads.
+    ``cpu.user`` and ``cpu.system`` (counters)
+        The CPU time used since the last report, in milliseconds.
+    ``cpu.utilization`` (gauge)
+        The fraction of one core used since the last report.
+
+    And, if gevent's hub has been started:
+
+    ``gevent.threadpool.size`` and ``gevent.threadpool.queued`` (gauges)
+        The number of threads in the hub's thread pool and the number of
+        tasks waiting for one of them.
+    ``gevent.greenlets`` (gauge)
+        The number of live greenlets. Counting them requires walking every
+        object on the heap, which blocks the process for a while on large
+        heaps, so this is only reported if ``count_greenlets`` is enabled.
+
+    :param baseplate.metrics.Client client: The client to send metrics with.
+    :param float interval: How often, in seconds, to report.
+    :param bool count_greenlets: Whether or not to count live greenlets.
+    :param int max_pauses: The maximum number of garbage collection pauses to
+        time between reports. Further pauses are still counted.
+
+    """
+    # pylint: disable=too-many-arguments
+    def __init__(self, client, interval=10., count_greenlets=False,
+                 max_pauses=1000, clock=None):
+        self.client = client
+        self.interval = interval
+        self.count_greenlets = count_greenlets
+        self.max_pauses = max_pauses
+        self.clock = clock or default_clock
+        self.prefix = "runtime.{}.PID{:d}.".format(
+            socket.gethostname().replace(".", "_"), os.getpid())
+
+        self.gc_start = None
+        self.gc_collections = [0] * len(gc.get_count())
+        self.gc_pauses = []
+
+        self.last_report = self.clock.now()
+        self.last_cpu_time = _read_cpu_time()
+
+        if hasattr(gc, "callbacks"):
+            gc.callbacks.append(self._on_gc)
+
+        self.reporter = threading.Thread(
+            target=self._report_periodically, name="runtime metrics reporter")
+        self.reporter.daemon = True
+        self.reporter.start()
+
+    def _on_gc(self, phase, info):
+        if phase == "start":
+            self.gc_start = self.clock.now()
+        elif self.gc_start is not None:
+            generation = info["generation"]
+            self.gc_collections[generation] += 1
+            if len(self.gc_pauses) < self.max_pauses:
+                self.gc_pauses.append(
+                    (generation, self.clock.now() - self.gc_start))
+            self.gc_start = None
+
+    def report(self):
+        """Send the current measurements."""
+        with self.client.batch() as batch:
+            self._report_gc(batch)
+            self._report_process(batch)
+            self._report_gevent(batch)
+
+    def _report_gc(self, batch):
+        prefix = self.prefix + "gc.gen"
+        collections, self.gc_collections = (
+            self.gc_collections, [0] * len(self.gc_collections))
+        pauses, self.gc_pauses = self.gc_pauses, []
+
+        if hasattr(gc, "callbacks"):
+            for generation, count in enumerate(collections):
+                batch.counter(
+                    "{}{:d}.collections".format(prefix, generation)
+                ).increment(count)
+        for generation, pause in pauses:
+            batch.timer("{}{:d}.pause".format(prefix, generation)).send(pause)
+        for generation, count in enumerate(gc.get_count()):
+            batch.gauge("{}{:d}.objects".format(prefix, generation)).replace(count)
+
+    def _report_process(self, batch):
+        rss = _read_rss()
+        if rss is not None:
+            batch.gauge(self.prefix + "memory.rss").replace(rss)
+
+        open_fds = _count_open_fds()
+        if open_fds is not None:
+            batch.gauge(self.prefix + "fds.open").replace(open_fds)
+
+        batch.gauge(self.prefix + "threads.active").replace(
+            threading.active_count())
+
+        now = self.clock.now()
+        cpu_time = _read_cpu_time()
+        user = cpu_time[0] - self.last_cpu_time[0]
+        system = cpu_time[1] - self.last_cpu_time[1]
+        elapsed = now - self.last_report
+        self.last_report, self.last_cpu_time = now, cpu_time
+
+        batch.counter(self.prefix + "cpu.user").increment(user * 1000.)
+        batch.counter(self.prefix + "cpu.system").increment(system * 1000.)
+        if elapsed > 0:
+            batch.gauge(self.prefix + "cpu.utilization").replace(
+                (user + system) / elapsed)
+
+    def _report_gevent(self, batch):
+        gevent_hub = sys.modules.get("gevent.hub")
+        if gevent_hub is None:
+            return
+
+        hub = gevent_hub._get_hub()  # pylint: disable=protected-access
+        if hub is None:
+            return
+
+        # don't use hub.threadpool, that'd start one just to look at it.
+        threadpool = getattr(hub, "_threadpool", None)
+        if threadpool is not None:
+            batch.gauge(self.prefix + "gevent.threadpool.size").replace(
+                threadpool.size)
+            batch.gauge(self.prefix + "gevent.threadpool.queued").replace(
+                threadpool.task_queue.qsize())
+
+        if self.count_greenlets:
+            import greenlet  # pylint: disable=import-error
+            count = sum(1 for obj in gc.get_objects()
+                        if isinstance(obj, greenlet.greenlet) and not obj.dead)
+            batch.gauge(self.prefix + "gevent.greenlets").replace(count)
+
+    def _report_periodically(self):  # pragma: nocover
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.report()
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("Failed to report runtime metrics.")
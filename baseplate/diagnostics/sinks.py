@@ -0,0 +1,78 @@
+"""Destinations for diagnostic data exported in the background.
+
+A sink takes a batch of already-serialized items (:py:class:`bytes`) and
+writes them somewhere outside of the process. Sinks are called from
+background flushers, never from the request path.
+
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import io
+import logging
+import threading
+
+from ..message_queue import TimedOutError
+
+
+logger = logging.getLogger(__name__)
+
+
+class Sink(object):
+    """Interface for a destination of serialized diagnostic items."""
+
+    def send(self, items):  # pragma: nocover
+        """Write a batch of items.
+
+        :param list items: The serialized items, each a :py:class:`bytes`.
+        :return: The number of items that had to be dropped.
+
+        """
+        raise NotImplementedError
+
+
+class FileSink(Sink):
+    """A sink which appends items, one per line, to a local file.
+
+    :param str path: The file to append to. It is created if necessary.
+
+    """
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.file = io.open(path, "ab")
+
+    def send(self, items):
+        if not items:
+            return 0
+
+        with self.lock:
+            self.file.write(b"\n".join(items) + b"\n")
+            self.file.flush()
+        return 0
+
+
+class MessageQueueSink(Sink):
+    """A sink which puts each item onto a POSIX message queue.
+
+    This is useful for handing items off to a separate daemon on the same
+    host which can then ship them elsewhere. If the queue is full, items are
+    dropped rather than waiting for space.
+
+    :param baseplate.message_queue.MessageQueue queue: The queue to put items
+        onto.
+
+    """
+    def __init__(self, queue):
+        self.queue = queue
+
+    def send(self, items):
+        dropped = 0
+        for item in items:
+            try:
+                self.queue.put(item, timeout=0)
+            except TimedOutError:
+                dropped += 1
+        return dropped
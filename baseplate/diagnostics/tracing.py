@@ -0,0 +1,349 @@
+"""Export of span records for distributed tracing.
+
+Exporting must never slow down the request it describes, so records are
+serialized into a bounded in-memory buffer as spans finish and shipped to a
+:py:mod:`sink <baseplate.diagnostics.sinks>` in batches by a background
+flusher.
+
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import collections
+import json
+import logging
+import random
+import threading
+import time
+
+from .._compat import text_type
+from ..core import (
+    BaseplateObserver,
+    BufferedSpanRecordObserver,
+    SpanRecordObserver,
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+def _to_text(value):
+    if isinstance(value, bytes):
+        return value.decode("utf-8", "replace")
+    return text_type(value)
+
+
+def serialize_span_record(record):
+    """Serialize a :py:class:`~baseplate.core.SpanRecord` to JSON.
+
+    IDs are rendered as 16 character hex strings and times as integer
+    microseconds since the epoch, following Zipkin's conventions. The
+    duration is measured with the record's monotonic times. Annotation
+    values are converted to text, decoding byte strings as UTF-8.
+
+    :rtype: :py:class:`bytes`
+
+    """
+    start_time = record.start_time or record.end_time
+    span = {
+        "traceId": "{:016x}".format(record.trace_id),
+        "id": "{:016x}".format(record.span_id),
+        "name": record.name,
+        "timestamp": int(start_time * 1000000),
+        "duration": int((record.duration or 0.) * 1000000),
+    }
+
+    if record.parent_id is not None:
+        span["parentId"] = "{:016x}".format(record.parent_id)
+
+    if record.annotations:
+        span["annotations"] = {
+            key: _to_text(value) for key, value in record.annotations}
+
+    if record.error is not None:
+        span["error"] = type(record.error).__name__
+
+    return json.dumps(span, sort_keys=True).encode("utf-8")
+
+
+class SpanBuffer(object):
+    """A bounded buffer of serialized spans waiting to be exported.
+
+    When the buffer is full, new spans are dropped and counted rather than
+    displacing older ones or blocking.
+
+    :param int max_size: The maximum number of spans to hold.
+
+    """
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.spans = collections.deque()
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self.spans)
+
+    def add(self, span):
+        """Add a serialized span to the buffer.
+
+        :return: Whether or not the span fit in the buffer.
+
+        """
+        if len(self.spans) >= self.max_size:
+            self.dropped += 1
+            return False
+        self.spans.append(span)
+        return True
+
+    def take(self, count):
+        """Remove and return up to ``count`` of the oldest spans."""
+        batch = []
+        popleft = self.spans.popleft
+        try:
+            for _ in range(count):
+                batch.append(popleft())
+        except IndexError:
+            pass
+        return batch
+
+
+class TracingBaseplateObserver(BaseplateObserver, SpanRecordObserver):
+    """Span exporting observer.
+
+    This observer collects a record of every span in sampled requests and
+    exports them to a sink. Records are serialized into a bounded
+    :py:class:`SpanBuffer` when each span stops and a background thread (or
+    greenlet, if gevent has patched :py:mod:`threading`) flushes the buffer
+    in batches, so the request path never waits on the export.
+
+    :param baseplate.diagnostics.sinks.Sink sink: Where to send the spans.
+    :param int max_buffered_spans: The maximum number of spans to hold while
+        waiting for a flush. Spans completed while the buffer is full are
+        dropped and counted.
+    :param float flush_interval: How often, in seconds, to flush the buffer.
+    :param int max_batch_size: The maximum number of spans to pass to the sink
+        at once.
+
+    """
+    # pylint: disable=too-many-arguments
+    def __init__(self, sink, max_buffered_spans=10000, flush_interval=1.0,
+                 max_batch_size=100):
+        self.sink = sink
+        self.buffer = SpanBuffer(max_buffered_spans)
+        self.flush_interval = flush_interval
+        self.max_batch_size = max_batch_size
+        self.dropped = 0
+        self.unserializable = 0
+
+        self.flusher = threading.Thread(
+            target=self._flush_periodically, name="span flusher")
+        self.flusher.daemon = True
+        self.flusher.start()
+
+    def on_root_span_created(self, context, root_span):
+        root_span.register_record_observer(self)
+
+    def on_span_completed(self, record):
+        self._export(record)
+
+    def on_root_span_completed(self, record):
+        self._export(record)
+
+    def _export(self, record):
+        # this runs as the span stops, so a bad record must not fail the
+        # request.
+        try:
+            span = serialize_span_record(record)
+        except Exception:  # pylint: disable=broad-except
+            self.unserializable += 1
+            return
+        self.buffer.add(span)
+
+    def flush(self):
+        """Send everything currently in the buffer to the sink."""
+        while self.buffer:
+            batch = self.buffer.take(self.max_batch_size)
+            try:
+                self.dropped += self.sink.send(batch)
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("Failed to export %d spans.", len(batch))
+                self.dropped += len(batch)
+
+        dropped, self.buffer.dropped = self.buffer.dropped, 0
+        if dropped:
+            logger.warning("Span buffer full, dropped %d spans.", dropped)
+            self.dropped += dropped
+
+        unserializable, self.unserializable = self.unserializable, 0
+        if unserializable:
+            logger.warning("Failed to serialize %d spans.", unserializable)
+            self.dropped += unserializable
+
+    def _flush_periodically(self):  # pragma: nocover
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+
+class TailSamplingBaseplateObserver(TracingBaseplateObserver):
+    """Span exporting observer which decides what to keep after the fact.
+
+    Head sampling decides whether to trace a request before anything is known
+    about it, so slow and failing requests are kept no more often than any
+    other. This observer instead holds onto the records of every request,
+    sampled or not, until its root span stops and then exports the whole
+    tree only if the request was interesting:
+
+    * it took at least as long as the latency threshold for its root span's
+      name,
+    * or any of its spans ended with an error,
+    * or it was picked at random according to ``baseline_rate``.
+
+    Records are held in memory while requests are in flight, so that memory
+    is capped both per request and for the whole process. Records beyond
+    either cap are dropped and counted; the root span's record is always
+    kept. The annotations on held records are capped for the whole process
+    too; records completed beyond that cap are held without their
+    annotations.
+
+    Use this observer instead of, not as well as,
+    :py:class:`TracingBaseplateObserver`. The remaining keyword arguments are
+    passed along to it.
+
+    :param baseplate.diagnostics.sinks.Sink sink: Where to send the spans.
+    :param dict latency_thresholds: A mapping of root span names to the
+        duration, in seconds, after which a request is kept.
+    :param float default_latency_threshold: The threshold for root spans not
+        in ``latency_thresholds``. If :py:data:`None`, only requests with a
+        specific threshold are kept for their latency.
+    :param float baseline_rate: The fraction, between 0 and 1, of requests to
+        keep regardless.
+    :param int max_spans_per_request: The maximum number of child span
+        records to hold for a single request. If :py:data:`None`, only
+        ``max_held_spans`` applies.
+    :param int max_held_spans: The maximum number of child span records to
+        hold across all in-flight requests in this process.
+    :param int max_held_annotation_bytes: The maximum total size of the
+        annotations on child span records held across all in-flight requests
+        in this process, measured as the length of their keys and values as
+        text.
+
+    """
+    observe_unsampled = True
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, sink, latency_thresholds=None,
+                 default_latency_threshold=None, baseline_rate=0.,
+                 max_spans_per_request=1000, max_held_spans=10000,
+                 max_held_annotation_bytes=4 * 1024 * 1024, **kwargs):
+        super(TailSamplingBaseplateObserver, self).__init__(sink, **kwargs)
+        self.latency_thresholds = latency_thresholds or {}
+        self.default_latency_threshold = default_latency_threshold
+        self.baseline_rate = baseline_rate
+        self.max_spans_per_request = max_spans_per_request
+        self.max_held_spans = max_held_spans
+        self.max_held_annotation_bytes = max_held_annotation_bytes
+        self.held_spans = 0
+        self.held_annotation_bytes = 0
+        # reentrant because a request's share is also released from __del__,
+        # which can run in a thread that's already holding the lock.
+        self.held_lock = threading.RLock()
+
+    def on_root_span_created(self, context, root_span):
+        root_span.register_record_observer(
+            _TailSamplingRecordObserver(self, self.max_spans_per_request))
+
+    def should_keep(self, records):
+        """Return whether or not a completed request should be exported.
+
+        :param list records: The request's span records. The root span's
+            record is last.
+
+        """
+        root = records[-1]
+        threshold = self.latency_thresholds.get(
+            root.name, self.default_latency_threshold)
+        duration = root.duration
+        if threshold is not None and duration is not None:
+            if duration >= threshold:
+                return True
+
+        for record in records:
+            if record.error is not None:
+                return True
+
+        return self.baseline_rate > 0 and random.random() < self.baseline_rate
+
+    def _on_trace_completed(self, records, dropped, stripped):
+        if not self.should_keep(records):
+            return
+
+        if dropped:
+            logger.debug("Exporting trace %016x missing %d spans.",
+                         records[-1].trace_id, dropped)
+            self.dropped += dropped
+
+        if stripped:
+            logger.debug("Exporting trace %016x without the annotations of "
+                         "%d spans.", records[-1].trace_id, stripped)
+
+        for record in records:
+            self._export(record)
+
+
+def _annotations_size(annotations):
+    return sum(len(key) + len(_to_text(value)) for key, value in annotations)
+
+
+class _TailSamplingRecordObserver(BufferedSpanRecordObserver):
+    __slots__ = ("exporter", "held", "held_annotation_bytes", "stripped")
+
+    def __init__(self, exporter, max_records):
+        super(_TailSamplingRecordObserver, self).__init__(max_records)
+        self.exporter = exporter
+        self.held = 0
+        self.held_annotation_bytes = 0
+        self.stripped = 0
+
+    def on_span_completed(self, record):
+        exporter = self.exporter
+        size = _annotations_size(record.annotations)
+        with exporter.held_lock:
+            if (exporter.held_spans >= exporter.max_held_spans or
+                    (self.max_records is not None and
+                     len(self.records) >= self.max_records)):
+                self.dropped += 1
+                return
+
+            if (size and exporter.held_annotation_bytes + size >
+                    exporter.max_held_annotation_bytes):
+                record = record._replace(annotations=())
+                self.stripped += 1
+                size = 0
+
+            self.records.append(record)
+            self.held += 1
+            self.held_annotation_bytes += size
+            exporter.held_spans += 1
+            exporter.held_annotation_bytes += size
+
+    def on_trace_completed(self, records):
+        self._release()
+        # pylint: disable=protected-access
+        self.exporter._on_trace_completed(records, self.dropped, self.stripped)
+        self.records = []
+
+    def _release(self):
+        exporter = self.exporter
+        with exporter.held_lock:
+            exporter.held_spans -= self.held
+            exporter.held_annotation_bytes -= self.held_annotation_bytes
+            self.held = 0
+            self.held_annotation_bytes = 0
+
+    def __del__(self):
+        # a root span that is never stopped must not leak its share of the
+        # process-wide limit.
+        self._release()
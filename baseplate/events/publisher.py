@@ -11,6 +11,7 @@ import requests
 from . import MAX_EVENT_SIZE, MAX_QUEUE_SIZE
 from .. import config, make_metrics_client
 from .. _compat import configparser, BytesIO
+from .. clock import default_clock
 from .. message_queue import MessageQueue, TimedOutError
 
 
@@ -38,9 +39,13 @@ class Batcher(object):
     A flush may occur if the batch reaches the maximum specified size during
     add() or if explicitly flush()ed.
 
+    The age of the batch is measured with ``clock``, a monotonic clock by
+    default.
+
     """
-    def __init__(self, consumer):
+    def __init__(self, consumer, clock=None):
         self.consumer = consumer
+        self.clock = clock or default_clock
         self.batch = []
         self.batch_size = self.consumer.batch_size_overhead
         self.batch_start = None
@@ -52,9 +57,9 @@ class Batcher(object):
         If there are no items in the batch, 0 is returned.
 
         """
-        if not self.batch_start:
+        if self.batch_start is None:
             return 0
-        return time.time() - self.batch_start
+        return self.clock.now() - self.batch_start
 
     def add(self, item):
         """Add an item to the batch, potentially flushing."""
@@ -63,8 +68,8 @@ class Batcher(object):
             self.flush()
         self.batch.append(item)
         self.batch_size += item_size
-        if not self.batch_start:
-            self.batch_start = time.time()
+        if self.batch_start is None:
+            self.batch_start = self.clock.now()
 
     def flush(self):
         """Explicitly flush the batch if any items are enqueued."""
@@ -62,11 +62,16 @@ class BaseplateConfigurator(object):
 
         trace_info = None
         if self.trust_trace_headers:
+            sampled = request.headers.get("X-Sampled")
+            if sampled is not None:
+                sampled = (sampled == "1")
+
             try:
                 trace_info = TraceInfo.from_upstream(
                     trace_id=int(request.headers["X-Trace"]),
                     parent_id=int(request.headers["X-Parent"]),
                     span_id=int(request.headers["X-Span"]),
+                    sampled=sampled,
                 )
             except (KeyError, ValueError):
                 pass
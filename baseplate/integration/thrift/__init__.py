@@ -50,11 +50,17 @@ class BaseplateProcessorEventHandler(TProcessorEventHandler):
 
         trace_info = None
         headers = server_context.iprot.trans.get_headers()
+
+        sampled = headers.get(b"Sampled")
+        if sampled is not None:
+            sampled = (sampled == b"1")
+
         try:
             trace_info = TraceInfo.from_upstream(
                 trace_id=int(headers[b"Trace"]),
                 parent_id=int(headers[b"Parent"]),
                 span_id=int(headers[b"Span"]),
+                sampled=sampled,
             )
         except (KeyError, ValueError):
             pass
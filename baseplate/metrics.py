@@ -40,6 +40,23 @@ If you have multiple metrics to send, you can batch them up for efficiency:
 and the batch will be sent in as few packets as possible when the `with` block
 ends.
 
+Counters, timers, and histograms can be sampled to cut down on traffic for
+very frequent events:
+
+.. testcode::
+
+    client.counter("requests").increment(sample_rate=.1)
+
+The client itself only sends the given fraction of the samples, tagged with
+the rate so that statsd scales them back up. A sample rate of 0 sends nothing.
+
+.. note::
+
+    Before sample rates were enforced by the client, every sample was sent and
+    only tagged with its rate. Code which skipped metrics at random itself and
+    passed the same rate along now has its metrics sampled twice, and reported
+    that much too low, and should leave the sampling to the client instead.
+
 .. _statsd: https://github.com/etsy/statsd
 
 """
@@ -48,10 +65,24 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import array
+import atexit
+import collections
+import errno
+import itertools
 import logging
+import math
+import os
+import random
 import socket
+import threading
 import time
 
+from ._compat import queue
+from ._sendmmsg import sendmmsg
+from ._shared_memory import SharedSegment
+from .clock import default_clock
+
 
 logger = logging.getLogger(__name__)
 
@@ -60,10 +91,69 @@ def _metric_join(*nodes):
     return b".".join(node.strip(b".") for node in nodes)
 
 
+def _sample_point(trace_id):
+    # map the trace id onto [0, 1). the multiplication scrambles the bits so
+    # that trace ids which aren't uniformly random (e.g. sequential ones from
+    # some upstream) still spread out evenly.
+    return ((trace_id * 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF) / 2.**64
+
+
+def _sampled(sample_rate, sample_point):
+    if sample_rate >= 1.0:
+        return True
+    if sample_rate <= 0.:
+        return False
+    if sample_point is None:
+        sample_point = random.random()
+    return sample_point < sample_rate
+
+
+def _rate_suffix(sample_rate):
+    if sample_rate >= 1.0:
+        return b""
+    return "|@{:g}".format(sample_rate).encode()
+
+
+class _LossLog(object):
+    # logs how many datagrams a transport has lost, but at most once an
+    # interval so a struggling transport doesn't flood the logs as well.
+    # losses after the last message are logged with the next one.
+    def __init__(self, message, interval=60., clock=None):
+        self.message = message
+        self.interval = interval
+        self.clock = clock or default_clock
+        self.unlogged = 0
+        self.logged_at = None
+
+    def add(self, count):
+        self.unlogged += count
+        now = self.clock.now()
+        if self.logged_at is None or now - self.logged_at >= self.interval:
+            logger.warning(self.message, self.unlogged)
+            self.unlogged = 0
+            self.logged_at = now
+
+
 class Transport(object):
+    # whether or not histogram samples sent through this transport are
+    # summarized in process, see AggregatingTransport.
+    summarizes_histograms = False
+
     def send(self, serialized_metric):
         raise NotImplementedError
 
+    def send_many(self, serialized_metrics):
+        """Send several datagrams.
+
+        Transports which can send several datagrams more cheaply than one at
+        a time override this.
+
+        :param list serialized_metrics: The datagrams to send.
+
+        """
+        for serialized_metric in serialized_metrics:
+            self.send(serialized_metric)
+
 
 class NullTransport(Transport):
     """A transport which doesn't send messages at all."""
@@ -73,114 +163,903 @@ class NullTransport(Transport):
 
 
 class RawTransport(Transport):
-    """A transport which sends messages on a socket."""
-    def __init__(self, endpoint):
+    """A transport which sends messages on a socket.
+
+    :param baseplate.config.EndpointConfiguration endpoint: Where to send
+        the messages.
+    :param bool use_sendmmsg: Whether or not to send several datagrams with
+        a single ``sendmmsg(2)`` system call where that's available (Linux).
+        This only sends about 2% more datagrams per second than sending them
+        one at a time, so it's off by default.
+
+    """
+    def __init__(self, endpoint, use_sendmmsg=False):
         self.socket = socket.socket(endpoint.family, socket.SOCK_DGRAM)
         self.socket.connect(endpoint.address)
+        self.use_sendmmsg = use_sendmmsg
 
     def send(self, serialized_metric):
         self.socket.sendall(serialized_metric)
 
+    def send_many(self, serialized_metrics):
+        sent = 0
+        if self.use_sendmmsg and sendmmsg is not None and len(serialized_metrics) > 1:
+            try:
+                sent = sendmmsg(self.socket.fileno(), serialized_metrics)
+            except socket.error as exc:
+                # gevent makes sockets non-blocking under the hood, so leave
+                # waiting for buffer space to the socket object.
+                if exc.errno not in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    raise
 
-class BufferedTransport(object):
-    """A transport which wraps another transport and buffers before sending."""
-    def __init__(self, transport):
+        for serialized_metric in serialized_metrics[sent:]:
+            self.send(serialized_metric)
+
+
+class UnixDatagramTransport(RawTransport):
+    """A transport which sends messages on a Unix domain datagram socket.
+
+    This is meant for sending to an agent on the same host. Unix datagrams
+    don't go through the IP stack and are never fragmented, and unlike UDP
+    the kernel reports when the receiver can't keep up rather than silently
+    discarding datagrams. The socket is non-blocking so that never stalls the
+    sender; datagrams which don't fit in the socket's buffer are dropped and
+    counted in ``dropped``.
+
+    If the agent isn't listening (yet, or anymore), datagrams are dropped and
+    counted in ``failed`` and the transport reconnects on the next send.
+
+    Both kinds of loss are logged as warnings, at most once a minute each.
+
+    The parameters are the same as :py:class:`RawTransport`'s.
+
+    """
+    # pylint: disable=super-init-not-called
+    def __init__(self, endpoint, use_sendmmsg=False):
+        self.endpoint = endpoint
+        self.use_sendmmsg = use_sendmmsg
+        self.socket = None
+        self.dropped = 0
+        self.failed = 0
+        self.dropped_log = _LossLog(
+            "Metrics agent socket full, dropped %d datagrams.")
+        self.failed_log = _LossLog(
+            "Metrics agent not listening, dropped %d datagrams.")
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        sock.setblocking(False)
+        try:
+            sock.connect(self.endpoint.address)
+        except socket.error:
+            sock.close()
+            raise
+        self.socket = sock
+
+    def send(self, serialized_metric):
+        self.send_many([serialized_metric])
+
+    def send_many(self, serialized_metrics):
+        sent = 0
+        try:
+            if self.socket is None:
+                self._connect()
+
+            if (self.use_sendmmsg and sendmmsg is not None and
+                    len(serialized_metrics) > 1):
+                sent = sendmmsg(self.socket.fileno(), serialized_metrics)
+                if sent < len(serialized_metrics):
+                    # sendmmsg stopped early, find out why from a plain send.
+                    self.socket.send(serialized_metrics[sent])
+                    sent += 1
+
+            for serialized_metric in serialized_metrics[sent:]:
+                self.socket.send(serialized_metric)
+                sent += 1
+        except socket.error as exc:
+            unsent = len(serialized_metrics) - sent
+            if exc.errno in (errno.EAGAIN, errno.EWOULDBLOCK, errno.ENOBUFS):
+                self.dropped += unsent
+                self.dropped_log.add(unsent)
+            else:
+                self.failed += unsent
+                self.failed_log.add(unsent)
+                if self.socket is not None:
+                    self.socket.close()
+                    self.socket = None
+
+
+class QueuedTransport(Transport):
+    """A transport which sends metrics from a background thread.
+
+    Sending on a socket can block, e.g. when the socket's buffer is full, and
+    that shouldn't hold up the request that happened to be flushing its
+    metrics. This transport instead puts metrics onto a bounded in-memory
+    queue which a background thread (or greenlet, if gevent has patched
+    :py:mod:`threading`) drains into the wrapped transport. If the queue is
+    full, metrics are dropped and counted in ``dropped`` rather than waiting
+    for space. Datagrams the wrapped transport fails to send are counted in
+    ``failed``. Both are logged as warnings, at most once a minute each.
+
+    Whatever is still queued is sent when the process exits.
+
+    :param baseplate.metrics.Transport transport: The transport to send the
+        metrics with.
+    :param int max_queue_size: The maximum number of datagrams to hold.
+
+    """
+    def __init__(self, transport, max_queue_size=1000):
         self.transport = transport
-        self.buffer = []
+        self.queue = queue.Queue(maxsize=max_queue_size)
+        self.dropped = 0
+        self.failed = 0
+        self.dropped_log = _LossLog(
+            "Metrics queue full, dropped %d datagrams.")
+        self.failed_log = _LossLog("Failed to send %d metrics datagrams.")
+
+        self.sender = threading.Thread(target=self._send_forever,
+                                       name="metrics sender")
+        self.sender.daemon = True
+        self.sender.start()
+
+        atexit.register(self.flush)
+
+    @property
+    def summarizes_histograms(self):
+        return self.transport.summarizes_histograms
 
     def send(self, serialized_metric):
-        self.buffer.append(serialized_metric)
+        try:
+            self.queue.put_nowait(serialized_metric)
+        except queue.Full:
+            self.dropped += 1
+            self.dropped_log.add(1)
+
+    def _take(self, first, max_count=64):
+        batch = [first]
+        try:
+            while len(batch) < max_count:
+                batch.append(self.queue.get_nowait())
+        except queue.Empty:
+            pass
+        return batch
+
+    def _send_batch(self, batch):
+        try:
+            self.transport.send_many(batch)
+        except Exception:  # pylint: disable=broad-except
+            self.failed += len(batch)
+            self.failed_log.add(len(batch))
+            logger.debug("Failed to send metrics.", exc_info=True)
 
     def flush(self):
-        # TODO: warn when buffer length reaches MTU
-        # TODO: run-length compression
-        metrics, self.buffer = self.buffer, []
-        message = b"\n".join(metrics)
-        self.transport.send(message)
+        """Send everything currently queued from the calling thread."""
+        while True:
+            try:
+                first = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            self._send_batch(self._take(first))
+
+    def _send_forever(self):  # pragma: nocover
+        while True:
+            self._send_batch(self._take(self.queue.get()))
+
+
+#: The default maximum size, in bytes, of a datagram's payload. This fits in
+#: a single packet on a standard 1500 byte MTU Ethernet link after IP and UDP
+#: headers, with some room to spare for tunnelling overhead.
+DEFAULT_MAX_PACKET_SIZE = 1432
+
+
+def _format_number(value, signed=False):
+    # "{:g}" would round large totals, e.g. 1370367 to 1.37037e+06.
+    value = float(value)
+    if value.is_integer():
+        formatted = "{:d}".format(int(value))
+    else:
+        formatted = "{!r}".format(value)
+    if signed and value >= 0:
+        formatted = "+" + formatted
+    return formatted
 
 
-class BaseClient(object):
-    def __init__(self, transport, namespace):
+def _serialize_gauge(name, absolute, delta):
+    if absolute is None:
+        return [name + ":{}|g".format(_format_number(delta, signed=True)).encode()]
+    elif absolute + delta >= 0:
+        return [name + ":{}|g".format(_format_number(absolute + delta)).encode()]
+    # gauges can't be set to a negative value directly.
+    return [name + b":0|g",
+            name + ":{}|g".format(_format_number(absolute + delta)).encode()]
+
+
+class BufferedTransport(object):
+    """A transport which wraps another transport and buffers before sending.
+
+    Buffered metrics are packed into as few datagrams as possible without any
+    single datagram exceeding ``max_packet_size`` bytes. If a metric would
+    not fit in the datagram being buffered, that datagram is sent right away
+    and a new one started. A metric which is too big to fit in a datagram by
+    itself is sent alone and counted in ``oversized``.
+
+    Metrics added with :py:meth:`add_counter`, :py:meth:`add_gauge`, and
+    :py:meth:`add_timing` rather than :py:meth:`send` are coalesced by name
+    until the flush: counters are summed, gauge replacements keep only the
+    last value, and timings are folded into one multi-value line per timer.
+
+    :param baseplate.metrics.Transport transport: The transport to send
+        packed datagrams with.
+    :param int max_packet_size: The maximum size, in bytes, of a datagram.
+
+    """
+    def __init__(self, transport, max_packet_size=DEFAULT_MAX_PACKET_SIZE):
         self.transport = transport
-        self.namespace = namespace.encode("ascii")
+        self.max_packet_size = max_packet_size
+        self.buffer = []
+        self.buffer_size = 0
+        self.oversized = 0
+        self.pending = None
 
-    def timer(self, name):
-        """Return a Timer with the given name.
+        self.counters = {}
+        self.gauges = {}
+        self.timings = {}
 
-        :param str name: The name the timer should have.
+    def send(self, serialized_metric):
+        size = len(serialized_metric)
+        if self.buffer and self.buffer_size + 1 + size > self.max_packet_size:
+            self._send_buffer()
+
+        if size > self.max_packet_size:
+            logger.warning("Metric is larger than max packet size (%d > %d): %r",
+                           size, self.max_packet_size, serialized_metric[:100])
+            self.oversized += 1
+            self._send_packet(serialized_metric)
+            return
+
+        if self.buffer:
+            self.buffer_size += 1
+        self.buffer.append(serialized_metric)
+        self.buffer_size += size
 
-        :rtype: :py:class:`Timer`
+    def add_counter(self, name, delta, sample_rate=1.0):
+        """Add to the total for a counter.
+
+        :param bytes name: The fully qualified name of the counter.
+        :param float delta: The amount to change the counter by.
+        :param float sample_rate: The rate the counter is sampled at. The
+            delta is scaled up accordingly.
 
         """
-        timer_name = _metric_join(self.namespace, name.encode("ascii"))
-        return Timer(self.transport, timer_name)
+        if sample_rate and sample_rate != 1.0:
+            delta /= sample_rate
+        self.counters[name] = self.counters.get(name, 0) + delta
 
-    def counter(self, name):
-        """Return a Counter with the given name.
+    def add_gauge(self, name, value, relative=False):
+        """Replace or adjust the value of a gauge.
 
-        The sample rate is currently up to your application to enforce.
+        :param bytes name: The fully qualified name of the gauge.
+        :param float value: The new value, or change in value.
+        :param bool relative: Whether ``value`` is a change in value.
 
-        :param str name: The name the counter should have.
+        """
+        if relative:
+            absolute, delta = self.gauges.get(name, (None, 0))
+            self.gauges[name] = (absolute, delta + value)
+        else:
+            self.gauges[name] = (value, 0)
 
-        :rtype: :py:class:`Counter`
+    def add_timing(self, name, elapsed, sample_rate=1.0):
+        """Add a sample to a timer.
+
+        :param bytes name: The fully qualified name of the timer.
+        :param float elapsed: The elapsed time, in milliseconds.
+        :param float sample_rate: The rate the timer is sampled at.
 
         """
-        counter_name = _metric_join(self.namespace, name.encode("ascii"))
-        return Counter(self.transport, counter_name)
+        key = (name, sample_rate)
+        samples = self.timings.get(key)
+        if samples is None:
+            self.timings[key] = [elapsed]
+        else:
+            samples.append(elapsed)
+
+    @property
+    def summarizes_histograms(self):
+        return self.transport.summarizes_histograms
+
+    def _send_coalesced(self):
+        counters, gauges, timings = self.counters, self.gauges, self.timings
+        try:
+            for name, total in counters.items():
+                self.send(name + ":{}|c".format(_format_number(total)).encode())
+
+            for name, (absolute, delta) in gauges.items():
+                for line in _serialize_gauge(name, absolute, delta):
+                    self.send(line)
+
+            for (name, sample_rate), samples in timings.items():
+                # fold samples into as few "name:1|ms:2|ms" lines as will fit
+                # in a packet each.
+                suffix = b"|ms" + _rate_suffix(sample_rate)
+                line = name
+                for sample in samples:
+                    serialized = ":{:g}".format(sample).encode() + suffix
+                    if (line is not name and
+                            len(line) + len(serialized) > self.max_packet_size):
+                        self.send(line)
+                        line = name
+                    line += serialized
+                self.send(line)
+        finally:
+            # cleared rather than replaced so a long-lived buffer doesn't
+            # allocate new ones for every flush.
+            counters.clear()
+            gauges.clear()
+            timings.clear()
+
+    def _send_packet(self, packet):
+        if self.pending is not None:
+            self.pending.append(packet)
+        else:
+            self.transport.send(packet)
+
+    def _send_buffer(self):
+        packet = b"\n".join(self.buffer)
+        del self.buffer[:]
+        self.buffer_size = 0
+        self._send_packet(packet)
 
-    def gauge(self, name):
-        """Return a Gauge with the given name.
+    def flush(self):
+        # collect all the packets of the flush so they can be handed to the
+        # transport, and sent, together.
+        self.pending = pending = []
+        try:
+            if self.counters or self.gauges or self.timings:
+                self._send_coalesced()
+            if self.buffer:
+                self._send_buffer()
+        finally:
+            self.pending = None
+
+        if len(pending) == 1:
+            self.transport.send(pending[0])
+        elif pending:
+            self.transport.send_many(pending)
+
+
+def _bin_timing(value):
+    # round to two significant figures so the number of distinct bins per
+    # timer is bounded (90 per order of magnitude) while the error introduced
+    # stays within 5%.
+    if value <= 0:
+        return 0.
+    return float("{:.2g}".format(value))
+
+
+class LogLinearHistogram(object):
+    """A fixed-size histogram of positive values.
+
+    Values are counted in buckets which are spaced linearly within each power
+    of two and logarithmically across them, so the relative error of any
+    reported value is bounded (about 3% with the default 16 buckets per power
+    of two) while the memory used is fixed no matter how many values are
+    added or how far apart they are.
+
+    :param int min_exponent: Values smaller than ``2 ** (min_exponent - 1)``
+        are counted as the smallest value.
+    :param int max_exponent: Values of ``2 ** max_exponent`` or more are
+        counted as the largest value.
+    :param int sub_buckets: The number of buckets per power of two.
 
-        :param str name: The name the gauge should have.
+    """
 
-        :rtype: :py:class:`Gauge`
+    __slots__ = ("min_exponent", "max_exponent", "sub_buckets", "counts",
+                 "count", "max")
 
-        """
-        gauge_name = _metric_join(self.namespace, name.encode("ascii"))
-        return Gauge(self.transport, gauge_name)
+    def __init__(self, min_exponent=-10, max_exponent=22, sub_buckets=16):
+        self.min_exponent = min_exponent
+        self.max_exponent = max_exponent
+        self.sub_buckets = sub_buckets
+        self.counts = array.array(
+            "d", [0.]) * ((max_exponent - min_exponent) * sub_buckets)
+        self.count = 0.
+        self.max = None
 
+    def _index(self, value):
+        if value <= 0:
+            return 0
 
-class Client(BaseClient):
-    """A client for statsd."""
+        mantissa, exponent = math.frexp(value)
+        if exponent < self.min_exponent:
+            return 0
+        elif exponent >= self.max_exponent:
+            return len(self.counts) - 1
 
-    def batch(self):
-        """Return a client-like object which batches up metrics.
+        sub_bucket = int((mantissa - .5) * 2 * self.sub_buckets)
+        return (exponent - self.min_exponent) * self.sub_buckets + sub_bucket
 
-        Batching metrics can reduce the number of packets that are sent to
-        the stats aggregator.
+    def _value(self, index):
+        exponent, sub_bucket = divmod(index, self.sub_buckets)
+        mantissa = .5 + (sub_bucket + .5) / (2 * self.sub_buckets)
+        return math.ldexp(mantissa, exponent + self.min_exponent)
 
-        :rtype: :py:class:`Batch`
+    def add(self, value, count=1.):
+        """Add a value to the histogram.
+
+        :param float value: The value to add.
+        :param float count: How many times to count it.
 
         """
-        return Batch(self.transport, self.namespace)
+        self.counts[self._index(value)] += count
+        self.count += count
+        if self.max is None or value > self.max:
+            self.max = value
 
+    def percentile(self, percent):
+        """Return the value below which ``percent`` percent of values fall.
 
-class Batch(BaseClient):
-    """A batch of metrics to send to statsd.
+        :param float percent: The percentile to find, from 0 to 100.
+        :return: The value, or :py:data:`None` if the histogram is empty.
 
-    The batch also supports the `context manager protocol`_, for use with
-    Python's ``with`` statement. When the context is exited, the batch will
-    automatically :py:meth:`flush`.
+        """
+        if not self.count:
+            return None
+
+        target = self.count * percent / 100.
+        last_index = len(self.counts) - 1
+        seen = 0.
+        for index, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= target:
+                if index == last_index:
+                    # everything too big for the histogram ends up here.
+                    break
+                return min(self._value(index), self.max)
+        return self.max
+
+
+#: The percentiles of each histogram reported by
+#: :py:class:`AggregatingTransport`.
+HISTOGRAM_PERCENTILES = (50, 90, 99)
 
-    .. _context manager protocol:
-        https://docs.python.org/3/reference/datamodel.html#context-managers
+
+def _parse_line(line):
+    """Yield ``(name, sample, value, type, sample_rate)`` for each sample.
+
+    :raises: :py:exc:`ValueError` or :py:exc:`IndexError` if the line is
+        malformed.
 
     """
+    parts = line.split(b":")
+    if len(parts) < 2:
+        raise ValueError("no value in metric line")
+
+    name = parts[0]
+    for sample in parts[1:]:
+        fields = sample.split(b"|")
+        value, metric_type = fields[0], fields[1]
+        rate = 1.
+        if len(fields) > 2 and fields[2].startswith(b"@"):
+            rate = float(fields[2][1:])
+        yield name, sample, value, metric_type, rate
+
+
+# the most samples of a timer packed into one line, which keeps lines well
+# within a datagram.
+_MAX_SAMPLES_PER_LINE = 64
+
+
+def _serialize_timer(name, bins):
+    # statsd only applies the sample rate to a timer's count. its mean, sum,
+    # and upper percentiles come from the values it receives, so each bin's
+    # value has to be sent once per sample rather than once with a rate.
+    samples = []
+    for value, count in sorted(bins.items()):
+        repeats = max(int(round(count)), 1)
+        sample = "{:g}|ms".format(value)
+        rate = "{:g}".format(repeats / count)
+        if rate != "1":
+            # sampled timers can leave a fraction of a sample in the bin.
+            sample += "|@" + rate
+        samples.extend([sample] * repeats)
+
+    lines = []
+    for start in range(0, len(samples), _MAX_SAMPLES_PER_LINE):
+        chunk = samples[start:start + _MAX_SAMPLES_PER_LINE]
+        lines.append(name + (":" + ":".join(chunk)).encode())
+    return lines
+
+
+def _serialize_aggregates(counters, gauges, timers, histograms):
+    lines = []
+    for name, total in counters.items():
+        lines.append(name + ":{}|c".format(_format_number(total)).encode())
+
+    for name, (absolute, delta) in gauges.items():
+        lines.extend(_serialize_gauge(name, absolute, delta))
+
+    for name, bins in timers.items():
+        lines.extend(_serialize_timer(name, bins))
+
+    for name, histogram in histograms.items():
+        for percent in HISTOGRAM_PERCENTILES:
+            lines.append(name + ".p{:d}:{:g}|ms".format(
+                percent, histogram.percentile(percent)).encode())
+        lines.append(name + ".max:{:g}|ms".format(histogram.max).encode())
+        lines.append(name + ".count:{}|c".format(
+            _format_number(histogram.count)).encode())
+
+    return lines
+
+
+def _send_lines(transport, max_packet_size, lines):
+    if not lines:
+        return
+
+    buffered = BufferedTransport(transport, max_packet_size)
+    try:
+        for line in lines:
+            buffered.send(line)
+        buffered.flush()
+    except Exception:  # pylint: disable=broad-except
+        logger.exception("Failed to send %d aggregated metrics.", len(lines))
+
+
+class AggregatingTransport(Transport):
+    """A transport which aggregates metrics in process before sending them.
+
+    Rather than sending every metric as it arrives, this transport
+    accumulates them across requests and a background thread (or greenlet,
+    if gevent has patched :py:mod:`threading`) sends the aggregated values
+    every ``flush_interval`` seconds:
+
+    * counters are summed, scaling up sampled counters by their sample rate.
+    * gauge replacements keep only the last value and relative changes are
+      summed.
+    * timer samples are binned to two significant figures and each bin's
+      value is sent once per sample it holds, packed many to a line, so
+      statsd still computes the right mean, sum, and upper percentiles.
+      Fractional counts left by sampled timers are rounded and made up with
+      a sample rate.
+    * histogram samples are added to a :py:class:`LogLinearHistogram` per
+      name and only a summary is sent: the percentiles in
+      :py:data:`HISTOGRAM_PERCENTILES` and the maximum as timers named
+      ``<name>.p50``, ``<name>.max``, etc. and the number of samples as a
+      counter named ``<name>.count``. Sending the summaries as timers means
+      statsd can still combine them across processes, e.g. the ``upper`` of
+      ``<name>.max``.
+
+    This trades per-request packets for a handful of packets per interval at
+    the cost of reporting metrics up to ``flush_interval`` late and losing
+    whatever was aggregated since the last flush if the process dies without
+    exiting cleanly.
+
+    :param baseplate.metrics.Transport transport: The transport to send the
+        aggregated metrics with.
+    :param float flush_interval: How often, in seconds, to send the
+        aggregated metrics.
+    :param int max_packet_size: The maximum size, in bytes, of a datagram.
 
-    # pylint: disable=super-init-not-called
-    def __init__(self, transport, namespace):
-        self.transport = BufferedTransport(transport)
-        self.namespace = namespace
+    """
+    summarizes_histograms = True
 
-    def __enter__(self):
-        return self
+    def __init__(self, transport, flush_interval=1.,
+                 max_packet_size=DEFAULT_MAX_PACKET_SIZE):
+        self.transport = transport
+        self.flush_interval = flush_interval
+        self.max_packet_size = max_packet_size
+        self.lock = threading.Lock()
+        self._reset()
 
-    def __exit__(self, exc_type, value, traceback):
-        self.flush()
+        self.flusher = threading.Thread(
+            target=self._flush_periodically, name="metrics flusher")
+        self.flusher.daemon = True
+        self.flusher.start()
+
+        atexit.register(self.flush)
+
+    def _reset(self):
+        self.counters = collections.defaultdict(float)
+        self.gauges = {}
+        self.timers = collections.defaultdict(collections.Counter)
+        self.histograms = {}
+        self.unaggregated = []
+
+    def send(self, serialized_metric):
+        with self.lock:
+            for line in serialized_metric.splitlines():
+                try:
+                    self._aggregate(line)
+                except (IndexError, ValueError, ZeroDivisionError):
+                    self.unaggregated.append(line)
+
+    def _aggregate(self, line):
+        for name, sample, value, metric_type, rate in _parse_line(line):
+            if metric_type == b"c":
+                self.counters[name] += float(value) / rate
+            elif metric_type == b"ms":
+                self.timers[name][_bin_timing(float(value))] += 1. / rate
+            elif metric_type == b"h":
+                histogram = self.histograms.get(name)
+                if histogram is None:
+                    histogram = self.histograms[name] = LogLinearHistogram()
+                histogram.add(float(value), 1. / rate)
+            elif metric_type == b"g":
+                absolute, delta = self.gauges.get(name, (None, 0.))
+                if value.startswith((b"+", b"-")):
+                    self.gauges[name] = (absolute, delta + float(value))
+                else:
+                    self.gauges[name] = (float(value), 0.)
+            else:
+                self.unaggregated.append(name + b":" + sample)
 
     def flush(self):
-        """Immediately send the batched metrics."""
-        self.transport.flush()
+        """Immediately send the aggregated metrics."""
+        with self.lock:
+            counters, gauges, timers = self.counters, self.gauges, self.timers
+            histograms, unaggregated = self.histograms, self.unaggregated
+            self._reset()
+
+        lines = _serialize_aggregates(counters, gauges, timers, histograms)
+        lines.extend(unaggregated)
+        _send_lines(self.transport, self.max_packet_size, lines)
+
+    def _flush_periodically(self):  # pragma: nocover
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+
+# the kinds of entries in a shared memory segment.
+_SHARED_COUNTER = 0
+_SHARED_GAUGE = 1
+_SHARED_TIMER = 2
+_SHARED_HISTOGRAM = 3
+
+# the bucket layout of timers and histograms in shared memory. coarser than
+# the default so an entry is about 3KB: 8 buckets per power of two (about 6%
+# error) from 1/16 of a millisecond to about 17 minutes.
+_SHARED_BUCKETS = LogLinearHistogram(min_exponent=-4, max_exponent=20,
+                                     sub_buckets=8)
+
+# gauges are stored as the last absolute value, when it was set, and the sum
+# of relative changes followed by the time and sum the reader last reported.
+_GAUGE_VALUE, _GAUGE_SET_AT, _GAUGE_DELTA, _GAUGE_REPORTED_SET_AT, \
+    _GAUGE_REPORTED_DELTA = range(5)
+
+
+class SharedMemoryTransport(Transport):
+    """A transport which aggregates metrics across processes on a host.
+
+    When many worker processes on a host send the same metrics, such as
+    Einhorn workers of one service, each would otherwise send its own
+    packets. With this transport, each worker instead writes its metrics into
+    its own slot of a memory-mapped file shared by all the workers and one
+    worker, elected with a lock on the file, periodically reads every slot
+    and sends a single aggregated stream for the host, cutting the packets
+    sent by roughly the number of workers.
+
+    Writing a metric doesn't need any coordination between processes: each
+    slot is only written to by the worker that claimed it and the values in
+    it only ever grow, so the elected worker sends the difference between
+    what it reads and what it last reported, which it records alongside. If
+    the elected worker exits, another takes over on its next flush.
+
+    Metrics are aggregated like :py:class:`AggregatingTransport` does, except
+    that timer samples are binned into the buckets of a
+    :py:class:`LogLinearHistogram` with 8 buckets per power of two rather
+    than to two significant figures. Gauges report the most recently set
+    value from any worker plus the sum of every worker's relative changes.
+
+    Metrics which can't be written to the file, because the worker couldn't
+    claim a slot, its slot is full, or the name is longer than 255 bytes, are
+    sent directly by the worker that sent them every ``flush_interval``
+    seconds.
+
+    Aggregated metrics written since the last flush by a worker that exits
+    are still reported, unless another worker claims its slot first.
+
+    A transport inherited by a forked process claims a slot of its own and
+    restarts the background flush in the new process the first time it's
+    sent a metric there.
+
+    :param baseplate.metrics.Transport transport: The transport to send the
+        aggregated metrics with.
+    :param str path: The path to the shared file. Every worker on the host
+        must use the same path, slot count, and slot size. A path on a
+        memory-backed filesystem such as ``/dev/shm`` is best.
+    :param float flush_interval: How often, in seconds, to send the
+        aggregated metrics.
+    :param int max_packet_size: The maximum size, in bytes, of a datagram.
+    :param int slot_count: The maximum number of workers using the file.
+    :param int slot_size: The size, in bytes, of each worker's slot. A
+        counter takes about 64 bytes, depending on the length of its name,
+        and a timer or histogram about 3KB.
+    :param baseplate.clock.Clock clock: The clock used to tell which worker
+        set a gauge most recently. It must agree between processes on the
+        host. If :py:data:`None`, the system-wide monotonic clock is used.
+
+    """
+    summarizes_histograms = True
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, transport, path, flush_interval=1.,
+                 max_packet_size=DEFAULT_MAX_PACKET_SIZE, slot_count=64,
+                 slot_size=1024 * 1024, clock=None):
+        self.transport = transport
+        self.flush_interval = flush_interval
+        self.max_packet_size = max_packet_size
+        self.clock = clock or default_clock
+        self.segment = SharedSegment(path, slot_count, slot_size)
+        self._start()
+        atexit.register(self.flush)
+
+    def _start(self):
+        # the lock may have been held by another thread when this process
+        # forked, and that thread didn't survive the fork.
+        self.lock = threading.Lock()
+        self.unaggregated = []
+        self._claim_slot()
+
+        self.flusher = threading.Thread(
+            target=self._flush_periodically, name="metrics flusher")
+        self.flusher.daemon = True
+        self.flusher.start()
+
+    def _claim_slot(self):
+        self.pid = os.getpid()
+        self.offsets = {}
+        self.slot = self.segment.claim()
+        if self.slot is None:
+            logger.warning(
+                "No free slots in %s, sending metrics from this process "
+                "without aggregating them.", self.segment.path)
+
+    def send(self, serialized_metric):
+        if self.pid != os.getpid():
+            self._start()
+
+        with self.lock:
+            for line in serialized_metric.splitlines():
+                try:
+                    self._record(line)
+                except (IndexError, ValueError, ZeroDivisionError):
+                    self.unaggregated.append(line)
+
+    def _offset(self, kind, name, count):
+        key = (kind, name)
+        offset = self.offsets.get(key)
+        if offset is None and self.slot is not None:
+            offset = self.segment.append(self.slot, kind, name, count)
+            if offset is not None:
+                self.offsets[key] = offset
+        return offset
+
+    def _record(self, line):
+        segment = self.segment
+        bucket_count = len(_SHARED_BUCKETS.counts)
+        for name, sample, value, metric_type, rate in _parse_line(line):
+            if metric_type == b"c":
+                offset = self._offset(_SHARED_COUNTER, name, 2)
+                if offset is not None:
+                    segment.add(offset, float(value) / rate)
+            elif metric_type in (b"ms", b"h"):
+                kind = _SHARED_TIMER if metric_type == b"ms" else _SHARED_HISTOGRAM
+                offset = self._offset(kind, name, 2 * bucket_count)
+                if offset is not None:
+                    # pylint: disable=protected-access
+                    index = _SHARED_BUCKETS._index(float(value))
+                    segment.add(offset + 8 * index, 1. / rate)
+            elif metric_type == b"g":
+                offset = self._offset(_SHARED_GAUGE, name, 5)
+                if offset is not None:
+                    if value.startswith((b"+", b"-")):
+                        segment.add(offset + 8 * _GAUGE_DELTA, float(value))
+                    else:
+                        segment.set(offset + 8 * _GAUGE_VALUE, float(value))
+                        segment.set(offset + 8 * _GAUGE_SET_AT,
+                                    self.clock.now())
+            else:
+                offset = None
+
+            if offset is None:
+                self.unaggregated.append(name + b":" + sample)
+
+    def _collect(self):
+        segment = self.segment
+        counters = collections.defaultdict(float)
+        gauges = {}
+        latest_gauges = {}
+        timers = {}
+        histograms = {}
+
+        for slot in range(segment.slot_count):
+            for kind, name, offset, count in segment.entries(slot):
+                if kind == _SHARED_COUNTER:
+                    total, reported = segment.read(offset, 2)
+                    if total != reported:
+                        counters[name] += total - reported
+                        segment.set(offset + 8, total)
+                elif kind == _SHARED_GAUGE:
+                    values = segment.read(offset, 5)
+                    delta = (values[_GAUGE_DELTA] -
+                             values[_GAUGE_REPORTED_DELTA])
+                    set_at = values[_GAUGE_SET_AT]
+                    is_new = set_at != values[_GAUGE_REPORTED_SET_AT]
+                    if not delta and not is_new:
+                        continue
+
+                    absolute, total_delta = gauges.get(name, (None, 0.))
+                    if is_new and set_at >= latest_gauges.get(name, 0.):
+                        latest_gauges[name] = set_at
+                        absolute = values[_GAUGE_VALUE]
+                    gauges[name] = (absolute, total_delta + delta)
+
+                    # the owner may be updating the other words right now,
+                    # so only write back what was reported.
+                    segment.set(offset + 8 * _GAUGE_REPORTED_SET_AT, set_at)
+                    segment.set(offset + 8 * _GAUGE_REPORTED_DELTA,
+                                values[_GAUGE_DELTA])
+                else:
+                    buckets = count // 2
+                    current = segment.read(offset, buckets)
+                    reported = segment.read(offset + 8 * buckets, buckets)
+                    if current == reported:
+                        continue
+
+                    aggregates = timers if kind == _SHARED_TIMER else histograms
+                    histogram = aggregates.get(name)
+                    if histogram is None:
+                        histogram = aggregates[name] = LogLinearHistogram(
+                            _SHARED_BUCKETS.min_exponent,
+                            _SHARED_BUCKETS.max_exponent,
+                            _SHARED_BUCKETS.sub_buckets)
+                    for index in range(buckets):
+                        histogram.counts[index] += current[index] - reported[index]
+                    segment.write(offset + 8 * buckets, current)
+
+        # only the bucket of the largest value is known, so use its value.
+        for histogram in itertools.chain(timers.values(), histograms.values()):
+            histogram.count = sum(histogram.counts)
+            for index in range(len(histogram.counts) - 1, -1, -1):
+                if histogram.counts[index]:
+                    # pylint: disable=protected-access
+                    histogram.max = histogram._value(index)
+                    break
+
+        timer_bins = collections.defaultdict(collections.Counter)
+        for name, histogram in timers.items():
+            for index, count in enumerate(histogram.counts):
+                if count:
+                    # pylint: disable=protected-access
+                    timer_bins[name][_bin_timing(histogram._value(index))] += count
+
+        return _serialize_aggregates(counters, gauges, timer_bins, histograms)
+
+    def flush(self):
+        """Immediately send metrics.
+
+        This sends the metrics that couldn't be aggregated and, if this
+        process is the one elected to, the aggregated metrics of every worker.
+
+        """
+        with self.lock:
+            lines, self.unaggregated = self.unaggregated, []
+
+        if self.segment.elect():
+            try:
+                with self.segment.layout_lock():
+                    lines.extend(self._collect())
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("Failed to read aggregated metrics.")
+
+        _send_lines(self.transport, self.max_packet_size, lines)
+
+    def _flush_periodically(self):  # pragma: nocover
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
 
 
 class Timer(object):
@@ -196,32 +1075,65 @@ class Timer(object):
 
     """
 
-    def __init__(self, transport, name):
+    __slots__ = ("transport", "name", "clock", "sample_rate", "sample_point",
+                 "start_time", "stopped")
+
+    def __init__(self, transport, name, clock=None, sample_rate=1.0,
+                 sample_point=None):
         self.transport = transport
         self.name = name
+        self.clock = clock or default_clock
+        self.sample_rate = sample_rate
+        self.sample_point = sample_point
 
         self.start_time = None
         self.stopped = False
 
     def start(self):
         """Record the current time as the start of the timer."""
-        assert not self.start_time, "timer already started"
+        assert self.start_time is None, "timer already started"
         assert not self.stopped, "time already stopped"
 
-        self.start_time = time.time()
+        self.start_time = self.clock.now()
 
     def stop(self):
         """Stop the timer and record the total elapsed time."""
-        assert self.start_time, "timer not started"
+        assert self.start_time is not None, "timer not started"
         assert not self.stopped, "time already stopped"
 
-        now = time.time()
-        elapsed = (now - self.start_time) * 1000.
-        serialized = self.name + (":{:g}|ms".format(elapsed).encode())
-        self.transport.send(serialized)
-
+        self.send(self.clock.now() - self.start_time)
         self.stopped = True
 
+    def reset(self, transport, name, sample_point=None):
+        """Prepare the timer to time something else from the beginning.
+
+        This lets a timer be reused rather than making a new one. See
+        :py:meth:`Batch.reset_timer` to reuse one for a batch.
+
+        :param transport: The transport to send the timing to.
+        :param bytes name: The fully qualified name of the timer.
+        :param float sample_point: The point the timer's sampling decisions
+            are based on, or :py:data:`None` to decide at random.
+
+        """
+        self.transport = transport
+        self.name = name
+        self.sample_point = sample_point
+        self.start_time = None
+        self.stopped = False
+
+    def send(self, elapsed):
+        """Directly record an elapsed time measured elsewhere.
+
+        :param float elapsed: The elapsed time, in seconds.
+
+        """
+        if not _sampled(self.sample_rate, self.sample_point):
+            return
+
+        serialized = self.name + (":{:g}|ms".format(elapsed * 1000.).encode())
+        self.transport.send(serialized + _rate_suffix(self.sample_rate))
+
     def __enter__(self):
         self.start()
 
@@ -229,30 +1141,60 @@ class Timer(object):
         self.stop()
 
 
+class Histogram(Timer):
+    """A timer whose samples are summarized into percentiles in process.
+
+    This is used the same way as a :py:class:`Timer` and can additionally
+    take samples which are not durations with :py:meth:`add_sample`.
+
+    """
+
+    __slots__ = ()
+
+    def send(self, elapsed):
+        self.add_sample(elapsed * 1000.)
+
+    def add_sample(self, value):
+        """Add a sample to the histogram.
+
+        :param float value: The value to add. Durations are recorded in
+            milliseconds.
+
+        """
+        if not _sampled(self.sample_rate, self.sample_point):
+            return
+
+        serialized = self.name + (":{:g}|h".format(value).encode())
+        self.transport.send(serialized + _rate_suffix(self.sample_rate))
+
+
 class Counter(object):
     """A counter for counting events over time."""
 
-    def __init__(self, transport, name):
+    __slots__ = ("transport", "name", "sample_point")
+
+    def __init__(self, transport, name, sample_point=None):
         self.transport = transport
         self.name = name
+        self.sample_point = sample_point
 
     def increment(self, delta=1, sample_rate=1.0):
         """Increment the counter.
 
         :param float delta: The amount to increase the counter by.
-        :param float sample_rate: What rate this counter is sampled at. [0-1].
+        :param float sample_rate: The fraction of increments to send. [0-1].
+            The increment is skipped the rest of the time.
 
         """
-        parts = [
-            self.name + (":{:g}".format(delta).encode()),
-            b"c",
-        ]
+        if delta == 1 and sample_rate == 1.0:
+            self.transport.send(self.name + b":1|c")
+            return
 
-        if sample_rate and sample_rate != 1.0:
-            parts.append("@{:g}".format(sample_rate).encode())
+        if not _sampled(sample_rate, self.sample_point):
+            return
 
-        serialized = b"|".join(parts)
-        self.transport.send(serialized)
+        serialized = self.name + (":{:g}|c".format(delta).encode())
+        self.transport.send(serialized + _rate_suffix(sample_rate))
 
     def decrement(self, delta=1, sample_rate=1.0):
         """Decrement the counter.
@@ -270,6 +1212,9 @@ class Gauge(object):
     by relative amounts or have their values wholesale replaced.
 
     """
+
+    __slots__ = ("transport", "name")
+
     def __init__(self, transport, name):
         self.transport = transport
         self.name = name
@@ -310,13 +1255,248 @@ class Gauge(object):
         self.transport.send(serialized)
 
 
-def make_client(namespace, endpoint):
+class _BatchTimer(Timer):
+    __slots__ = ()
+
+    def send(self, elapsed):
+        if _sampled(self.sample_rate, self.sample_point):
+            self.transport.add_timing(
+                self.name, elapsed * 1000., self.sample_rate)
+
+
+class _BatchCounter(Counter):
+    __slots__ = ()
+
+    def increment(self, delta=1, sample_rate=1.0):
+        if _sampled(sample_rate, self.sample_point):
+            self.transport.add_counter(self.name, delta, sample_rate)
+
+
+class _BatchGauge(Gauge):
+    __slots__ = ()
+
+    def increment(self, delta=1):
+        self.transport.add_gauge(self.name, delta, relative=True)
+
+    def replace(self, new_value):
+        assert new_value >= 0, "gauges cannot be replaced with negative numbers"
+        self.transport.add_gauge(self.name, new_value)
+
+
+#: The maximum number of distinct metric names a client remembers the fully
+#: qualified, encoded form of. Names beyond this are still usable, they're
+#: just encoded each time.
+MAX_CACHED_NAMES = 2048
+
+
+class BaseClient(object):
+    _timer_type = Timer
+    _histogram_type = Histogram
+    _counter_type = Counter
+    _gauge_type = Gauge
+
+    def __init__(self, transport, namespace, clock=None,
+                 max_packet_size=DEFAULT_MAX_PACKET_SIZE):
+        self.transport = transport
+        self.namespace = namespace.encode("ascii")
+        self.clock = clock or default_clock
+        self.max_packet_size = max_packet_size
+        self.names = {}
+        self.sample_point = None
+
+    def _qualify(self, name):
+        try:
+            return self.names[name]
+        except KeyError:
+            qualified = _metric_join(self.namespace, name.encode("ascii"))
+            if len(self.names) < MAX_CACHED_NAMES:
+                self.names[name] = qualified
+            return qualified
+
+    def timer(self, name, sample_rate=1.0):
+        """Return a Timer with the given name.
+
+        :param str name: The name the timer should have.
+        :param float sample_rate: The fraction of timings to send. [0-1].
+
+        :rtype: :py:class:`Timer`
+
+        """
+        return self._timer_type(self.transport, self._qualify(name), self.clock,
+                                sample_rate, self.sample_point)
+
+    def histogram(self, name, sample_rate=1.0):
+        """Return a Histogram with the given name.
+
+        Histograms are only summarized in process when the client aggregates
+        metrics (see :py:class:`AggregatingTransport`). Otherwise, a plain
+        :py:class:`Timer` is returned so that samples still arrive at statsd
+        in a form it understands.
+
+        :param str name: The name the histogram should have.
+        :param float sample_rate: The fraction of samples to send. [0-1].
+
+        :rtype: :py:class:`Histogram`
+
+        """
+        if not self.transport.summarizes_histograms:
+            metric_type = self._timer_type
+        else:
+            metric_type = self._histogram_type
+        return metric_type(self.transport, self._qualify(name), self.clock,
+                           sample_rate, self.sample_point)
+
+    def counter(self, name):
+        """Return a Counter with the given name.
+
+        :param str name: The name the counter should have.
+
+        :rtype: :py:class:`Counter`
+
+        """
+        return self._counter_type(
+            self.transport, self._qualify(name), self.sample_point)
+
+    def gauge(self, name):
+        """Return a Gauge with the given name.
+
+        :param str name: The name the gauge should have.
+
+        :rtype: :py:class:`Gauge`
+
+        """
+        return self._gauge_type(self.transport, self._qualify(name))
+
+
+class Client(BaseClient):
+    """A client for statsd.
+
+    :param baseplate.clock.Clock clock: The clock timers measure elapsed time
+        with. If :py:data:`None`, a monotonic clock is used.
+    :param int max_packet_size: The maximum size, in bytes, of the datagrams
+        batches send.
+
+    Sampled metrics (those with a ``sample_rate`` less than 1) are only sent
+    the given fraction of the time. Normally, each metric is kept or dropped
+    at random independently of the others. When a batch is created for a
+    trace, the decision is instead derived from the trace ID, so all of a
+    request's metrics with the same sample rate are kept or dropped together
+    and metrics with lower rates are only kept for requests where those with
+    higher rates are too.
+
+    """
+
+    def batch(self, trace_id=None):
+        """Return a client-like object which batches up metrics.
+
+        Batching metrics can reduce the number of packets that are sent to
+        the stats aggregator.
+
+        :param int trace_id: If given, make sampling decisions for metrics in
+            this batch deterministically based on this trace ID.
+
+        :rtype: :py:class:`Batch`
+
+        """
+        batch = Batch(self.transport, self.namespace, self.clock,
+                      self.max_packet_size)
+        if trace_id is not None:
+            batch.sample_point = _sample_point(trace_id)
+        # batches share their client's cache since they're short-lived and
+        # use the same names over and over.
+        batch.names = self.names
+        return batch
+
+
+class Batch(BaseClient):
+    """A batch of metrics to send to statsd.
+
+    The batch also supports the `context manager protocol`_, for use with
+    Python's ``with`` statement. When the context is exited, the batch will
+    automatically :py:meth:`flush`.
+
+    .. _context manager protocol:
+        https://docs.python.org/3/reference/datamodel.html#context-managers
+
+    """
+    _timer_type = _BatchTimer
+    _counter_type = _BatchCounter
+    _gauge_type = _BatchGauge
+
+    # pylint: disable=super-init-not-called
+    def __init__(self, transport, namespace, clock=None,
+                 max_packet_size=DEFAULT_MAX_PACKET_SIZE):
+        self.transport = BufferedTransport(transport, max_packet_size)
+        self.namespace = namespace
+        self.clock = clock or default_clock
+        self.max_packet_size = max_packet_size
+        self.names = {}
+        self.sample_point = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, value, traceback):
+        self.flush()
+
+    def flush(self):
+        """Immediately send the batched metrics."""
+        self.transport.flush()
+
+    def reset(self, trace_id=None):
+        """Prepare a flushed batch to be used again.
+
+        :param int trace_id: If given, make sampling decisions for metrics in
+            the batch deterministically based on this trace ID.
+
+        """
+        if trace_id is not None:
+            self.sample_point = _sample_point(trace_id)
+        else:
+            self.sample_point = None
+
+    def reset_timer(self, timer, name):
+        """Reuse a timer from this or another batch as one of this batch's.
+
+        The timer is reset as though it were just returned by :py:meth:`timer`
+        or :py:meth:`histogram`, keeping its type and sample rate.
+
+        :param baseplate.metrics.Timer timer: The timer to reuse.
+        :param str name: The name the timer should have.
+
+        :rtype: :py:class:`Timer`
+
+        """
+        timer.reset(self.transport, self._qualify(name), self.sample_point)
+        return timer
+
+
+# pylint: disable=too-many-arguments
+def make_client(namespace, endpoint, aggregate_interval=None,
+                max_packet_size=DEFAULT_MAX_PACKET_SIZE, queue_size=None,
+                shared_memory_path=None, use_sendmmsg=False):
     """Return a configured client.
 
     :param str namespace: The root key to namespace all metrics under.
     :param baseplate.config.EndpointConfiguration endpoint: The endpoint to
         send metrics to or :py:data:`None`.  If :py:data:`None`, the returned
-        client will discard all metrics.
+        client will discard all metrics. If the endpoint is a Unix domain
+        socket, a :py:class:`UnixDatagramTransport` is used.
+    :param float aggregate_interval: If not :py:data:`None`, aggregate metrics
+        in process and send them every this many seconds. See
+        :py:class:`AggregatingTransport`.
+    :param int max_packet_size: The maximum size, in bytes, of the datagrams
+        sent. Larger values are safe when sending over the loopback interface
+        or a Unix domain socket.
+    :param int queue_size: If not :py:data:`None`, send metrics from a
+        background thread, queueing up to this many datagrams. See
+        :py:class:`QueuedTransport`.
+    :param str shared_memory_path: If not :py:data:`None`, aggregate metrics
+        across the processes on the host that use this path and send them
+        every ``aggregate_interval`` seconds, or every second if that's not
+        given. See :py:class:`SharedMemoryTransport`.
+    :param bool use_sendmmsg: Whether or not to send several datagrams at
+        once with ``sendmmsg(2)``. See :py:class:`RawTransport`.
     :return: A configured client.
     :rtype: :py:class:`baseplate.metrics.Client`
 
@@ -325,7 +1505,21 @@ def make_client(namespace, endpoint):
     """
 
     if endpoint:
-        transport = RawTransport(endpoint)
+        if endpoint.family == socket.AF_UNIX:
+            transport = UnixDatagramTransport(endpoint, use_sendmmsg)
+        else:
+            transport = RawTransport(endpoint, use_sendmmsg)
+
+        if queue_size is not None:
+            transport = QueuedTransport(transport, queue_size)
     else:
         transport = NullTransport()
-    return Client(transport, namespace)
+
+    if shared_memory_path is not None:
+        transport = SharedMemoryTransport(
+            transport, shared_memory_path, aggregate_interval or 1.,
+            max_packet_size)
+    elif aggregate_interval is not None:
+        transport = AggregatingTransport(
+            transport, aggregate_interval, max_packet_size)
+    return Client(transport, namespace, max_packet_size=max_packet_size)
@@ -6,6 +6,8 @@ from __future__ import unicode_literals
 
 import time
 
+from .clock import default_clock
+
 
 class RetryPolicy(object):
     """A policy for retrying operations.
@@ -47,7 +49,7 @@ class RetryPolicy(object):
         return self.yield_attempts()
 
     @staticmethod
-    def new(attempts=None, budget=None, backoff=None):
+    def new(attempts=None, budget=None, backoff=None, clock=None):
         """Create a new retry policy with the given constraints.
 
         :param int attempts: The maximum number of times the operation can be
@@ -57,6 +59,8 @@ class RetryPolicy(object):
         :param float backoff: The base amount of time, in seconds, for
             exponential backoff between attempts. ``N`` in (``N *
             2**attempts``).
+        :param baseplate.clock.Clock clock: The clock to measure the time
+            budget with. If :py:data:`None`, a monotonic clock is used.
 
         """
         policy = IndefiniteRetryPolicy()
@@ -65,7 +69,7 @@ class RetryPolicy(object):
             policy = MaximumAttemptsRetryPolicy(policy, attempts)
 
         if budget is not None:
-            policy = TimeBudgetRetryPolicy(policy, budget)
+            policy = TimeBudgetRetryPolicy(policy, budget, clock=clock)
 
         if backoff is not None:
             policy = ExponentialBackoffRetryPolicy(policy, backoff)
@@ -95,18 +99,19 @@ class MaximumAttemptsRetryPolicy(RetryPolicy):
 
 class TimeBudgetRetryPolicy(RetryPolicy):
     """Constrain attempts to an overall time budget."""
-    def __init__(self, policy, budget):
+    def __init__(self, policy, budget, clock=None):
         assert budget >= 0, "The time budget must not be negative."
         self.subpolicy = policy
         self.budget = budget
+        self.clock = clock or default_clock
 
     def yield_attempts(self):
-        start_time = time.time()
+        start_time = self.clock.now()
 
         yield self.budget
 
         for _ in self.subpolicy:
-            elapsed = time.time() - start_time
+            elapsed = self.clock.now() - start_time
             time_remaining = self.budget - elapsed
             if time_remaining <= 0:
                 break
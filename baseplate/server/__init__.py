@@ -22,7 +22,7 @@ import warnings
 
 from . import einhorn, reloader
 from .._compat import configparser
-from ..config import Endpoint
+from ..config import Endpoint, Timespan
 
 
 logger = logging.getLogger(__name__)
@@ -82,10 +82,17 @@ def configure_logging(config, debug):
     else:
         logging_level = logging.INFO
 
-    formatter = logging.Formatter(
-        "%(process)s:%(threadName)s:%(name)s:%(levelname)s:%(message)s")
-
-    handler = logging.StreamHandler()
+    log_queue_size = config.server.get("log_queue_size") if config.server else None
+    if log_queue_size:
+        from ..diagnostics.logging import NonBlockingHandler, TraceIdFilter
+        handler = NonBlockingHandler(max_queue_size=int(log_queue_size))
+        handler.addFilter(TraceIdFilter())
+        formatter = logging.Formatter(
+            "%(process)s:%(trace_id)s:%(name)s:%(levelname)s:%(message)s")
+    else:
+        handler = logging.StreamHandler()
+        formatter = logging.Formatter(
+            "%(process)s:%(threadName)s:%(name)s:%(levelname)s:%(message)s")
     handler.setFormatter(formatter)
 
     root_logger = logging.getLogger()
@@ -151,6 +158,39 @@ def register_signal_handlers():
     signal.siginterrupt(signal.SIGUSR1, False)
 
 
+def start_watchdog(server_config, app_config):
+    """Start a watchdog for the gevent hub if the server is configured to.
+
+    Metrics about blocking are sent if the app is configured for metrics.
+    They're sent directly to ``metrics.endpoint``, rather than through a
+    client with the app's queueing and aggregation options, so the watchdog
+    doesn't start another flusher thread or claim another shared memory slot
+    alongside the app's own client.
+
+    """
+    threshold = server_config.get("blocked_hub_threshold")
+    if not threshold:
+        return None
+
+    from .watchdog import HubBlockingWatchdog
+
+    metrics_client = None
+    if "metrics.namespace" in app_config:
+        from ..metrics import make_client
+        endpoint = app_config.get("metrics.endpoint")
+        metrics_client = make_client(
+            app_config["metrics.namespace"],
+            Endpoint(endpoint) if endpoint else None,
+        )
+
+    watchdog = HubBlockingWatchdog(
+        threshold=Timespan(threshold).total_seconds(),
+        metrics_client=metrics_client,
+    )
+    watchdog.start()
+    return watchdog
+
+
 def load_app_and_run_server():
     """Parse arguments, read configuration, and start the server."""
 
@@ -163,6 +203,7 @@ def load_app_and_run_server():
     app = make_app(config.app)
     listener = make_listener(args.bind)
     server = make_server(config.server, listener, app)
+    start_watchdog(config.server, config.app)
 
     if einhorn.is_worker():
         einhorn.ack_startup()
@@ -0,0 +1,131 @@
+"""Detection of code that blocks the gevent hub.
+
+A call that blocks without yielding to the gevent hub, such as I/O through a
+module that wasn't monkeypatched or a long CPU-bound loop, stalls every
+greenlet in the process. The watchdog notices when the hub has been stalled
+for too long and records what the process was doing at the time.
+
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import logging
+import sys
+import traceback
+
+from ..clock import default_clock
+
+
+logger = logging.getLogger(__name__)
+
+
+class HubBlockingWatchdog(object):
+    """Report when the gevent hub is blocked for longer than a threshold.
+
+    A greenlet scheduled on the hub records a heartbeat at a regular
+    interval while a native thread, which keeps running even when the hub is
+    stuck, checks how stale the heartbeat is. Once the heartbeat is late by
+    more than ``threshold`` seconds the thread captures the main thread's
+    stack, which is the stack of whatever greenlet is blocking the hub.
+
+    Nothing is logged or sent from the native thread because logging and the
+    metrics transport are not safe to use from outside the hub's thread when
+    gevent has patched them. Instead, the heartbeat greenlet reports the stall
+    once the hub gets back to it: it increments the ``runtime.gevent.blocked``
+    counter, sends the stall's duration to the ``runtime.gevent.blocked_time``
+    timer and logs a warning with the captured stack. At most one warning is
+    logged per ``log_interval`` seconds; the number of stalls that weren't
+    logged is included in the next warning.
+
+    :param float threshold: How late, in seconds, the heartbeat must be before
+        the hub is considered blocked.
+    :param baseplate.metrics.Client metrics_client: If given, where to send
+        the metrics.
+    :param float log_interval: The minimum time, in seconds, between logged
+        warnings.
+
+    """
+    def __init__(self, threshold=.1, metrics_client=None, log_interval=60.,
+                 clock=None):
+        self.threshold = threshold
+        self.metrics_client = metrics_client
+        self.log_interval = log_interval
+        self.clock = clock or default_clock
+
+        self.heartbeat_interval = threshold / 2
+        self.last_heartbeat = self.clock.now()
+        self.main_thread_id = None
+        self.blocked_stack = None
+        self.last_logged = None
+        self.suppressed = 0
+
+    def start(self):  # pragma: nocover
+        """Start the heartbeat greenlet and the watchdog thread.
+
+        This must be called from the thread running the gevent hub.
+
+        """
+        import gevent
+        from gevent import monkey
+
+        thread_module = "thread" if sys.version_info.major == 2 else "_thread"
+        get_ident, start_new_thread = monkey.get_original(
+            thread_module, ["get_ident", "start_new_thread"])
+        sleep = monkey.get_original("time", "sleep")
+
+        def heartbeat():
+            while True:
+                gevent.sleep(self.heartbeat_interval)
+                self._on_heartbeat()
+
+        def watch():
+            while True:
+                sleep(self.heartbeat_interval)
+                self._check()
+
+        self.main_thread_id = get_ident()
+        self.last_heartbeat = self.clock.now()
+        gevent.spawn(heartbeat)
+        start_new_thread(watch, ())
+
+    def _lag(self, now):
+        return now - self.last_heartbeat - self.heartbeat_interval
+
+    def _check(self):
+        if self.blocked_stack is not None:
+            return
+
+        if self._lag(self.clock.now()) > self.threshold:
+            # pylint: disable=protected-access
+            frame = sys._current_frames().get(self.main_thread_id)
+            self.blocked_stack = traceback.format_stack(frame) if frame else []
+
+    def _on_heartbeat(self):
+        now = self.clock.now()
+        lag = self._lag(now)
+        self.last_heartbeat = now
+
+        stack, self.blocked_stack = self.blocked_stack, None
+        if stack is None or lag <= self.threshold:
+            # the stack may have been captured as the hub got unblocked, in
+            # which case it's of innocent code and not worth reporting.
+            return
+
+        if self.metrics_client:
+            with self.metrics_client.batch() as batch:
+                batch.counter("runtime.gevent.blocked").increment()
+                batch.timer("runtime.gevent.blocked_time").send(lag)
+
+        if self.last_logged is not None and \
+                now - self.last_logged < self.log_interval:
+            self.suppressed += 1
+            return
+
+        logger.warning(
+            "The gevent hub was blocked for %.3f seconds (%d earlier "
+            "occurrences not logged). Stack of the blocking greenlet:\n%s",
+            lag, self.suppressed, "".join(stack).rstrip("\n"))
+        self.last_logged = now
+        self.suppressed = 0
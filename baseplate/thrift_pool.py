@@ -22,7 +22,6 @@ from __future__ import unicode_literals
 import contextlib
 import logging
 import socket
-import time
 
 from thrift.protocol import THeaderProtocol
 from thrift.protocol.TProtocol import TProtocolException
@@ -31,6 +30,7 @@ from thrift.transport import TSocket
 from thrift.transport.TTransport import TTransportException
 
 from ._compat import queue
+from .clock import default_clock
 from .retry import RetryPolicy
 
 
@@ -60,15 +60,19 @@ class ThriftConnectionPool(object):
         RPC call can take before a TimeoutError is raised.
     :param int max_retries: The maximum number of times the pool will attempt
         to open a connection.
+    :param baseplate.clock.Clock clock: The clock to measure connection age
+        with. If :py:data:`None`, a monotonic clock is used.
 
     All exceptions raised by this class derive from
     :py:exc:`~thrift.transport.TTransport.TTransportException`.
 
     """
     # pylint: disable=too-many-arguments
-    def __init__(self, endpoint, size=10, max_age=120, timeout=1, max_retries=3):
+    def __init__(self, endpoint, size=10, max_age=120, timeout=1, max_retries=3,
+                 clock=None):
         self.endpoint = endpoint
         self.max_age = max_age
+        self.clock = clock or default_clock
         self.retry_policy = RetryPolicy.new(attempts=max_retries)
         self.timeout = timeout
 
@@ -87,7 +91,7 @@ class ThriftConnectionPool(object):
 
         for _ in self.retry_policy:
             if prot:
-                if time.time() - prot.baseplate_birthdate < self.max_age:
+                if self.clock.now() - prot.baseplate_birthdate < self.max_age:
                     return prot
                 else:
                     prot.trans.close()
@@ -104,7 +108,7 @@ class ThriftConnectionPool(object):
                 prot = None
                 continue
 
-            prot.baseplate_birthdate = time.time()
+            prot.baseplate_birthdate = self.clock.now()
 
             return prot
 
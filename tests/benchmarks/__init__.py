@@ -0,0 +1,119 @@
+"""Micro-benchmarks for Baseplate's hot paths.
+
+These are not collected as part of the test suite. The hot paths in
+:py:mod:`tests.benchmarks.suite` can be run, and compared against a saved
+baseline, with::
+
+    python -m tests.benchmarks
+
+and each of the other modules can be run directly, e.g.::
+
+    python -m tests.benchmarks.spans
+
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import gc
+import sys
+import time
+
+try:
+    import tracemalloc
+except ImportError:  # pragma: nocover
+    tracemalloc = None
+
+
+try:
+    _timer = time.perf_counter
+except AttributeError:  # pragma: nocover
+    _timer = time.time
+
+
+def measure_time(fn, iterations):
+    """Return the mean number of nanoseconds taken by each call to ``fn``."""
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        start = _timer()
+        for _ in range(iterations):
+            fn()
+        elapsed = _timer() - start
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return elapsed * 1e9 / iterations
+
+
+def measure_retained_bytes(make, count):
+    """Return the mean number of bytes kept alive by each result of ``make``.
+
+    Returns :py:data:`None` if :py:mod:`tracemalloc` is not available.
+
+    """
+    if tracemalloc is None:  # pragma: nocover
+        return None
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        kept = [make() for _ in range(count)]
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del kept
+    return (after - before) / count
+
+
+def measure_allocations(fn, iterations):
+    """Return the mean number of memory blocks allocated by each call to ``fn``.
+
+    This counts allocations, whether or not they're freed again before the
+    call returns, by checking :py:func:`sys.getallocatedblocks` between each
+    bytecode instruction. Blocks allocated and freed again within a single
+    instruction aren't seen, nor are objects reused from CPython's free lists,
+    so this is a lower bound. Returns :py:data:`None` before Python 3.7.
+
+    """
+    if not hasattr(sys, "getallocatedblocks") or sys.version_info < (3, 7):
+        return None  # pragma: nocover
+
+    allocated = [0]
+    blocks = [0]
+
+    def trace(frame, event, arg):  # pylint: disable=unused-argument
+        frame.f_trace_opcodes = True
+        current = sys.getallocatedblocks()
+        if current > blocks[0]:
+            allocated[0] += current - blocks[0]
+        blocks[0] = current
+        return trace
+
+    fn()  # warm up any caches.
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    blocks[0] = sys.getallocatedblocks()
+    sys.settrace(trace)
+    try:
+        for _ in range(iterations):
+            fn()
+    finally:
+        sys.settrace(None)
+        if gc_was_enabled:
+            gc.enable()
+    return allocated[0] / iterations
+
+
+def report(name, ns_per_op=None, bytes_per_op=None, allocations_per_op=None):
+    """Print a single benchmark result line."""
+    parts = [name.ljust(40)]
+    if ns_per_op is not None:
+        parts.append("{:10.0f} ns/op".format(ns_per_op))
+    if bytes_per_op is not None:
+        parts.append("{:10.0f} bytes/op".format(bytes_per_op))
+    if allocations_per_op is not None:
+        parts.append("{:8.1f} allocs/op".format(allocations_per_op))
+    print("  ".join(parts))
@@ -0,0 +1,189 @@
+"""Run the benchmark suite and optionally compare it against a baseline.
+
+Run every benchmark in :py:mod:`tests.benchmarks.suite`::
+
+    python -m tests.benchmarks
+
+Save the results as a baseline, e.g. before making a change::
+
+    python -m tests.benchmarks --save baseline.json
+
+And then compare against it afterwards. The command exits with a non-zero
+status if any benchmark got slower than the tolerance, or allocates more::
+
+    python -m tests.benchmarks --baseline baseline.json
+
+Timings are only comparable between runs on the same machine. Each benchmark
+is timed for several rounds and the fastest is used. How much the rounds vary
+is reported as the benchmark's noise, and unless ``--tolerance`` is given, a
+benchmark only counts as slower if it lost more than a few times the noise
+measured in either run.
+
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import argparse
+import collections
+import json
+import math
+import platform
+import sys
+
+from . import measure_allocations, measure_time
+from .suite import BENCHMARKS
+
+
+# without --tolerance, a benchmark must lose this many times the noise
+# measured in either run, and at least the minimum, to count as slower.
+_NOISE_FACTOR = 3
+_MIN_TOLERANCE = .05
+
+# allocation counts are averaged over many calls, so caches filling up or a
+# dict resizing can move them by a fraction of an allocation.
+_ALLOCATION_SLACK = .5
+
+
+def _noise(rounds):
+    """Return the standard deviation of ``rounds`` relative to their mean."""
+    mean = sum(rounds) / len(rounds)
+    variance = sum((value - mean) ** 2 for value in rounds) / len(rounds)
+    return math.sqrt(variance) / mean
+
+
+def run_benchmarks(benchmarks, repeat):
+    """Return the results of ``benchmarks`` as dicts, by name.
+
+    Each benchmark is timed for ``repeat`` rounds, taking turns with the
+    others, so that the rounds of every benchmark are spread over the whole
+    run and slow changes in the rest of the system show up in their noise.
+    The fastest round is used, as the slower ones mostly measure interference
+    from the rest of the system. How much the rounds vary is kept as the
+    benchmark's ``noise``.
+
+    :param dict benchmarks: ``(setup, iterations)`` pairs by name.
+
+    """
+    operations = collections.OrderedDict(
+        (name, (setup(), iterations))
+        for name, (setup, iterations) in benchmarks.items())
+
+    rounds = collections.defaultdict(list)
+    for _ in range(repeat):
+        for name, (operation, iterations) in operations.items():
+            rounds[name].append(measure_time(operation, iterations))
+
+    results = collections.OrderedDict()
+    for name, (operation, iterations) in operations.items():
+        results[name] = {
+            "ops_per_sec": 1e9 / min(rounds[name]),
+            "noise": _noise(rounds[name]),
+            "allocations_per_op": measure_allocations(
+                operation, min(iterations, 1000)),
+        }
+    return results
+
+
+def tolerance_for(result, baseline):
+    """Return how much slower ``result`` may be than ``baseline``.
+
+    This is a fraction of the baseline's speed, derived from the noise
+    measured in both runs.
+
+    """
+    noise = max(result["noise"], baseline.get("noise", 0.))
+    return max(_NOISE_FACTOR * noise, _MIN_TOLERANCE)
+
+
+def find_regressions(result, baseline, tolerance):
+    """Return descriptions of how ``result`` is worse than ``baseline``."""
+    regressions = []
+
+    if result["ops_per_sec"] < baseline["ops_per_sec"] * (1 - tolerance):
+        regressions.append("slower")
+
+    allocations = result["allocations_per_op"]
+    allocations_before = baseline.get("allocations_per_op")
+    if allocations is not None and allocations_before is not None:
+        if allocations > allocations_before + _ALLOCATION_SLACK:
+            regressions.append("allocates more")
+
+    return regressions
+
+
+def _format_change(value, before):
+    if value is None or not before:
+        return ""
+    return "{:+6.1f}%".format((value - before) * 100. / before)
+
+
+def main(args):
+    parser = argparse.ArgumentParser(
+        description=sys.modules[__name__].__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("--baseline", type=argparse.FileType("r"),
+        metavar="FILE", help="compare against results saved in FILE")
+    parser.add_argument("--save", type=argparse.FileType("w"),
+        metavar="FILE", help="save the results to FILE")
+    parser.add_argument("--tolerance", type=float,
+        help="the fraction by which a benchmark may get slower than the "
+             "baseline before it's a regression (default: {:d} times the "
+             "noise measured in either run, but at least {:g})".format(
+                 _NOISE_FACTOR, _MIN_TOLERANCE))
+    parser.add_argument("--filter", default="", metavar="TEXT",
+        help="only run benchmarks whose name contains TEXT")
+    parser.add_argument("--repeat", type=int, default=7,
+        help="how many rounds of each benchmark to time (default: 7)")
+    args = parser.parse_args(args)
+
+    baseline = {}
+    if args.baseline:
+        baseline = json.load(args.baseline)["benchmarks"]
+
+    results = run_benchmarks(collections.OrderedDict(
+        (name, benchmark) for name, benchmark in BENCHMARKS.items()
+        if args.filter in name), args.repeat)
+
+    regressed = []
+    for name, result in results.items():
+        before = baseline.get(name, {})
+
+        columns = [
+            name.ljust(40),
+            "{:12,.0f} ops/s".format(result["ops_per_sec"]),
+            _format_change(result["ops_per_sec"], before.get("ops_per_sec")),
+            "+/-{:4.1%}".format(result["noise"]),
+        ]
+        if result["allocations_per_op"] is not None:
+            columns.append("{:6.1f} allocs/op".format(result["allocations_per_op"]))
+            columns.append(_format_change(
+                result["allocations_per_op"], before.get("allocations_per_op")))
+
+        if before:
+            tolerance = args.tolerance
+            if tolerance is None:
+                tolerance = tolerance_for(result, before)
+            regressions = find_regressions(result, before, tolerance)
+            if regressions:
+                regressed.append(name)
+                columns.append("REGRESSED: {} (tolerance {:.0%})".format(
+                    ", ".join(regressions), tolerance))
+        print("  ".join(column for column in columns if column))
+
+    if args.save:
+        json.dump({
+            "python": platform.python_version(),
+            "benchmarks": results,
+        }, args.save, indent=2, sort_keys=True)
+
+    if regressed:
+        print("\n{:d} benchmark(s) regressed.".format(len(regressed)))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
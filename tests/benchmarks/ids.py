@@ -0,0 +1,31 @@
+"""Cost of generating trace and span IDs."""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import random
+
+from baseplate.core import RandomIDGenerator
+
+from . import measure_time, report
+
+
+ITERATIONS = 1000000
+
+
+def main():
+    report(
+        "random.getrandbits(64)",
+        ns_per_op=measure_time(lambda: random.getrandbits(64), ITERATIONS),
+    )
+
+    generator = RandomIDGenerator()
+    report(
+        "RandomIDGenerator.generate",
+        ns_per_op=measure_time(generator.generate, ITERATIONS),
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""Cost of emitting metrics through clients and batches."""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import socket
+
+from baseplate.core import RootSpan
+from baseplate.diagnostics.metrics import MetricsBaseplateObserver
+from baseplate.metrics import Client, NullTransport, RawTransport
+from baseplate._sendmmsg import sendmmsg
+
+from . import measure_allocations, measure_time, report
+
+
+ITERATIONS = 200000
+
+
+class _DiscardTransport(NullTransport):
+    def send(self, serialized_metric):
+        pass
+
+
+class _Context(object):
+    pass
+
+
+def _request(observer):
+    """Return a function that goes through one request with a child span."""
+    context = _Context()
+
+    def request():
+        root_span = RootSpan(1, None, 2, "route")
+        if observer is not None:
+            observer.on_root_span_created(context, root_span)
+        root_span.start()
+        child = root_span.make_child("downstream")
+        child.start()
+        child.stop()
+        if observer is not None:
+            context.metrics.counter("example.name").increment()
+        root_span.stop()
+
+    return request
+
+
+def main():
+    client = Client(_DiscardTransport(), "namespace")
+
+    report(
+        "Client.counter(name)",
+        ns_per_op=measure_time(lambda: client.counter("example.name"), ITERATIONS),
+    )
+
+    report(
+        "Client.counter(name).increment()",
+        ns_per_op=measure_time(
+            lambda: client.counter("example.name").increment(), ITERATIONS),
+    )
+
+    batch = client.batch()
+    report(
+        "Batch.counter(name).increment()",
+        ns_per_op=measure_time(
+            lambda: batch.counter("example.name").increment(), ITERATIONS),
+    )
+
+    def timed_batch():
+        batch = client.batch()
+        with batch.timer("server.route"):
+            pass
+        batch.counter("example.name").increment()
+        batch.flush()
+
+    report(
+        "batch with a timer and counter",
+        ns_per_op=measure_time(timed_batch, ITERATIONS),
+    )
+
+    # the request without metrics is the baseline the others add to.
+    requests = [("request without metrics", _request(None))]
+    for reuse_batches in (False, True):
+        observer = MetricsBaseplateObserver(
+            Client(_DiscardTransport(), "namespace"),
+            reuse_batches=reuse_batches)
+        requests.append((
+            "request metrics (reuse_batches={})".format(reuse_batches),
+            _request(observer),
+        ))
+
+    for name, request in requests:
+        report(
+            name,
+            ns_per_op=min(
+                measure_time(request, ITERATIONS // 10) for _ in range(5)),
+            allocations_per_op=measure_allocations(request, ITERATIONS // 100),
+        )
+
+    packets = [b"x" * 1000] * 16
+    receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    receiver.bind(("127.0.0.1", 0))
+    transport = RawTransport.__new__(RawTransport)
+    transport.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    transport.socket.connect(receiver.getsockname())
+    transport.use_sendmmsg = True
+
+    def send_each():
+        for packet in packets:
+            transport.send(packet)
+
+    for name, fn in (("send() x16", send_each),
+                     ("send_many(16)", lambda: transport.send_many(packets))):
+        ns_per_op = measure_time(fn, ITERATIONS // 100)
+        report(
+            "RawTransport.{} ({:.0f} packets/s)".format(
+                name, len(packets) * 1e9 / ns_per_op),
+            ns_per_op=ns_per_op,
+        )
+    if sendmmsg is None:
+        print("(sendmmsg is not available, send_many fell back to send)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Cost of creating child spans during a request.
+
+A fan-out-heavy request (e.g. hundreds of redis calls) creates one child span
+per call, each of which carries a metrics observer and timer.
+
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from baseplate.core import RootSpan
+from baseplate.diagnostics.metrics import MetricsRootSpanObserver
+from baseplate.metrics import Client, NullTransport
+
+from . import measure_retained_bytes, measure_time, report
+
+
+ITERATIONS = 100000
+
+
+def make_root_span(with_metrics):
+    root_span = RootSpan(1, 2, 3, "benchmark")
+    if with_metrics:
+        batch = Client(NullTransport(), "benchmark").batch()
+        root_span.register(MetricsRootSpanObserver(batch, "server.benchmark"))
+    return root_span
+
+
+def run_child_span(root_span):
+    def child_span():
+        span = root_span.make_child("child")
+        span.start()
+        span.stop()
+    return child_span
+
+
+def main():
+    for with_metrics in (False, True):
+        label = "with metrics" if with_metrics else "unobserved"
+
+        root_span = make_root_span(with_metrics)
+        report(
+            "make_child ({})".format(label),
+            bytes_per_op=measure_retained_bytes(
+                lambda: root_span.make_child("child"), ITERATIONS),
+        )
+
+        # the metrics batch buffers a line per child, so use a fresh root
+        # span per round to keep the buffer from growing without bound.
+        def one_request():
+            child_span = run_child_span(make_root_span(with_metrics))
+            for _ in range(200):
+                child_span()
+        report(
+            "child span start/stop ({})".format(label),
+            ns_per_op=measure_time(one_request, ITERATIONS // 200) / 200,
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""The hot paths measured by ``python -m tests.benchmarks``.
+
+Each benchmark is a function which sets up what it needs and returns the
+operation to measure, which must be safe to call over and over.
+
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import collections
+
+from baseplate import config
+from baseplate.core import (
+    Baseplate,
+    RootSpan,
+    SpanObserver,
+    TraceInfo,
+)
+from baseplate.diagnostics.metrics import MetricsRootSpanObserver
+from baseplate.metrics import Client, NullTransport
+
+
+#: The benchmarks, by name, as ``(setup, iterations)`` pairs.
+BENCHMARKS = collections.OrderedDict()
+
+
+def benchmark(name, iterations=100000):
+    """Register a benchmark's setup function under ``name``."""
+    def decorator(setup):
+        BENCHMARKS[name] = (setup, iterations)
+        return setup
+    return decorator
+
+
+class _DiscardTransport(NullTransport):
+    def send(self, serialized_metric):
+        pass
+
+
+class _Context(object):
+    pass
+
+
+class _NoopSpanObserver(SpanObserver):
+    __slots__ = ()
+
+
+def _client():
+    return Client(_DiscardTransport(), "namespace")
+
+
+@benchmark("Baseplate.make_root_span")
+def make_root_span():
+    baseplate = Baseplate()
+    context = _Context()
+    trace_info = TraceInfo.from_upstream(1, 2, 3, sampled=True)
+    return lambda: baseplate.make_root_span(context, "route", trace_info)
+
+
+@benchmark("Baseplate.make_root_span (metrics)")
+def make_root_span_with_metrics():
+    baseplate = Baseplate()
+    baseplate.configure_metrics(_client())
+    context = _Context()
+    trace_info = TraceInfo.from_upstream(1, 2, 3, sampled=True)
+    return lambda: baseplate.make_root_span(context, "route", trace_info)
+
+
+@benchmark("RootSpan.make_child")
+def make_child():
+    root_span = RootSpan(1, 2, 3, "route")
+    return lambda: root_span.make_child("child")
+
+
+@benchmark("RootSpan.make_child (metrics)")
+def make_child_with_metrics():
+    root_span = RootSpan(1, 2, 3, "route")
+    root_span.register(MetricsRootSpanObserver(_client().batch(), "server.route"))
+    return lambda: root_span.make_child("child")
+
+
+@benchmark("Span.start/stop (4 observers)")
+def observer_dispatch():
+    span = RootSpan(1, 2, 3, "route").make_child("child")
+    for _ in range(4):
+        span.register(_NoopSpanObserver())
+
+    def start_stop():
+        span.start()
+        span.stop()
+    return start_stop
+
+
+@benchmark("Timer.send")
+def timer_send():
+    timer = _client().timer("example.timer")
+    return lambda: timer.send(.0123)
+
+
+@benchmark("Counter.increment")
+def counter_increment():
+    client = _client()
+    return lambda: client.counter("example.counter").increment()
+
+
+@benchmark("Batch.flush (4 counters, 4 timers)", iterations=20000)
+def batch_flush():
+    client = _client()
+    counters = ["example.counter{:d}".format(i) for i in range(4)]
+    timers = ["example.timer{:d}".format(i) for i in range(4)]
+
+    def fill_and_flush():
+        batch = client.batch()
+        for name in counters:
+            batch.counter(name).increment()
+        for name in timers:
+            batch.timer(name).send(.0123)
+        batch.flush()
+    return fill_and_flush
+
+
+@benchmark("TraceInfo.from_upstream")
+def trace_info_from_upstream():
+    return lambda: TraceInfo.from_upstream(1234, 5678, 9012, sampled="1")
+
+
+@benchmark("config.parse_config", iterations=20000)
+def parse_config():
+    raw_config = {
+        "metrics.namespace": "example",
+        "metrics.endpoint": "127.0.0.1:8125",
+        "metrics.aggregate_interval": "10 seconds",
+        "tracing.sample_rate": "0.1",
+        "retries": "3",
+    }
+    spec = {
+        "metrics": {
+            "namespace": config.String,
+            "endpoint": config.Endpoint,
+            "aggregate_interval": config.Timespan,
+        },
+        "tracing": {
+            "sample_rate": config.Float,
+        },
+        "retries": config.Integer,
+    }
+    return lambda: config.parse_config(raw_config, spec)
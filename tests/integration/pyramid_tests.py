@@ -45,9 +45,9 @@ class ConfiguratorTests(unittest.TestCase):
         app = configurator.make_wsgi_app()
         self.test_app = webtest.TestApp(app)
 
-    @mock.patch("random.getrandbits")
-    def test_no_trace_headers(self, getrandbits):
-        getrandbits.return_value = 1234
+    @mock.patch("baseplate.core.RandomIDGenerator.generate")
+    def test_no_trace_headers(self, generate_id):
+        generate_id.return_value = 1234
         self.test_app.get("/example")
 
         self.assertEqual(self.observer.on_root_span_created.call_count, 1)
@@ -84,9 +84,9 @@ class ConfiguratorTests(unittest.TestCase):
 
         self.assertFalse(self.observer.on_root_span_created.called)
 
-    @mock.patch("random.getrandbits")
-    def test_distrust_headers(self, getrandbits):
-        getrandbits.return_value = 1234
+    @mock.patch("baseplate.core.RandomIDGenerator.generate")
+    def test_distrust_headers(self, generate_id):
+        generate_id.return_value = 1234
         self.baseplate_configurator.trust_trace_headers = False
 
         self.test_app.get("/example", headers={
@@ -96,6 +96,6 @@ class ConfiguratorTests(unittest.TestCase):
         })
 
         context, root_span = self.observer.on_root_span_created.call_args[0]
-        self.assertEqual(root_span.trace_id, getrandbits.return_value)
+        self.assertEqual(root_span.trace_id, generate_id.return_value)
         self.assertEqual(root_span.parent_id, None)
-        self.assertEqual(root_span.id, getrandbits.return_value)
+        self.assertEqual(root_span.id, generate_id.return_value)
@@ -54,9 +54,9 @@ class ThriftTests(unittest.TestCase):
         self.processor = BaseplateService.ContextProcessor(handler)
         self.processor.setEventHandler(event_handler)
 
-    @mock.patch("random.getrandbits")
-    def test_no_trace_headers(self, getrandbits):
-        getrandbits.return_value = 1234
+    @mock.patch("baseplate.core.RandomIDGenerator.generate")
+    def test_no_trace_headers(self, generate_id):
+        generate_id.return_value = 1234
 
         client_memory_trans = TMemoryBuffer()
         client_prot = THeaderProtocol(client_memory_trans)
@@ -0,0 +1,50 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import sys
+import time
+import unittest
+
+from baseplate import clock as clock_module
+from baseplate.clock import FakeClock, MonotonicClock
+
+
+class MonotonicClockTests(unittest.TestCase):
+    def test_never_goes_backwards(self):
+        clock = MonotonicClock()
+        previous = clock.now()
+        for _ in range(1000):
+            now = clock.now()
+            self.assertGreaterEqual(now, previous)
+            previous = now
+
+    def test_nanoseconds(self):
+        clock = MonotonicClock()
+        self.assertIsInstance(clock.now_ns(), int)
+
+
+@unittest.skipIf(not sys.platform.startswith("linux"), "linux only")
+class ClockGettimeTests(unittest.TestCase):
+    def test_monotonic(self):
+        monotonic_ns = clock_module._load_clock_gettime_ns()
+        self.assertIsNotNone(monotonic_ns)
+
+        before = monotonic_ns()
+        after = monotonic_ns()
+        self.assertGreaterEqual(after, before)
+
+        if hasattr(time, "monotonic_ns"):
+            self.assertAlmostEqual(
+                monotonic_ns() / 1e9, time.monotonic_ns() / 1e9, delta=.1)
+
+
+class FakeClockTests(unittest.TestCase):
+    def test_advance(self):
+        clock = FakeClock(now=10)
+        self.assertEqual(clock.now(), 10)
+
+        clock.advance(1.5)
+        self.assertEqual(clock.now(), 11.5)
+        self.assertEqual(clock.now_ns(), 11500000000)
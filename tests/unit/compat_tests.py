@@ -0,0 +1,76 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import threading
+import unittest
+
+from baseplate import _compat
+
+from .. import mock
+
+
+class _Task(object):
+    pass
+
+
+class GreenletContextVarTests(unittest.TestCase):
+    def test_default(self):
+        var = _compat._GreenletContextVar("example", default=1)
+        self.assertEqual(var.get(), 1)
+        self.assertEqual(var.get(2), 2)
+
+        with self.assertRaises(LookupError):
+            _compat._GreenletContextVar("example").get()
+
+    def test_set_and_reset(self):
+        var = _compat._GreenletContextVar("example", default=None)
+        first = var.set(1)
+        second = var.set(2)
+        self.assertEqual(var.get(), 2)
+
+        var.reset(second)
+        self.assertEqual(var.get(), 1)
+        var.reset(first)
+        self.assertIsNone(var.get())
+
+    def test_separate_per_thread(self):
+        var = _compat._GreenletContextVar("example", default=None)
+        var.set("main")
+
+        seen = []
+
+        def other():
+            seen.append(var.get())
+            var.set("other")
+
+        thread = threading.Thread(target=other)
+        thread.start()
+        thread.join()
+
+        self.assertEqual(seen, [None])
+        self.assertEqual(var.get(), "main")
+
+    def test_separate_per_greenlet(self):
+        tasks = [_Task(), _Task()]
+        var = _compat._GreenletContextVar("example", default=None)
+
+        with mock.patch.object(_compat, "_current_task", return_value=tasks[0]):
+            var.set("first")
+        with mock.patch.object(_compat, "_current_task", return_value=tasks[1]):
+            self.assertIsNone(var.get())
+
+
+class GreenletVersionTests(unittest.TestCase):
+    def _check(self, version):
+        greenlet = mock.Mock(__version__=version)
+        with mock.patch.dict("sys.modules", {"greenlet": greenlet}):
+            return _compat._contextvars_are_greenlet_local()
+
+    def test_old_greenlet(self):
+        self.assertFalse(self._check("0.4.16"))
+
+    def test_new_greenlet(self):
+        self.assertTrue(self._check("0.4.17"))
+        self.assertTrue(self._check("1.0.0"))
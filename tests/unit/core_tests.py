@@ -3,16 +3,22 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import os
 import unittest
 
+from baseplate.clock import FakeClock
 from baseplate.core import (
     Baseplate,
     BaseplateObserver,
+    BufferedSpanRecordObserver,
+    RandomIDGenerator,
     RootSpan,
     RootSpanObserver,
     Span,
     SpanObserver,
+    SpanRecordObserver,
     TraceInfo,
+    current_span,
 )
 
 from .. import mock
@@ -41,10 +47,127 @@ class BaseplateTests(unittest.TestCase):
         baseplate.register(mock_observer)
         root_span = baseplate.make_root_span(mock_context, "name", TraceInfo(1, 2, 3))
 
-        self.assertEqual(root_span.observers, [])
+        self.assertEqual(list(root_span.observers), [])
+
+    def test_upstream_sampling_decision(self):
+        mock_context = mock.Mock()
+        mock_observer = mock.Mock(spec=BaseplateObserver)
+        mock_observer.observe_unsampled = False
+
+        baseplate = Baseplate()
+        baseplate.register(mock_observer)
+        root_span = baseplate.make_root_span(
+            mock_context, "name", TraceInfo(1, 2, 3, sampled=False))
+
+        self.assertFalse(root_span.sampled)
+        self.assertEqual(mock_observer.on_root_span_created.call_count, 0)
+
+    def test_unsampled_observer(self):
+        mock_context = mock.Mock()
+        mock_observer = mock.Mock(spec=BaseplateObserver)
+        mock_observer.observe_unsampled = True
+
+        baseplate = Baseplate()
+        baseplate.register(mock_observer)
+        root_span = baseplate.make_root_span(
+            mock_context, "name", TraceInfo(1, 2, 3, sampled=False))
+
+        self.assertEqual(mock_observer.on_root_span_created.call_count, 1)
+        self.assertEqual(mock_observer.on_root_span_created.call_args,
+            mock.call(mock_context, root_span))
+
+    @mock.patch("random.random", autospec=True)
+    def test_local_sampling_decision(self, mock_random):
+        mock_context = mock.Mock()
+        mock_observer = mock.Mock(spec=BaseplateObserver)
+        mock_observer.observe_unsampled = False
+
+        baseplate = Baseplate(sample_rate=.25)
+        baseplate.register(mock_observer)
+
+        mock_random.return_value = .5
+        root_span = baseplate.make_root_span(mock_context, "name", TraceInfo(1, 2, 3))
+        self.assertFalse(root_span.sampled)
+        self.assertEqual(mock_observer.on_root_span_created.call_count, 0)
+
+        mock_random.return_value = .1
+        root_span = baseplate.make_root_span(mock_context, "name", TraceInfo(1, 2, 3))
+        self.assertTrue(root_span.sampled)
+        self.assertEqual(mock_observer.on_root_span_created.call_count, 1)
+
+
+    def test_id_generator(self):
+        mock_context = mock.Mock()
+        mock_generator = mock.Mock(spec=RandomIDGenerator)
+        mock_generator.generate.return_value = 1234
+
+        baseplate = Baseplate(id_generator=mock_generator)
+        root_span = baseplate.make_root_span(mock_context, "name")
+        self.assertEqual(root_span.trace_id, 1234)
+        self.assertEqual(root_span.id, 1234)
+        self.assertEqual(root_span.parent_id, None)
+
+        mock_generator.generate.return_value = 5678
+        child_span = root_span.make_child("child")
+        self.assertEqual(child_span.id, 5678)
+
+
+class RandomIDGeneratorTests(unittest.TestCase):
+    def test_range(self):
+        generator = RandomIDGenerator()
+        for _ in range(1000):
+            self.assertTrue(0 <= generator.generate() < 2**64)
+
+    def test_reseed(self):
+        generator = RandomIDGenerator()
+        state = generator._random.getstate()
+        first = generator.generate()
+
+        generator._random.setstate(state)
+        generator._reseed()
+        self.assertNotEqual(generator.generate(), first)
+
+    def test_forked(self):
+        generator = RandomIDGenerator()
+        read_end, write_end = os.pipe()
+        pid = os.fork()
+        if not pid:  # pragma: nocover
+            try:
+                os.write(write_end, str(generator.generate()).encode())
+            finally:
+                os._exit(0)
+        os.close(write_end)
+        os.waitpid(pid, 0)
+        child_id = int(os.read(read_end, 32))
+        os.close(read_end)
+        self.assertNotEqual(child_id, generator.generate())
+
+
+class TraceInfoTests(unittest.TestCase):
+    def test_from_upstream_sampled(self):
+        trace_info = TraceInfo.from_upstream(1, 2, 3, sampled=True)
+        self.assertEqual(trace_info.sampled, True)
+
+    def test_from_upstream_no_sampling_decision(self):
+        trace_info = TraceInfo.from_upstream(1, 2, 3)
+        self.assertEqual(trace_info.sampled, None)
+
+    def test_from_upstream_invalid(self):
+        with self.assertRaises(ValueError):
+            TraceInfo.from_upstream(None, 2, 3)
 
 
 class SpanTests(unittest.TestCase):
+    def test_no_observers_until_registered(self):
+        span = Span(1, 2, 3, "name")
+        other_span = Span(1, 2, 4, "name")
+        self.assertIs(span.observers, other_span.observers)
+
+        mock_observer = mock.Mock(spec=SpanObserver)
+        span.register(mock_observer)
+        self.assertEqual(span.observers, [mock_observer])
+        self.assertEqual(list(other_span.observers), [])
+
     def test_events(self):
         mock_observer = mock.Mock(spec=SpanObserver)
 
@@ -87,14 +210,86 @@ class SpanTests(unittest.TestCase):
         self.assertEqual(mock_observer.on_stop.call_args, mock.call(error=exc))
 
 
+def _resolve(awaitable):
+    iterator = awaitable.__await__()
+    try:
+        next(iterator)
+    except StopIteration as exc:
+        return exc.args[0] if exc.args else None
+    raise AssertionError("awaitable did not complete immediately")
+
+
+class CurrentSpanTests(unittest.TestCase):
+    def test_nesting(self):
+        self.assertIsNone(current_span())
+
+        root_span = RootSpan(1, 2, 3, "root")
+        with root_span:
+            self.assertIs(current_span(), root_span)
+
+            child_span = root_span.make_child("child")
+            self.assertIs(current_span(), root_span)
+            with child_span:
+                self.assertIs(current_span(), child_span)
+            self.assertIs(current_span(), root_span)
+
+        self.assertIsNone(current_span())
+
+    def test_out_of_order(self):
+        root_span = RootSpan(1, 2, 3, "root")
+        first = root_span.make_child("first")
+        second = root_span.make_child("second")
+
+        root_span.start()
+        first.start()
+        second.start()
+        first.stop()
+        self.assertIs(current_span(), second)
+        second.stop()
+        self.assertIs(current_span(), root_span)
+        root_span.stop()
+        self.assertIsNone(current_span())
+
+    def test_stopped_span_not_restored(self):
+        first = RootSpan(1, 2, 3, "first")
+        second = RootSpan(4, 5, 6, "second")
+
+        first.start()
+        second.start()
+        first.stop()
+
+        # a new request doesn't pick up the stopped span as its previous one.
+        third = RootSpan(7, 8, 9, "third")
+        second.stop()
+        third.start()
+        self.assertIsNone(third.previous_span)
+        third.stop()
+        self.assertIsNone(current_span())
+
+    def test_async_context_manager(self):
+        mock_observer = mock.Mock(spec=SpanObserver)
+        span = Span(1, 2, 3, "name")
+        span.register(mock_observer)
+
+        self.assertIs(_resolve(span.__aenter__()), span)
+        self.assertEqual(mock_observer.on_start.call_count, 1)
+        self.assertIs(current_span(), span)
+
+        exc = ValueError()
+        self.assertIsNone(_resolve(span.__aexit__(ValueError, exc, None)))
+        self.assertEqual(mock_observer.on_stop.call_args, mock.call(error=exc))
+        self.assertIsNone(current_span())
+
+
 class RootSpanTests(unittest.TestCase):
-    @mock.patch("random.getrandbits", autospec=True)
-    def test_make_child(self, mock_getrandbits):
-        mock_getrandbits.return_value = 0xCAFE
+    def test_make_child(self):
+        mock_generator = mock.Mock(spec=RandomIDGenerator)
+        mock_generator.generate.return_value = 0xCAFE
 
         mock_observer = mock.Mock(spec=RootSpanObserver)
 
-        root_span = RootSpan("trace", "parent", "id", "name")
+        root_span = RootSpan("trace", "parent", "id", "name",
+                             id_generator=mock_generator)
         root_span.register(mock_observer)
         child_span = root_span.make_child("child_name")
 
@@ -106,6 +301,11 @@ class RootSpanTests(unittest.TestCase):
         self.assertEqual(mock_observer.on_child_span_created.call_args,
             mock.call(child_span))
 
+    def test_child_inherits_sampling(self):
+        root_span = RootSpan("trace", "parent", "id", "name", sampled=False)
+        child_span = root_span.make_child("child_name")
+        self.assertFalse(child_span.sampled)
+
     def test_null_child(self):
         mock_observer = mock.Mock(spec=RootSpanObserver)
         mock_observer.on_child_span_created.return_value = None
@@ -114,4 +314,106 @@ class RootSpanTests(unittest.TestCase):
         root_span.register(mock_observer)
         child_span = root_span.make_child("child_name")
 
-        self.assertEqual(child_span.observers, [])
+        self.assertEqual(list(child_span.observers), [])
+
+
+class SpanRecordTests(unittest.TestCase):
+    @mock.patch("baseplate.core.default_clock", new_callable=FakeClock)
+    @mock.patch("time.time", autospec=True)
+    def test_child_record(self, mock_time, clock):
+        mock_observer = mock.Mock(spec=SpanRecordObserver)
+
+        root_span = RootSpan(1, 2, 3, "root")
+        root_span.register_record_observer(mock_observer)
+        child_span = root_span.make_child("child")
+
+        mock_time.return_value = 100
+        child_span.start()
+        child_span.annotate("key", "value")
+        self.assertEqual(mock_observer.on_span_completed.call_count, 0)
+
+        # the wall clock jumps back, but the monotonic clock moves on.
+        mock_time.return_value = 99
+        clock.advance(.5)
+        child_span.stop()
+        self.assertEqual(mock_observer.on_span_completed.call_count, 1)
+
+        record = mock_observer.on_span_completed.call_args[0][0]
+        self.assertEqual(record.trace_id, 1)
+        self.assertEqual(record.parent_id, 3)
+        self.assertEqual(record.span_id, child_span.id)
+        self.assertEqual(record.name, "child")
+        self.assertEqual(record.start_time, 100)
+        self.assertEqual(record.end_time, 99)
+        self.assertEqual(record.monotonic_start, 0)
+        self.assertEqual(record.monotonic_end, .5)
+        self.assertEqual(record.duration, .5)
+        self.assertEqual(record.annotations, (("key", "value"),))
+        self.assertEqual(record.error, None)
+        self.assertEqual(mock_observer.on_root_span_completed.call_count, 0)
+
+    def test_root_record(self):
+        mock_observer = mock.Mock(spec=SpanRecordObserver)
+        mock_span_observer = mock.Mock(spec=RootSpanObserver)
+
+        root_span = RootSpan(1, 2, 3, "root")
+        root_span.register(mock_span_observer)
+        root_span.register_record_observer(mock_observer)
+
+        exc = ValueError()
+        root_span.start()
+        root_span.stop(error=exc)
+
+        self.assertEqual(mock_observer.on_span_completed.call_count, 0)
+        self.assertEqual(mock_observer.on_root_span_completed.call_count, 1)
+        record = mock_observer.on_root_span_completed.call_args[0][0]
+        self.assertEqual(record.span_id, 3)
+        self.assertEqual(record.annotations, ())
+        self.assertEqual(record.error, exc)
+        self.assertEqual(mock_span_observer.on_stop.call_args,
+            mock.call(error=exc))
+
+    def test_no_record_observers(self):
+        root_span = RootSpan(1, 2, 3, "root")
+        child_span = root_span.make_child("child")
+        child_span.start()
+        child_span.annotate("key", "value")
+        child_span.stop()
+        self.assertEqual(child_span.annotations, None)
+
+
+class RecordingBufferedObserver(BufferedSpanRecordObserver):
+    def __init__(self, *args, **kwargs):
+        super(RecordingBufferedObserver, self).__init__(*args, **kwargs)
+        self.on_trace_completed = mock.Mock()
+
+
+class BufferedSpanRecordObserverTests(unittest.TestCase):
+    def test_batch_delivered(self):
+        observer = RecordingBufferedObserver()
+
+        root_span = RootSpan(1, 2, 3, "root")
+        root_span.register_record_observer(observer)
+        with root_span:
+            with root_span.make_child("first"):
+                pass
+            with root_span.make_child("second"):
+                pass
+
+        self.assertEqual(observer.on_trace_completed.call_count, 1)
+        records = observer.on_trace_completed.call_args[0][0]
+        self.assertEqual([r.name for r in records], ["first", "second", "root"])
+
+    def test_max_records(self):
+        observer = RecordingBufferedObserver(max_records=1)
+
+        root_span = RootSpan(1, 2, 3, "root")
+        root_span.register_record_observer(observer)
+        with root_span:
+            for _ in range(3):
+                with root_span.make_child("child"):
+                    pass
+
+        records = observer.on_trace_completed.call_args[0][0]
+        self.assertEqual([r.name for r in records], ["child", "root"])
+        self.assertEqual(observer.dropped, 2)
@@ -0,0 +1,91 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import io
+import logging
+import threading
+import unittest
+
+from baseplate.core import RootSpan
+from baseplate.diagnostics.logging import NonBlockingHandler, TraceIdFilter
+
+from ... import mock
+
+
+def make_record(message):
+    return logging.LogRecord(
+        "example", logging.INFO, __file__, 1, message, (), None)
+
+
+class TraceIdFilterTests(unittest.TestCase):
+    def test_no_span(self):
+        record = make_record("message")
+        self.assertTrue(TraceIdFilter().filter(record))
+        self.assertEqual(record.trace_id, "-")
+
+    def test_current_span(self):
+        span = RootSpan(1234, None, 1, "route")
+        record = make_record("message")
+        with mock.patch("baseplate.diagnostics.logging.current_span",
+                        return_value=span):
+            TraceIdFilter().filter(record)
+        self.assertEqual(record.trace_id, 1234)
+
+
+class NonBlockingHandlerTests(unittest.TestCase):
+    def setUp(self):
+        self.start_new_thread = mock.Mock()
+        threads_patcher = mock.patch(
+            "baseplate.diagnostics.logging._native_threads",
+            return_value=(self.start_new_thread, threading.Lock, mock.Mock()))
+        threads_patcher.start()
+        self.addCleanup(threads_patcher.stop)
+
+        atexit_patcher = mock.patch("baseplate.diagnostics.logging.atexit")
+        self.atexit = atexit_patcher.start()
+        self.addCleanup(atexit_patcher.stop)
+
+        self.stream = io.StringIO()
+        self.handler = NonBlockingHandler(stream=self.stream, max_queue_size=2)
+        self.handler.setFormatter(logging.Formatter("%(levelname)s:%(message)s"))
+
+    def test_starts_writer(self):
+        self.start_new_thread.assert_called_once_with(
+            self.handler._write_forever, ())
+        self.atexit.register.assert_called_once_with(self.handler.flush)
+
+    def test_queued_until_flush(self):
+        self.handler.handle(make_record("first"))
+        self.handler.handle(make_record("second"))
+        self.assertEqual(self.stream.getvalue(), "")
+
+        self.handler.flush()
+        self.assertEqual(self.stream.getvalue(), "INFO:first\nINFO:second\n")
+
+        self.handler.flush()
+        self.assertEqual(self.stream.getvalue(), "INFO:first\nINFO:second\n")
+
+    def test_overflow(self):
+        for i in range(5):
+            self.handler.handle(make_record("message {:d}".format(i)))
+        self.assertEqual(self.handler.dropped, 3)
+
+        self.handler.flush()
+        lines = self.stream.getvalue().splitlines()
+        self.assertEqual(lines[:2], ["INFO:message 0", "INFO:message 1"])
+        self.assertIn("3 log records were dropped", lines[2])
+
+        # the drops are only reported once.
+        self.handler.handle(make_record("later"))
+        self.handler.flush()
+        self.assertEqual(self.stream.getvalue().splitlines()[3:], ["INFO:later"])
+
+    def test_stream_error(self):
+        self.handler.stream = mock.Mock()
+        self.handler.stream.write.side_effect = IOError
+        self.handler.handle(make_record("message"))
+        self.handler.flush()
+        self.assertEqual(self.handler.failed, 1)
+        self.assertEqual(len(self.handler.queue), 0)
@@ -4,13 +4,17 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 import unittest
+import weakref
 
-from baseplate.core import RootSpan
-from baseplate.metrics import Client, Batch
+from baseplate import core
+from baseplate.core import RootSpan, SpanRecord
+from baseplate.metrics import Batch, Client, NullTransport
 from baseplate.diagnostics.metrics import (
+    CriticalPathRecordObserver,
     MetricsBaseplateObserver,
     MetricsRootSpanObserver,
     MetricsSpanObserver,
+    critical_path,
 )
 
 from ... import mock
@@ -30,6 +34,264 @@ class ObserverTests(unittest.TestCase):
 
         self.assertEqual(mock_context.metrics, mock_batch)
         self.assertEqual(mock_root_span.register.call_count, 1)
+        self.assertEqual(mock_root_span.register_record_observer.call_count, 0)
+
+    def test_deterministic_sampling(self):
+        mock_client = mock.Mock(spec=Client)
+        mock_root_span = mock.Mock(spec=RootSpan)
+        mock_root_span.name = "name"
+        mock_root_span.trace_id = 1234
+
+        observer = MetricsBaseplateObserver(mock_client)
+        observer.on_root_span_created(mock.Mock(), mock_root_span)
+        self.assertEqual(mock_client.batch.call_args, mock.call())
+
+        observer = MetricsBaseplateObserver(
+            mock_client, deterministic_sampling=True)
+        observer.on_root_span_created(mock.Mock(), mock_root_span)
+        self.assertEqual(mock_client.batch.call_args, mock.call(trace_id=1234))
+
+    def test_histograms(self):
+        mock_client = mock.Mock(spec=Client)
+        mock_batch = mock_client.batch.return_value
+        mock_root_span = mock.Mock(spec=RootSpan)
+        mock_root_span.name = "name"
+
+        observer = MetricsBaseplateObserver(mock_client, histograms=True)
+        observer.on_root_span_created(mock.Mock(), mock_root_span)
+        self.assertEqual(mock_batch.histogram.call_args, mock.call("server.name"))
+        self.assertEqual(mock_batch.timer.call_count, 0)
+
+        root_observer = mock_root_span.register.call_args[0][0]
+        mock_span = mock.Mock()
+        mock_span.name = "child"
+        root_observer.on_child_span_created(mock_span)
+        self.assertEqual(mock_batch.histogram.call_args, mock.call("clients.child"))
+
+    def test_critical_path(self):
+        mock_client = mock.Mock(spec=Client)
+        mock_root_span = mock.Mock(spec=RootSpan)
+        mock_root_span.name = "name"
+
+        observer = MetricsBaseplateObserver(mock_client, report_critical_path=True)
+        observer.on_root_span_created(mock.Mock(), mock_root_span)
+        self.assertEqual(mock_root_span.register_record_observer.call_count, 1)
+        record_observer = mock_root_span.register_record_observer.call_args[0][0]
+        self.assertIsInstance(record_observer, CriticalPathRecordObserver)
+
+    def test_critical_path_in_batch(self):
+        transport = mock.Mock(spec=NullTransport)
+        client = Client(transport, "namespace")
+        root_span = RootSpan(1, None, 2, "name")
+
+        observer = MetricsBaseplateObserver(client, report_critical_path=True)
+        observer.on_root_span_created(mock.Mock(), root_span)
+        with root_span:
+            with root_span.make_child("child"):
+                pass
+
+        self.assertEqual(transport.send.call_count, 1)
+        lines = transport.send.call_args[0][0].splitlines()
+        names = sorted(line.split(b":")[0] for line in lines)
+        self.assertEqual(names, [
+            b"namespace.clients.child",
+            b"namespace.server.name",
+            b"namespace.server.name.downstream_critical",
+            b"namespace.server.name.downstream_total",
+            b"namespace.server.name.self_time",
+        ])
+
+
+class ReuseBatchesTests(unittest.TestCase):
+    def setUp(self):
+        self.transport = mock.Mock(spec=NullTransport)
+        self.client = Client(self.transport, "namespace")
+        self.observer = MetricsBaseplateObserver(
+            self.client, reuse_batches=True, deterministic_sampling=True)
+
+    def _request(self, name, trace_id=1, child_name=None):
+        context = mock.Mock()
+        root_span = RootSpan(trace_id, None, 2, name)
+        self.observer.on_root_span_created(context, root_span)
+        with root_span:
+            context.metrics.counter("example").increment()
+            if child_name:
+                with root_span.make_child(child_name):
+                    pass
+        return context.metrics
+
+    def _sent_names(self):
+        lines = self.transport.send.call_args[0][0].splitlines()
+        return sorted(line.split(b":")[0] for line in lines)
+
+    def test_batch_reused(self):
+        first = self._request("first", child_name="child")
+        self.assertEqual(self._sent_names(), [
+            b"namespace.clients.child",
+            b"namespace.example",
+            b"namespace.server.first",
+        ])
+
+        second = self._request("second", trace_id=2, child_name="other")
+        self.assertIs(first, second)
+        self.assertEqual(self._sent_names(), [
+            b"namespace.clients.other",
+            b"namespace.example",
+            b"namespace.server.second",
+        ])
+        self.assertEqual(second.sample_point,
+                         self.client.batch(trace_id=2).sample_point)
+
+    def test_concurrent_requests(self):
+        first_span = RootSpan(1, None, 2, "first")
+        second_span = RootSpan(2, None, 3, "second")
+        first_context, second_context = mock.Mock(), mock.Mock()
+        self.observer.on_root_span_created(first_context, first_span)
+        self.observer.on_root_span_created(second_context, second_span)
+        self.assertIsNot(first_context.metrics, second_context.metrics)
+
+    def test_child_observers_reused(self):
+        self._request("first", child_name="child")
+        pool = self.observer.pool
+        self.assertEqual(len(pool.root_observers), 1)
+        self.assertEqual(len(pool.span_observers), 1)
+        child_observer = pool.span_observers[0]
+
+        self._request("second", child_name="other")
+        self.assertEqual(pool.span_observers, [child_observer])
+        self.assertEqual(child_observer.timer.name, b"namespace.clients.other")
+
+    def test_root_observer_kept_until_span_is_gone(self):
+        context = mock.Mock()
+        root_span = RootSpan(1, None, 2, "first")
+        self.observer.on_root_span_created(context, root_span)
+        with root_span:
+            pass
+        self.assertEqual(self.observer.pool.root_observers, [])
+
+        second = self._request("second")
+        self.assertIsNot(second, context.metrics)
+
+        with root_span.make_child("late"):
+            pass
+        context.metrics.flush()
+        self.assertEqual(self._sent_names(), [b"namespace.clients.late"])
+
+        del root_span
+        self.assertEqual(len(self.observer.pool.root_observers), 2)
+
+    def test_unfinished_request_not_reused(self):
+        context = mock.Mock()
+        root_span = RootSpan(1, None, 2, "first")
+        self.observer.on_root_span_created(context, root_span)
+        root_span.start()
+        core._current_span.set(None)
+        span_ref = weakref.ref(root_span)
+        del root_span
+        self.assertIsNone(span_ref())
+        self.assertEqual(self.observer.pool.root_observers, [])
+
+    def test_pool_bounded(self):
+        self.observer.pool.max_size = 1
+        contexts = [mock.Mock() for _ in range(3)]
+        spans = [RootSpan(1, None, 2, "name") for _ in contexts]
+        for context, span in zip(contexts, spans):
+            self.observer.on_root_span_created(context, span)
+            with span:
+                with span.make_child("first"), span.make_child("second"):
+                    pass
+        del span, spans
+        self.assertEqual(len(self.observer.pool.root_observers), 1)
+        self.assertEqual(len(self.observer.pool.span_observers), 1)
+
+
+def make_record(span_id, start_time, end_time, parent_id=1):
+    return SpanRecord(
+        trace_id=1,
+        parent_id=parent_id,
+        span_id=span_id,
+        name="span",
+        start_time=start_time,
+        end_time=end_time,
+        annotations=(),
+        error=None,
+    )
+
+
+class CriticalPathTests(unittest.TestCase):
+    def test_no_children(self):
+        root = make_record(1, 100., 102., parent_id=None)
+        breakdown = critical_path([root])
+        self.assertEqual(breakdown.duration, 2.)
+        self.assertEqual(breakdown.self_time, 2.)
+        self.assertEqual(breakdown.downstream_critical, 0.)
+        self.assertEqual(breakdown.downstream_total, 0.)
+
+    def test_serial(self):
+        breakdown = critical_path([
+            make_record(2, 100.5, 101.),
+            make_record(3, 101., 102.),
+            make_record(1, 100., 104., parent_id=None),
+        ])
+        self.assertEqual(breakdown.self_time, 2.5)
+        self.assertEqual(breakdown.downstream_critical, 1.5)
+        self.assertEqual(breakdown.downstream_total, 1.5)
+
+    def test_parallel(self):
+        breakdown = critical_path([
+            make_record(2, 101., 103.),
+            make_record(3, 101.5, 102.),
+            make_record(4, 102.5, 103.5),
+            make_record(5, 105., 106.),
+            make_record(1, 100., 107., parent_id=None),
+        ])
+        self.assertEqual(breakdown.duration, 7.)
+        self.assertEqual(breakdown.downstream_critical, 3.5)
+        self.assertEqual(breakdown.self_time, 3.5)
+        self.assertEqual(breakdown.downstream_total, 4.5)
+
+    def test_clipped_to_root(self):
+        breakdown = critical_path([
+            make_record(2, 99., 101.),
+            make_record(3, 101., 102., parent_id=2),
+            make_record(1, 100., 102., parent_id=None),
+        ])
+        self.assertEqual(breakdown.downstream_critical, 1.)
+        self.assertEqual(breakdown.self_time, 1.)
+        self.assertEqual(breakdown.downstream_total, 2.)
+
+    def test_monotonic_times(self):
+        # the wall clock jumped back a second during the child span.
+        breakdown = critical_path([
+            make_record(2, 101., 100.5)._replace(
+                monotonic_start=11., monotonic_end=11.5),
+            make_record(1, 100., 101., parent_id=None)._replace(
+                monotonic_start=10., monotonic_end=12.),
+        ])
+        self.assertEqual(breakdown.duration, 2.)
+        self.assertEqual(breakdown.downstream_critical, .5)
+        self.assertEqual(breakdown.self_time, 1.5)
+        self.assertEqual(breakdown.downstream_total, .5)
+
+
+class CriticalPathRecordObserverTests(unittest.TestCase):
+    def test_report(self):
+        mock_batch = mock.Mock(spec=Batch)
+        observer = CriticalPathRecordObserver(mock_batch, "server.name")
+
+        observer.on_span_completed(make_record(2, 101., 102.))
+        self.assertEqual(mock_batch.timer.call_count, 0)
+        observer.on_root_span_completed(make_record(1, 100., 104., parent_id=None))
+
+        names = [args[0] for args, _ in mock_batch.timer.call_args_list]
+        self.assertEqual(names, [
+            "server.name.self_time",
+            "server.name.downstream_critical",
+            "server.name.downstream_total",
+        ])
+        sent = [args[0] for args, _ in
+                mock_batch.timer.return_value.send.call_args_list]
+        self.assertEqual(sent, [3., 1., 1.])
 
 
 class RootSpanObserverTests(unittest.TestCase):
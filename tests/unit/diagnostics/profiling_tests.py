@@ -0,0 +1,166 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import signal
+import sys
+import unittest
+
+from baseplate import core
+from baseplate.clock import FakeClock
+from baseplate.core import RootSpan
+from baseplate.diagnostics.profiling import (
+    ProfilingBaseplateObserver,
+    fold_stack,
+)
+
+from ... import mock
+
+
+def outer(fn):
+    return fn()
+
+
+def inner():
+    return sys._getframe()
+
+
+class FoldStackTests(unittest.TestCase):
+    def test_fold(self):
+        stack = fold_stack(outer(inner))
+        frames = stack.split(";")
+        self.assertTrue(frames[-1].startswith("inner ("))
+        self.assertTrue(frames[-2].startswith("outer ("))
+        self.assertTrue(frames[-3].startswith("test_fold ("))
+
+    def test_max_depth(self):
+        stack = fold_stack(outer(inner), max_depth=2)
+        self.assertEqual(len(stack.split(";")), 2)
+        self.assertTrue(stack.startswith("outer ("))
+
+
+class ProfilingObserverTests(unittest.TestCase):
+    def setUp(self):
+        for name in ("signal", "siginterrupt", "setitimer"):
+            patcher = mock.patch("signal." + name, autospec=True)
+            self.addCleanup(patcher.stop)
+            setattr(self, "mock_" + name, patcher.start())
+
+        # don't leave a span from these tests as the current span.
+        self.addCleanup(core._current_span.set, None)
+
+        self.sink = mock.Mock()
+        self.sink.send.return_value = 0
+        self.clock = FakeClock()
+        self.observer = ProfilingBaseplateObserver(
+            self.sink, interval=0.005, threshold=1., flush_interval=3600,
+            max_stacks=2, clock=self.clock)
+
+    def _make_root_span(self, name, trace_id=1, span_id=3):
+        root_span = RootSpan(trace_id, None, span_id, name, sampled=False)
+        self.observer.on_root_span_created(mock.Mock(), root_span)
+        return root_span
+
+    def _sample(self, frame=None):
+        self.observer._on_signal(signal.SIGPROF, frame or sys._getframe())
+
+    def _exported_lines(self):
+        self.observer.flush()
+        lines = []
+        for args, _ in self.sink.send.call_args_list:
+            lines.extend(line.decode("utf-8") for line in args[0])
+        return lines
+
+    def test_installs_timer(self):
+        self.mock_signal.assert_called_once_with(
+            signal.SIGPROF, self.observer._on_signal)
+        self.mock_setitimer.assert_called_once_with(
+            signal.ITIMER_PROF, 0.005, 0.005)
+
+    def test_slow_request(self):
+        root_span = self._make_root_span("slow_route")
+        with root_span:
+            self._sample()
+            with root_span.make_child("child"):
+                self._sample()
+            self.clock.advance(2)
+
+        lines = self._exported_lines()
+        self.assertEqual(len(lines), 1)
+        stack, count = lines[0].rsplit(" ", 1)
+        self.assertEqual(count, "2")
+        self.assertTrue(stack.startswith("slow_route;"))
+        self.assertIn(";test_slow_request (", stack)
+
+    def test_fast_request(self):
+        root_span = self._make_root_span("fast_route")
+        with root_span:
+            self._sample()
+            self.clock.advance(.5)
+
+        self.assertEqual(self._exported_lines(), [])
+        self.assertEqual(self.sink.send.call_count, 0)
+
+    def test_outside_request(self):
+        self._sample()
+        self.assertEqual(self.observer.active, {})
+
+        root_span = self._make_root_span("slow_route")
+        with root_span:
+            self.clock.advance(2)
+        self._sample()
+        self.assertEqual(self._exported_lines(), [])
+
+    def test_concurrent_requests(self):
+        first = self._make_root_span("first", trace_id=1)
+        second = self._make_root_span("second", trace_id=2)
+
+        first.start()
+        second.start()
+        second.stop()
+        self._sample()
+        self.clock.advance(2)
+        first.stop()
+
+        lines = self._exported_lines()
+        self.assertEqual(len(lines), 1)
+        self.assertTrue(lines[0].startswith("first;"))
+
+    def test_concurrent_requests_in_one_trace(self):
+        first = self._make_root_span("first", trace_id=42, span_id=1)
+        second = self._make_root_span("second", trace_id=42, span_id=2)
+
+        first.start()
+        second.start()
+        with second.make_child("child"):
+            self._sample()
+        self.clock.advance(2)
+        first.stop()
+        second.stop()
+
+        lines = self._exported_lines()
+        self.assertEqual(len(lines), 1)
+        self.assertTrue(lines[0].startswith("second;"))
+
+    def test_max_stacks(self):
+        root_span = self._make_root_span("slow_route")
+        with root_span:
+            self._sample(outer(inner))
+            self._sample(inner())
+            self._sample()
+            self._sample(inner())
+            self.clock.advance(2)
+
+        self.assertEqual(len(self._exported_lines()), 2)
+        self.assertEqual(self.observer.dropped, 1)
+
+    def test_flush_resets(self):
+        root_span = self._make_root_span("slow_route")
+        with root_span:
+            self._sample()
+            self.clock.advance(2)
+
+        self.assertEqual(len(self._exported_lines()), 1)
+        self.observer.flush()
+        self.assertEqual(self.sink.send.call_count, 1)
@@ -0,0 +1,111 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import gc
+import unittest
+
+from baseplate.clock import FakeClock
+from baseplate.diagnostics.runtime import RuntimeMetricsCollector
+from baseplate.metrics import Client
+
+from ... import mock
+
+
+class RuntimeMetricsCollectorTests(unittest.TestCase):
+    def setUp(self):
+        # keep real collections from showing up in the measurements.
+        gc.disable()
+        self.addCleanup(gc.enable)
+
+        thread_patcher = mock.patch("threading.Thread", autospec=True)
+        self.addCleanup(thread_patcher.stop)
+        thread_patcher.start()
+
+        self.transport = mock.Mock()
+        self.clock = FakeClock()
+        self.collector = RuntimeMetricsCollector(
+            Client(self.transport, "namespace"), max_pauses=2,
+            clock=self.clock)
+        self.addCleanup(self._remove_gc_callback)
+
+    def _remove_gc_callback(self):
+        if hasattr(gc, "callbacks"):
+            gc.callbacks.remove(self.collector._on_gc)
+
+    def _reported(self):
+        self.transport.reset_mock()
+        self.collector.report()
+
+        metrics = {}
+        for method in ("send", "send_many"):
+            for args, _ in getattr(self.transport, method).call_args_list:
+                packets = args[0] if method == "send_many" else [args[0]]
+                for packet in packets:
+                    for line in packet.decode("utf-8").splitlines():
+                        name, value = line.split(":", 1)
+                        metrics[name] = value
+        return metrics
+
+    def _name(self, suffix):
+        return "namespace." + self.collector.prefix + suffix
+
+    def test_process_metrics(self):
+        metrics = self._reported()
+        self.assertIn(self._name("memory.rss"), metrics)
+        self.assertIn(self._name("fds.open"), metrics)
+        self.assertIn(self._name("threads.active"), metrics)
+        self.assertIn(self._name("gc.gen0.objects"), metrics)
+        self.assertTrue(metrics[self._name("memory.rss")].endswith("|g"))
+
+    def test_cpu_utilization(self):
+        with mock.patch("baseplate.diagnostics.runtime._read_cpu_time",
+                        return_value=(11.5, 2.5)):
+            self.collector.last_cpu_time = (10., 2.)
+            self.clock.advance(4)
+            metrics = self._reported()
+
+        self.assertEqual(metrics[self._name("cpu.user")], "1500|c")
+        self.assertEqual(metrics[self._name("cpu.system")], "500|c")
+        self.assertEqual(metrics[self._name("cpu.utilization")], "0.5|g")
+
+    def test_gc_pauses(self):
+        self.collector.gc_collections = [0, 0, 0]
+        for generation, pause in ((0, .001), (0, .002), (2, .1)):
+            self.collector._on_gc("start", {"generation": generation})
+            self.clock.advance(pause)
+            self.collector._on_gc("stop", {"generation": generation})
+
+        self.assertEqual(self.collector.gc_collections, [2, 0, 1])
+        self.assertEqual(len(self.collector.gc_pauses), 2)
+
+        self.collector.gc_pauses.append((2, .1))
+        metrics = self._reported()
+        if hasattr(gc, "callbacks"):
+            self.assertEqual(metrics[self._name("gc.gen0.collections")], "2|c")
+            self.assertEqual(metrics[self._name("gc.gen2.collections")], "1|c")
+        self.assertEqual(metrics[self._name("gc.gen2.pause")], "100|ms")
+        self.assertEqual(self.collector.gc_pauses, [])
+
+    def test_gevent_threadpool(self):
+        threadpool = mock.Mock(size=3)
+        threadpool.task_queue.qsize.return_value = 7
+        hub_module = mock.Mock()
+        hub_module._get_hub.return_value = mock.Mock(_threadpool=threadpool)
+
+        with mock.patch.dict("sys.modules", {"gevent.hub": hub_module}):
+            metrics = self._reported()
+
+        self.assertEqual(metrics[self._name("gevent.threadpool.size")], "3|g")
+        self.assertEqual(metrics[self._name("gevent.threadpool.queued")], "7|g")
+        self.assertNotIn(self._name("gevent.greenlets"), metrics)
+
+    def test_no_gevent_hub(self):
+        hub_module = mock.Mock()
+        hub_module._get_hub.return_value = None
+
+        with mock.patch.dict("sys.modules", {"gevent.hub": hub_module}):
+            metrics = self._reported()
+
+        self.assertNotIn(self._name("gevent.threadpool.size"), metrics)
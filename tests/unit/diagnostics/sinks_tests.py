@@ -0,0 +1,48 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from baseplate.diagnostics.sinks import FileSink, MessageQueueSink
+from baseplate.message_queue import MessageQueue, TimedOutError
+
+from ... import mock
+
+
+class FileSinkTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "spans")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_append_lines(self):
+        sink = FileSink(self.path)
+        self.assertEqual(sink.send([b"a", b"b"]), 0)
+        self.assertEqual(sink.send([b"c"]), 0)
+
+        with open(self.path, "rb") as f:
+            self.assertEqual(f.read(), b"a\nb\nc\n")
+
+
+class MessageQueueSinkTests(unittest.TestCase):
+    def test_put(self):
+        queue = mock.Mock(spec=MessageQueue)
+        sink = MessageQueueSink(queue)
+
+        self.assertEqual(sink.send([b"a", b"b"]), 0)
+        self.assertEqual(queue.put.call_args_list,
+            [mock.call(b"a", timeout=0), mock.call(b"b", timeout=0)])
+
+    def test_drop_when_full(self):
+        queue = mock.Mock(spec=MessageQueue)
+        queue.put.side_effect = [None, TimedOutError()]
+        sink = MessageQueueSink(queue)
+
+        self.assertEqual(sink.send([b"a", b"b"]), 1)
@@ -0,0 +1,282 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import gc
+import json
+import unittest
+
+from baseplate import core
+from baseplate.clock import FakeClock
+from baseplate.core import RootSpan, SpanRecord
+from baseplate.diagnostics.tracing import (
+    SpanBuffer,
+    TailSamplingBaseplateObserver,
+    TracingBaseplateObserver,
+    serialize_span_record,
+)
+
+from ... import mock
+
+
+EXAMPLE_RECORD = SpanRecord(
+    trace_id=1,
+    parent_id=2,
+    span_id=255,
+    name="example",
+    start_time=100.5,
+    end_time=101,
+    annotations=(("key", "value"),),
+    error=None,
+)
+
+
+class SerializeTests(unittest.TestCase):
+    def test_serialize(self):
+        span = json.loads(serialize_span_record(EXAMPLE_RECORD).decode("utf-8"))
+        self.assertEqual(span, {
+            "traceId": "0000000000000001",
+            "parentId": "0000000000000002",
+            "id": "00000000000000ff",
+            "name": "example",
+            "timestamp": 100500000,
+            "duration": 500000,
+            "annotations": {"key": "value"},
+        })
+
+    def test_serialize_monotonic_duration(self):
+        record = EXAMPLE_RECORD._replace(monotonic_start=5., monotonic_end=5.25)
+        span = json.loads(serialize_span_record(record).decode("utf-8"))
+        self.assertEqual(span["timestamp"], 100500000)
+        self.assertEqual(span["duration"], 250000)
+
+    def test_serialize_error(self):
+        record = EXAMPLE_RECORD._replace(
+            parent_id=None, annotations=(), error=ValueError())
+        span = json.loads(serialize_span_record(record).decode("utf-8"))
+        self.assertEqual(span["error"], "ValueError")
+        self.assertNotIn("parentId", span)
+        self.assertNotIn("annotations", span)
+
+    def test_serialize_text_annotations(self):
+        record = EXAMPLE_RECORD._replace(annotations=(
+            ("statement", "SELECT * FROM caf\u00e9"),
+            ("bytes", "caf\u00e9".encode("utf-8")),
+            ("number", 3),
+        ))
+        span = json.loads(serialize_span_record(record).decode("utf-8"))
+        self.assertEqual(span["annotations"], {
+            "statement": "SELECT * FROM caf\u00e9",
+            "bytes": "caf\u00e9",
+            "number": "3",
+        })
+
+
+class SpanBufferTests(unittest.TestCase):
+    def test_drop_when_full(self):
+        span_buffer = SpanBuffer(max_size=2)
+        self.assertTrue(span_buffer.add(b"a"))
+        self.assertTrue(span_buffer.add(b"b"))
+        self.assertFalse(span_buffer.add(b"c"))
+        self.assertEqual(span_buffer.dropped, 1)
+        self.assertEqual(len(span_buffer), 2)
+
+    def test_take(self):
+        span_buffer = SpanBuffer(max_size=10)
+        for span in (b"a", b"b", b"c"):
+            span_buffer.add(span)
+
+        self.assertEqual(span_buffer.take(2), [b"a", b"b"])
+        self.assertEqual(span_buffer.take(2), [b"c"])
+        self.assertEqual(span_buffer.take(2), [])
+
+
+class TracingObserverTests(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch("threading.Thread", autospec=True)
+        self.addCleanup(patcher.stop)
+        patcher.start()
+
+        self.sink = mock.Mock()
+        self.sink.send.return_value = 0
+        self.observer = TracingBaseplateObserver(
+            self.sink, max_buffered_spans=3, flush_interval=3600,
+            max_batch_size=2)
+
+    def test_export(self):
+        root_span = RootSpan(1, 2, 3, "root")
+        self.observer.on_root_span_created(mock.Mock(), root_span)
+
+        with root_span:
+            with root_span.make_child("child"):
+                pass
+        self.assertEqual(self.sink.send.call_count, 0)
+
+        self.observer.flush()
+        self.assertEqual(self.sink.send.call_count, 1)
+        batch = self.sink.send.call_args[0][0]
+        names = [json.loads(span.decode("utf-8"))["name"] for span in batch]
+        self.assertEqual(names, ["child", "root"])
+
+    def test_batches_and_drops(self):
+        for i in range(5):
+            self.observer.on_span_completed(EXAMPLE_RECORD._replace(span_id=i))
+
+        self.observer.flush()
+        self.assertEqual(self.sink.send.call_count, 2)
+        self.assertEqual(len(self.sink.send.call_args_list[0][0][0]), 2)
+        self.assertEqual(len(self.sink.send.call_args_list[1][0][0]), 1)
+        self.assertEqual(self.observer.dropped, 2)
+
+    def test_sink_failure(self):
+        self.sink.send.side_effect = IOError
+        self.observer.on_span_completed(EXAMPLE_RECORD)
+        self.observer.flush()
+        self.assertEqual(self.observer.dropped, 1)
+        self.assertEqual(len(self.observer.buffer), 0)
+
+    @mock.patch("baseplate.diagnostics.tracing.serialize_span_record")
+    def test_serialization_failure(self, serialize):
+        serialize.side_effect = ValueError
+        root_span = RootSpan(1, 2, 3, "root")
+        self.observer.on_root_span_created(mock.Mock(), root_span)
+
+        with root_span:
+            pass
+
+        self.observer.flush()
+        self.assertEqual(self.sink.send.call_count, 0)
+        self.assertEqual(self.observer.dropped, 1)
+
+
+class TailSamplingObserverTests(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch("threading.Thread", autospec=True)
+        self.addCleanup(patcher.stop)
+        patcher.start()
+
+        self.sink = mock.Mock()
+        self.sink.send.return_value = 0
+        self.observer = TailSamplingBaseplateObserver(
+            self.sink,
+            latency_thresholds={"slow_route": 1.},
+            max_spans_per_request=2,
+            max_held_spans=3,
+            flush_interval=3600,
+        )
+
+    def _exported_names(self):
+        self.observer.flush()
+        names = []
+        for args, _ in self.sink.send.call_args_list:
+            names.extend(json.loads(span.decode("utf-8"))["name"]
+                         for span in args[0])
+        return names
+
+    def _make_root_span(self, name):
+        root_span = RootSpan(1, 2, 3, name, sampled=False)
+        self.observer.on_root_span_created(mock.Mock(), root_span)
+        return root_span
+
+    @mock.patch("baseplate.core.default_clock", new_callable=FakeClock)
+    def test_keep_slow(self, clock):
+        root_span = self._make_root_span("slow_route")
+        root_span.start()
+        with root_span.make_child("child"):
+            pass
+        clock.advance(2)
+        root_span.stop()
+
+        self.assertEqual(self._exported_names(), ["child", "slow_route"])
+        self.assertEqual(self.observer.held_spans, 0)
+
+    @mock.patch("baseplate.core.default_clock", FakeClock())
+    def test_discard_fast(self):
+        root_span = self._make_root_span("slow_route")
+        with root_span:
+            with root_span.make_child("child"):
+                pass
+
+        self.assertEqual(self._exported_names(), [])
+        self.assertEqual(self.observer.held_spans, 0)
+
+    def test_keep_error(self):
+        root_span = self._make_root_span("other_route")
+        root_span.start()
+        root_span.stop(error=ValueError())
+
+        self.assertEqual(self._exported_names(), ["other_route"])
+
+    @mock.patch("random.random", autospec=True)
+    def test_baseline(self, mock_random):
+        mock_random.return_value = .05
+        self.observer.baseline_rate = .1
+
+        root_span = self._make_root_span("other_route")
+        with root_span:
+            pass
+
+        self.assertEqual(self._exported_names(), ["other_route"])
+
+    def test_per_request_limit(self):
+        root_span = self._make_root_span("other_route")
+        root_span.start()
+        for _ in range(3):
+            with root_span.make_child("child"):
+                pass
+        self.assertEqual(self.observer.held_spans, 2)
+        root_span.stop(error=ValueError())
+
+        self.assertEqual(self._exported_names(), ["child", "child", "other_route"])
+        self.assertEqual(self.observer.dropped, 1)
+
+    def test_no_per_request_limit(self):
+        self.observer.max_spans_per_request = None
+        root_span = self._make_root_span("other_route")
+        root_span.start()
+        for _ in range(4):
+            with root_span.make_child("child"):
+                pass
+        self.assertEqual(self.observer.held_spans, 3)
+        root_span.stop(error=ValueError())
+
+        self.assertEqual(len(self._exported_names()), 4)
+        self.assertEqual(self.observer.dropped, 1)
+
+    def test_annotation_limit(self):
+        self.observer.max_held_annotation_bytes = 10
+        root_span = self._make_root_span("other_route")
+        root_span.start()
+        for value in ("first", "second"):
+            with root_span.make_child(value) as child:
+                child.annotate("key", value)
+        self.assertEqual(self.observer.held_annotation_bytes, 8)
+        root_span.stop(error=ValueError())
+        self.assertEqual(self.observer.held_annotation_bytes, 0)
+
+        self.observer.flush()
+        spans = [json.loads(span.decode("utf-8"))
+                 for span in self.sink.send.call_args[0][0]]
+        self.assertEqual(spans[0]["annotations"], {"key": "first"})
+        self.assertNotIn("annotations", spans[1])
+
+    def test_process_limit(self):
+        first = self._make_root_span("first")
+        second = self._make_root_span("second")
+        for root_span in (first, second):
+            root_span.start()
+            for _ in range(2):
+                with root_span.make_child("child"):
+                    pass
+        self.assertEqual(self.observer.held_spans, 3)
+
+        first.stop(error=ValueError())
+        self.assertEqual(self.observer.held_spans, 1)
+
+        # the root span was never stopped, its share is released on collection
+        # once nothing, including its context, refers to it anymore.
+        core._current_span.set(None)
+        del root_span, second
+        gc.collect()
+        self.assertEqual(self.observer.held_spans, 0)
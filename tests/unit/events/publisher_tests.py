@@ -10,6 +10,7 @@ import requests
 
 from baseplate import config, metrics
 from baseplate._compat import BytesIO
+from baseplate.clock import FakeClock
 from baseplate.events import publisher
 
 from ... import mock
@@ -21,26 +22,26 @@ class BatcherTests(unittest.TestCase):
         self.consumer.batch_size_overhead = 0
         self.consumer.get_item_size = lambda item: len(item)
         self.consumer.batch_size_limit = 5
-        self.batcher = publisher.Batcher(self.consumer)
+        self.clock = FakeClock()
+        self.batcher = publisher.Batcher(self.consumer, clock=self.clock)
 
     def test_flush_empty_does_nothing(self):
         self.batcher.flush()
         self.assertEqual(self.consumer.consume_batch.called, False)
 
     def test_start_time(self):
-        with mock.patch("time.time") as mock_time:
-            self.assertEqual(self.batcher.batch_age, 0)
+        self.assertEqual(self.batcher.batch_age, 0)
 
-            mock_time.return_value = 33
-            self.batcher.add("a")
-            self.assertEqual(self.batcher.batch_start, 33)
+        self.clock.time = 33
+        self.batcher.add("a")
+        self.assertEqual(self.batcher.batch_start, 33)
 
-            mock_time.return_value = 34
-            self.batcher.add("b")
-            self.assertEqual(self.batcher.batch_start, 33)
+        self.clock.time = 34
+        self.batcher.add("b")
+        self.assertEqual(self.batcher.batch_start, 33)
 
-            mock_time.return_value = 35
-            self.assertEqual(self.batcher.batch_age, 2)
+        self.clock.time = 35
+        self.assertEqual(self.batcher.batch_age, 2)
 
         self.batcher.flush()
         self.assertEqual(self.batcher.batch_start, None)
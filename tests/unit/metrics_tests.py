@@ -5,10 +5,17 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import atexit
+import os
+import shutil
 import socket
+import tempfile
+import threading
 import unittest
 
 from baseplate import metrics, config
+from baseplate._sendmmsg import sendmmsg
+from baseplate.clock import FakeClock
 
 from .. import mock
 
@@ -58,6 +65,176 @@ class RawTransportTests(unittest.TestCase):
         self.assertEqual(mocket.sendall.call_args, mock.call(b"metric"))
 
 
+@unittest.skipIf(not hasattr(socket, "AF_UNIX"), "no unix sockets")
+class UnixDatagramTransportTests(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tempdir)
+        self.path = os.path.join(self.tempdir, "statsd.sock")
+        self.endpoint = config.EndpointConfiguration(socket.AF_UNIX, self.path)
+        self.transport = metrics.UnixDatagramTransport(self.endpoint)
+
+    def _listen(self):
+        receiver = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        receiver.bind(self.path)
+        self.addCleanup(receiver.close)
+        return receiver
+
+    def test_send(self):
+        receiver = self._listen()
+        self.transport.send(b"metric")
+        self.assertEqual(receiver.recv(100), b"metric")
+
+    @mock.patch("baseplate.metrics.logger", autospec=True)
+    def test_backpressure(self, logger):
+        self._listen()
+        for _ in range(10000):
+            self.transport.send(b"x" * 1000)
+            if self.transport.dropped:
+                break
+        self.assertGreater(self.transport.dropped, 0)
+        self.assertEqual(self.transport.failed, 0)
+        self.assertEqual(logger.warning.call_count, 1)
+        self.assertIn("full", logger.warning.call_args[0][0])
+
+    @mock.patch("baseplate.metrics.logger", autospec=True)
+    def test_reconnect(self, logger):
+        self.transport.send(b"lost")
+        self.assertEqual(self.transport.failed, 1)
+        self.assertIn("not listening", logger.warning.call_args[0][0])
+
+        receiver = self._listen()
+        self.transport.send(b"metric")
+        self.assertEqual(receiver.recv(100), b"metric")
+
+    def test_make_client(self):
+        client = metrics.make_client("namespace", self.endpoint)
+        self.assertIsInstance(client.transport, metrics.UnixDatagramTransport)
+
+
+class QueuedTransportTests(unittest.TestCase):
+    def setUp(self):
+        for target in ("threading.Thread", "atexit.register"):
+            patcher = mock.patch(target, autospec=True)
+            self.addCleanup(patcher.stop)
+            patcher.start()
+
+        self.inner = mock.Mock(spec=metrics.NullTransport)
+        self.transport = metrics.QueuedTransport(self.inner, max_queue_size=2)
+
+    def test_send_in_background(self):
+        self.assertTrue(self.transport.sender.start.called)
+        self.transport.send(b"a")
+        self.assertEqual(self.inner.send.call_count, 0)
+
+        self.transport.flush()
+        self.assertEqual(self.inner.send_many.call_args, mock.call([b"a"]))
+
+    @mock.patch("baseplate.metrics.logger", autospec=True)
+    def test_drop_when_full(self, logger):
+        for metric in (b"a", b"b", b"c", b"d"):
+            self.transport.send(metric)
+        self.assertEqual(self.transport.dropped, 2)
+        self.assertEqual(logger.warning.call_count, 1)
+
+        self.transport.flush()
+        self.assertEqual(self.inner.send_many.call_args_list,
+                         [mock.call([b"a", b"b"])])
+
+    @mock.patch("baseplate.metrics.logger", autospec=True)
+    def test_send_failure(self, logger):
+        self.inner.send_many.side_effect = socket.error
+        self.transport.send(b"a")
+        self.transport.send(b"b")
+        self.transport.flush()
+        self.assertEqual(self.transport.failed, 2)
+        self.assertEqual(logger.warning.call_args[0][1], 2)
+
+    def test_flush_at_exit(self):
+        self.assertEqual(atexit.register.call_args,
+                         mock.call(self.transport.flush))
+
+
+@mock.patch("baseplate.metrics.logger", autospec=True)
+class LossLogTests(unittest.TestCase):
+    def test_rate_limit(self, logger):
+        clock = FakeClock()
+        loss_log = metrics._LossLog("Lost %d.", interval=60, clock=clock)
+
+        loss_log.add(1)
+        self.assertEqual(logger.warning.call_args, mock.call("Lost %d.", 1))
+
+        clock.advance(30)
+        loss_log.add(2)
+        loss_log.add(3)
+        self.assertEqual(logger.warning.call_count, 1)
+
+        clock.advance(30)
+        loss_log.add(1)
+        self.assertEqual(logger.warning.call_args, mock.call("Lost %d.", 6))
+
+
+@unittest.skipIf(not hasattr(socket, "AF_UNIX"), "no unix sockets")
+class SendManyTests(unittest.TestCase):
+    def setUp(self):
+        self.receiver, self.sender = socket.socketpair(
+            socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.addCleanup(self.receiver.close)
+        self.addCleanup(self.sender.close)
+
+    def _received(self, count):
+        return [self.receiver.recv(100) for _ in range(count)]
+
+    def test_raw_transport(self):
+        for use_sendmmsg in (False, True):
+            transport = metrics.RawTransport.__new__(metrics.RawTransport)
+            transport.socket = self.sender
+            transport.use_sendmmsg = use_sendmmsg
+
+            transport.send_many([b"a", b"bb", b"ccc"])
+            self.assertEqual(self._received(3), [b"a", b"bb", b"ccc"])
+
+    @mock.patch("baseplate.metrics.sendmmsg")
+    def test_sendmmsg_opt_in(self, mock_sendmmsg):
+        transport = metrics.RawTransport.__new__(metrics.RawTransport)
+        transport.socket = self.sender
+        transport.use_sendmmsg = False
+
+        transport.send_many([b"a", b"b"])
+        self.assertEqual(mock_sendmmsg.call_count, 0)
+        self.assertEqual(self._received(2), [b"a", b"b"])
+
+    def test_default(self):
+        transport = mock.Mock(spec=metrics.NullTransport)
+        metrics.Transport.send_many(transport, [b"a", b"b"])
+        self.assertEqual(transport.send.call_args_list,
+                         [mock.call(b"a"), mock.call(b"b")])
+
+    @unittest.skipIf(sendmmsg is None, "sendmmsg not available")
+    def test_sendmmsg(self):
+        datagrams = [str(i).encode() for i in range(1500)]
+        sent = sendmmsg(self.sender.fileno(), datagrams[:10])
+        self.assertEqual(sent, 10)
+        self.assertEqual(self._received(10), datagrams[:10])
+
+    @unittest.skipIf(sendmmsg is None, "sendmmsg not available")
+    def test_sendmmsg_error(self):
+        self.receiver.close()
+        with self.assertRaises(socket.error):
+            sendmmsg(self.sender.fileno(), [b"a", b"b"])
+
+    def test_unix_backpressure(self):
+        self.sender.setblocking(False)
+        for use_sendmmsg in (False, True):
+            transport = metrics.UnixDatagramTransport(mock.Mock(), use_sendmmsg)
+            transport.socket = self.sender
+
+            transport.send_many([b"x" * 1000] * 1000)
+            self.assertGreater(transport.dropped, 0)
+            self.assertEqual(transport.failed, 0)
+            self.assertIsNotNone(transport.socket)
+
+
 class BufferedTransportTests(unittest.TestCase):
     @mock.patch("socket.socket")
     def test_buffered(self, mock_make_socket):
@@ -74,6 +251,134 @@ class BufferedTransportTests(unittest.TestCase):
         self.assertEqual(mocket.sendall.call_args,
             mock.call(b"a\nb\nc"))
 
+    def test_empty_flush(self):
+        inner = mock.Mock(spec=metrics.NullTransport)
+        transport = metrics.BufferedTransport(inner)
+        transport.flush()
+        self.assertEqual(inner.send.call_count, 0)
+
+    def test_packetize(self):
+        inner = mock.Mock(spec=metrics.NullTransport)
+        transport = metrics.BufferedTransport(inner, max_packet_size=10)
+        transport.send(b"aaaa")
+        transport.send(b"bbbbb")
+        self.assertEqual(inner.send.call_count, 0)
+
+        transport.send(b"ccc")
+        self.assertEqual(inner.send.call_count, 1)
+        self.assertEqual(inner.send.call_args, mock.call(b"aaaa\nbbbbb"))
+
+        transport.send(b"dddddd")
+        transport.flush()
+        self.assertEqual(inner.send.call_args_list[1:], [
+            mock.call(b"ccc\ndddddd"),
+        ])
+        self.assertEqual(transport.oversized, 0)
+
+    def test_oversized(self):
+        inner = mock.Mock(spec=metrics.NullTransport)
+        transport = metrics.BufferedTransport(inner, max_packet_size=10)
+        transport.send(b"a")
+        transport.send(b"b" * 11)
+        transport.send(b"c")
+        transport.flush()
+
+        self.assertEqual(inner.send.call_args_list, [
+            mock.call(b"a"),
+            mock.call(b"b" * 11),
+            mock.call(b"c"),
+        ])
+        self.assertEqual(transport.oversized, 1)
+
+
+class CoalescingTests(unittest.TestCase):
+    def setUp(self):
+        self.inner = mock.Mock(spec=metrics.NullTransport)
+        self.batch = metrics.Batch(self.inner, b"namespace")
+
+    def _flushed_lines(self):
+        self.batch.flush()
+        lines = []
+        for args, _ in self.inner.send.call_args_list:
+            lines.extend(args[0].splitlines())
+        return sorted(lines)
+
+    @mock.patch("random.random", autospec=True)
+    def test_counters(self, mock_random):
+        mock_random.return_value = .25
+        for _ in range(500):
+            self.batch.counter("hit").increment()
+        self.batch.counter("miss").decrement(2)
+        self.batch.counter("sampled").increment(sample_rate=0.5)
+
+        self.assertEqual(self._flushed_lines(), [
+            b"namespace.hit:500|c",
+            b"namespace.miss:-2|c",
+            b"namespace.sampled:2|c",
+        ])
+
+    def test_gauges(self):
+        self.batch.gauge("absolute").replace(3)
+        self.batch.gauge("absolute").replace(5)
+        self.batch.gauge("relative").increment(3)
+        self.batch.gauge("relative").decrement(1)
+        self.batch.gauge("adjusted").replace(3)
+        self.batch.gauge("adjusted").increment()
+
+        with self.assertRaises(AssertionError):
+            self.batch.gauge("absolute").replace(-1)
+
+        self.assertEqual(self._flushed_lines(), [
+            b"namespace.absolute:5|g",
+            b"namespace.adjusted:4|g",
+            b"namespace.relative:+2|g",
+        ])
+
+    def test_timers(self):
+        clock = FakeClock()
+        self.batch.clock = clock
+        for elapsed in (1, 2, 3):
+            with self.batch.timer("example"):
+                clock.advance(elapsed)
+
+        self.assertEqual(self._flushed_lines(), [
+            b"namespace.example:1000|ms:2000|ms:3000|ms",
+        ])
+
+    def test_timers_split_by_packet(self):
+        batch = metrics.Batch(self.inner, b"ns", max_packet_size=20)
+        for elapsed in (1, 2, 3, 4, 5):
+            batch.timer("t").send(elapsed / 1000.)
+        batch.flush()
+
+        self.assertEqual(self.inner.send_many.call_count, 1)
+        lines = self.inner.send_many.call_args[0][0]
+        self.assertEqual(lines, [
+            b"ns.t:1|ms:2|ms:3|ms",
+            b"ns.t:4|ms:5|ms",
+        ])
+        self.assertTrue(all(len(line) <= 20 for line in lines))
+
+    def test_sampled_timers(self):
+        self.batch.sample_point = .05
+        self.batch.timer("example", sample_rate=.1).send(.001)
+        self.batch.timer("example", sample_rate=.1).send(.002)
+        self.batch.timer("example").send(.003)
+        self.batch.timer("dropped", sample_rate=.01).send(.001)
+
+        self.assertEqual(self._flushed_lines(), [
+            b"namespace.example:1|ms|@0.1:2|ms|@0.1",
+            b"namespace.example:3|ms",
+        ])
+
+    def test_mixed_with_raw(self):
+        self.batch.transport.send(b"raw:1|s")
+        self.batch.counter("hit").increment()
+        self.assertEqual(self._flushed_lines(), [
+            b"namespace.hit:1|c",
+            b"raw:1|s",
+        ])
+
 
 class BaseClientTests(unittest.TestCase):
     def test_encode_namespace(self):
@@ -115,6 +420,18 @@ class BaseClientFactoriesTests(unittest.TestCase):
         with self.assertRaises(UnicodeEncodeError):
             self.client.gauge("☃")
 
+    def test_name_cache(self):
+        first = self.client.counter("some_counter")
+        second = self.client.timer("some_counter")
+        self.assertIs(first.name, second.name)
+
+    @mock.patch("baseplate.metrics.MAX_CACHED_NAMES", 2)
+    def test_name_cache_bounded(self):
+        for i in range(5):
+            counter = self.client.counter("counter{:d}".format(i))
+            self.assertEqual(counter.name, "namespace.counter{:d}".format(i).encode())
+        self.assertEqual(len(self.client.names), 2)
+
 
 class ClientTests(unittest.TestCase):
     def test_make_batch(self):
@@ -124,6 +441,41 @@ class ClientTests(unittest.TestCase):
 
         self.assertIsInstance(batch, metrics.Batch)
         self.assertEqual(batch.namespace, b"namespace")
+        self.assertIs(batch.names, client.names)
+        self.assertIsNone(batch.sample_point)
+
+    def test_batch_for_trace(self):
+        transport = mock.Mock(spec=metrics.NullTransport)
+        client = metrics.Client(transport, "namespace")
+
+        first = client.batch(trace_id=1234)
+        second = client.batch(trace_id=1234)
+        self.assertEqual(first.sample_point, second.sample_point)
+        self.assertTrue(0 <= first.sample_point < 1)
+        self.assertEqual(first.counter("example").sample_point,
+                         first.sample_point)
+        self.assertEqual(first.timer("example").sample_point,
+                         first.sample_point)
+
+    def test_trace_sampling_is_uniform(self):
+        transport = mock.Mock(spec=metrics.NullTransport)
+        client = metrics.Client(transport, "namespace")
+        kept = sum(client.batch(trace_id=trace_id).sample_point < .1
+                   for trace_id in range(10000))
+        self.assertAlmostEqual(kept / 10000., .1, delta=.01)
+
+    def test_batch_max_packet_size(self):
+        transport = mock.Mock(spec=metrics.NullTransport)
+        client = metrics.Client(transport, "namespace", max_packet_size=30)
+        batch = client.batch()
+
+        self.assertEqual(batch.transport.max_packet_size, 30)
+        batch.counter("first").increment()
+        batch.counter("second").increment()
+        batch.flush()
+        self.assertEqual(transport.send.call_count, 0)
+        self.assertEqual(transport.send_many.call_count, 1)
+        self.assertEqual(len(transport.send_many.call_args[0][0]), 2)
 
 
 class BatchTests(unittest.TestCase):
@@ -137,25 +489,40 @@ class BatchTests(unittest.TestCase):
             self.assertEqual(b, batch)
         self.assertTrue(mock_buffer.flush.called)
 
+    def test_reset_timer(self):
+        client = metrics.Client(mock.Mock(spec=metrics.NullTransport), "namespace")
+        first = client.batch()
+        timer = first.timer("first")
+        with timer:
+            pass
+
+        second = client.batch(trace_id=2)
+        self.assertIs(second.reset_timer(timer, "second"), timer)
+        self.assertIs(timer.transport, second.transport)
+        self.assertEqual(timer.name, b"namespace.second")
+        self.assertEqual(timer.sample_point, second.sample_point)
+        with timer:
+            pass
+
 
 class TimerTests(unittest.TestCase):
     def setUp(self):
         self.transport = mock.Mock(spec=metrics.NullTransport)
 
-    @mock.patch("time.time", autospec=True)
-    def test_basic_operation(self, mock_time):
-        timer = metrics.Timer(self.transport, b"example")
+    def test_basic_operation(self):
+        clock = FakeClock()
+        timer = metrics.Timer(self.transport, b"example", clock)
 
         with self.assertRaises(Exception):
             timer.stop()
 
-        mock_time.return_value = 1000
+        clock.time = 1000
         timer.start()
         with self.assertRaises(Exception):
             timer.start()
         self.assertEqual(self.transport.send.call_count, 0)
 
-        mock_time.return_value = 1004
+        clock.time = 1004
         timer.stop()
         self.assertEqual(self.transport.send.call_count, 1)
         self.assertEqual(self.transport.send.call_args,
@@ -166,24 +533,59 @@ class TimerTests(unittest.TestCase):
         with self.assertRaises(Exception):
             timer.stop()
 
-    @mock.patch("time.time", autospec=True)
-    def test_context_manager(self, mock_time):
-        timer = metrics.Timer(self.transport, b"example")
+        timer.reset(self.transport, b"other")
+        clock.time = 1005
+        timer.start()
+        clock.time = 1006
+        timer.stop()
+        self.assertEqual(self.transport.send.call_args,
+            mock.call(b"other:1000|ms"))
 
-        mock_time.return_value = 1000
+    def test_context_manager(self):
+        clock = FakeClock()
+        timer = metrics.Timer(self.transport, b"example", clock)
+
+        clock.time = 1000
         with timer:
-            mock_time.return_value = 1003
+            clock.time = 1003
 
         self.assertEqual(self.transport.send.call_count, 1)
         self.assertEqual(self.transport.send.call_args,
             mock.call(b"example:3000|ms"))
 
+    def test_send(self):
+        timer = metrics.Timer(self.transport, b"example")
+        timer.send(1.5)
+        self.assertEqual(self.transport.send.call_args,
+            mock.call(b"example:1500|ms"))
+
+    @mock.patch("random.random", autospec=True)
+    def test_sampled(self, mock_random):
+        timer = metrics.Timer(self.transport, b"example", sample_rate=.1)
+
+        mock_random.return_value = .05
+        timer.send(1)
+        self.assertEqual(self.transport.send.call_args,
+            mock.call(b"example:1000|ms|@0.1"))
+
+        mock_random.return_value = .5
+        timer.send(1)
+        self.assertEqual(self.transport.send.call_count, 1)
+
+    def test_never_sampled(self):
+        timer = metrics.Timer(self.transport, b"example", sample_rate=0,
+                              sample_point=0.)
+        timer.send(1)
+        self.assertEqual(self.transport.send.call_count, 0)
+
 
 class CounterTests(unittest.TestCase):
     def setUp(self):
         self.transport = mock.Mock(spec=metrics.NullTransport)
 
-    def test_incr(self):
+    @mock.patch("random.random", autospec=True)
+    def test_incr(self, mock_random):
+        mock_random.return_value = .25
         counter = metrics.Counter(self.transport, b"example")
 
         counter.increment()
@@ -206,6 +608,26 @@ class CounterTests(unittest.TestCase):
         self.assertEqual(self.transport.send.call_args,
             mock.call(b"example:2|c|@0.5"))
 
+    @mock.patch("random.random", autospec=True)
+    def test_sampled_out(self, mock_random):
+        mock_random.return_value = .75
+        counter = metrics.Counter(self.transport, b"example")
+        counter.increment(delta=2, sample_rate=.5)
+        self.assertEqual(self.transport.send.call_count, 0)
+
+        mock_random.return_value = 0.
+        counter.increment(sample_rate=0)
+        self.assertEqual(self.transport.send.call_count, 0)
+
+    def test_deterministic(self):
+        kept = metrics.Counter(self.transport, b"example", sample_point=.4)
+        kept.increment(sample_rate=.5)
+        self.assertEqual(self.transport.send.call_count, 1)
+
+        dropped = metrics.Counter(self.transport, b"example", sample_point=.6)
+        dropped.increment(sample_rate=.5)
+        self.assertEqual(self.transport.send.call_count, 1)
+
     def test_decr(self):
         counter = metrics.Counter(self.transport, b"example")
 
@@ -251,6 +673,193 @@ class GaugeTests(unittest.TestCase):
             mock.call(b"example:-33|g"))
 
 
+class AggregatingTransportTests(unittest.TestCase):
+    def setUp(self):
+        self.inner = mock.Mock(spec=metrics.NullTransport)
+        self.transport = metrics.AggregatingTransport(
+            self.inner, flush_interval=3600)
+
+    def _flushed_lines(self):
+        self.transport.flush()
+        lines = []
+        for args, _ in self.inner.send.call_args_list:
+            lines.extend(args[0].splitlines())
+        return sorted(lines)
+
+    def test_nothing_to_flush(self):
+        self.transport.flush()
+        self.assertEqual(self.inner.send.call_count, 0)
+
+    def test_counters(self):
+        self.transport.send(b"example:1|c")
+        self.transport.send(b"example:2|c\nother:1|c")
+        self.transport.send(b"example:1|c|@0.5")
+        self.assertEqual(self.inner.send.call_count, 0)
+
+        self.assertEqual(self._flushed_lines(), [
+            b"example:5|c",
+            b"other:1|c",
+        ])
+
+    def test_gauges(self):
+        self.transport.send(b"relative:+3|g\nrelative:-1|g")
+        self.transport.send(b"absolute:+3|g\nabsolute:10|g\nabsolute:4|g")
+        self.transport.send(b"adjusted:4|g\nadjusted:-1|g")
+        self.transport.send(b"negative:1|g\nnegative:-3|g")
+
+        self.assertEqual(self._flushed_lines(), [
+            b"absolute:4|g",
+            b"adjusted:3|g",
+            b"negative:-2|g",
+            b"negative:0|g",
+            b"relative:+2|g",
+        ])
+
+    def test_timers(self):
+        self.transport.send(b"example:101.5|ms")
+        self.transport.send(b"example:99.7|ms\nexample:102|ms")
+        self.transport.send(b"example:7|ms:3.04|ms")
+        self.transport.send(b"example:3|ms|@0.25")
+
+        self.assertEqual(self._flushed_lines(), [
+            b"example:3|ms:3|ms:3|ms:3|ms:3|ms:7|ms:100|ms:100|ms:100|ms",
+        ])
+
+    def test_timer_mean(self):
+        for _ in range(99):
+            self.transport.send(b"example:5|ms")
+        self.transport.send(b"example:900|ms")
+
+        lines = self._flushed_lines()
+        self.assertEqual(len(lines), 2)
+
+        values = []
+        for line in lines:
+            for _, _, value, _, rate in metrics._parse_line(line):
+                self.assertEqual(rate, 1)
+                values.append(float(value))
+        self.assertEqual(len(values), 100)
+        self.assertAlmostEqual(sum(values) / len(values), 13.95)
+
+    def test_timer_fractional_count(self):
+        self.transport.send(b"example:5|ms|@0.3")
+        self.assertEqual(self._flushed_lines(), [
+            b"example:5|ms|@0.9:5|ms|@0.9:5|ms|@0.9",
+        ])
+
+    def test_large_counters(self):
+        for _ in range(3):
+            self.transport.send(b"bytes:456789|c\nfraction:0.5|c")
+        self.transport.send(b"gauge:1234567|g")
+
+        self.assertEqual(self._flushed_lines(), [
+            b"bytes:1370367|c",
+            b"fraction:1.5|c",
+            b"gauge:1234567|g",
+        ])
+
+    def test_histograms(self):
+        for value in range(1, 101):
+            self.transport.send("example:{:d}|h".format(value).encode())
+        self.transport.send(b"example:50|h|@0.5")
+
+        self.assertEqual(self._flushed_lines(), [
+            b"example.count:102|c",
+            b"example.max:100|ms",
+            b"example.p50:51|ms",
+            b"example.p90:90|ms",
+            b"example.p99:98|ms",
+        ])
+
+    def test_passthrough(self):
+        self.transport.send(b"example:1|s\ngarbage")
+        self.assertEqual(self._flushed_lines(), [
+            b"example:1|s",
+            b"garbage",
+        ])
+
+    def test_flush_resets(self):
+        self.transport.send(b"example:1|c")
+        self.transport.flush()
+        self.transport.flush()
+        self.assertEqual(self.inner.send.call_count, 1)
+
+    def test_send_failure(self):
+        self.inner.send.side_effect = socket.error
+        self.transport.send(b"example:1|c")
+        self.transport.flush()
+
+
+class LogLinearHistogramTests(unittest.TestCase):
+    def test_empty(self):
+        histogram = metrics.LogLinearHistogram()
+        self.assertIsNone(histogram.percentile(50))
+        self.assertIsNone(histogram.max)
+        self.assertEqual(histogram.count, 0)
+
+    def test_percentiles(self):
+        histogram = metrics.LogLinearHistogram()
+        for value in range(1, 1001):
+            histogram.add(value)
+
+        self.assertEqual(histogram.count, 1000)
+        self.assertEqual(histogram.max, 1000)
+        for percent in (50, 90, 99):
+            self.assertAlmostEqual(
+                histogram.percentile(percent) / (percent * 10.), 1., delta=.035)
+        self.assertEqual(histogram.percentile(100), 1000)
+
+    def test_weighted(self):
+        histogram = metrics.LogLinearHistogram()
+        histogram.add(1, count=9)
+        histogram.add(100)
+        self.assertAlmostEqual(histogram.percentile(90), 1, delta=.035)
+        self.assertEqual(histogram.percentile(99), 100)
+
+    def test_out_of_range(self):
+        histogram = metrics.LogLinearHistogram(min_exponent=0, max_exponent=4)
+        self.assertEqual(len(histogram.counts), 4 * 16)
+        histogram.add(0)
+        histogram.add(.001)
+        histogram.add(1e9)
+
+        self.assertEqual(histogram.counts[0], 2)
+        self.assertEqual(histogram.counts[-1], 1)
+        self.assertEqual(histogram.percentile(100), 1e9)
+
+
+class HistogramTests(unittest.TestCase):
+    def test_add_sample(self):
+        transport = mock.Mock(spec=metrics.NullTransport)
+        histogram = metrics.Histogram(transport, b"example")
+        histogram.add_sample(12.5)
+        self.assertEqual(transport.send.call_args,
+            mock.call(b"example:12.5|h"))
+
+    def test_timing(self):
+        transport = mock.Mock(spec=metrics.NullTransport)
+        clock = FakeClock()
+        histogram = metrics.Histogram(transport, b"example", clock)
+        with histogram:
+            clock.advance(2)
+        self.assertEqual(transport.send.call_args,
+            mock.call(b"example:2000|h"))
+
+    def test_client_without_aggregation(self):
+        client = metrics.Client(metrics.NullTransport(), "namespace")
+        self.assertIs(type(client.histogram("example")), metrics.Timer)
+        self.assertNotIsInstance(client.batch().histogram("example"),
+                                 metrics.Histogram)
+
+    def test_client_with_aggregation(self):
+        transport = metrics.AggregatingTransport(
+            metrics.NullTransport(), flush_interval=3600)
+        client = metrics.Client(transport, "namespace")
+        self.assertIsInstance(client.histogram("example"), metrics.Histogram)
+        self.assertIsInstance(client.batch().histogram("example"),
+                              metrics.Histogram)
+
+
 class MakeClientTests(unittest.TestCase):
     def test_no_endpoint(self):
         client = metrics.make_client("namespace", None)
@@ -259,3 +868,209 @@ class MakeClientTests(unittest.TestCase):
     def test_valid_endpoint(self):
         client = metrics.make_client("namespace", EXAMPLE_ENDPOINT)
         self.assertIsInstance(client.transport, metrics.RawTransport)
+        self.assertFalse(client.transport.use_sendmmsg)
+
+    def test_sendmmsg(self):
+        client = metrics.make_client(
+            "namespace", EXAMPLE_ENDPOINT, use_sendmmsg=True)
+        self.assertTrue(client.transport.use_sendmmsg)
+
+    def test_aggregate(self):
+        client = metrics.make_client("namespace", None, aggregate_interval=10)
+        self.assertIsInstance(client.transport, metrics.AggregatingTransport)
+        self.assertIsInstance(client.transport.transport, metrics.NullTransport)
+        self.assertEqual(client.transport.flush_interval, 10)
+
+    def test_queued(self):
+        with mock.patch("socket.socket"):
+            client = metrics.make_client(
+                "namespace", EXAMPLE_ENDPOINT, queue_size=10)
+        self.assertIsInstance(client.transport, metrics.QueuedTransport)
+        self.assertIsInstance(client.transport.transport, metrics.RawTransport)
+        self.assertEqual(client.transport.queue.maxsize, 10)
+
+    def test_shared_memory(self):
+        tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tempdir)
+        path = os.path.join(tempdir, "metrics")
+
+        client = metrics.make_client("namespace", None, shared_memory_path=path)
+        self.addCleanup(client.transport.segment.close)
+        self.assertIsInstance(client.transport, metrics.SharedMemoryTransport)
+        self.assertEqual(client.transport.flush_interval, 1)
+
+
+class SharedMemoryTransportTests(unittest.TestCase):
+    def setUp(self):
+        for target in ("threading.Thread", "atexit.register"):
+            patcher = mock.patch(target, autospec=True)
+            self.addCleanup(patcher.stop)
+            patcher.start()
+
+        self.tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tempdir)
+        self.path = os.path.join(self.tempdir, "metrics")
+
+        self.inner = mock.Mock(spec=metrics.NullTransport)
+        self.first = self._make_transport()
+        self.second = self._make_transport()
+
+    def _make_transport(self, **kwargs):
+        transport = metrics.SharedMemoryTransport(
+            self.inner, self.path, flush_interval=3600, slot_count=2,
+            slot_size=16384, **kwargs)
+        self.addCleanup(transport.segment.close)
+        return transport
+
+    def _flushed_lines(self, transport):
+        self.inner.reset_mock()
+        transport.flush()
+        lines = []
+        for args, _ in self.inner.send.call_args_list:
+            lines.extend(args[0].splitlines())
+        for args, _ in self.inner.send_many.call_args_list:
+            for packet in args[0]:
+                lines.extend(packet.splitlines())
+        return sorted(lines)
+
+    def test_separate_slots(self):
+        self.assertEqual(sorted([self.first.slot, self.second.slot]), [0, 1])
+
+    def test_counters(self):
+        self.first.send(b"example:1|c\nother:1|c")
+        self.second.send(b"example:2|c")
+        self.second.send(b"example:1|c|@0.5")
+        self.assertEqual(self.inner.send.call_count, 0)
+
+        self.assertEqual(self._flushed_lines(self.first), [
+            b"example:5|c",
+            b"other:1|c",
+        ])
+
+        self.first.send(b"example:1|c")
+        self.assertEqual(self._flushed_lines(self.first), [b"example:1|c"])
+        self.assertEqual(self._flushed_lines(self.first), [])
+
+    def test_one_reader(self):
+        self.first.send(b"example:1|c")
+        self.assertEqual(self._flushed_lines(self.first), [b"example:1|c"])
+
+        self.second.send(b"example:1|c")
+        self.assertEqual(self._flushed_lines(self.second), [])
+        self.assertEqual(self._flushed_lines(self.first), [b"example:1|c"])
+
+    def test_gauges(self):
+        clock = FakeClock(1.)
+        self.first.clock = self.second.clock = clock
+        self.first.send(b"absolute:10|g\nrelative:+3|g")
+        clock.advance(1.)
+        self.second.send(b"absolute:4|g\nrelative:-1|g")
+        clock.advance(1.)
+        self.first.send(b"absolute:+1|g")
+
+        self.assertEqual(self._flushed_lines(self.first), [
+            b"absolute:5|g",
+            b"relative:+2|g",
+        ])
+
+        self.second.send(b"relative:+1|g")
+        self.assertEqual(self._flushed_lines(self.first), [b"relative:+1|g"])
+
+    def test_gauge_updated_while_collecting(self):
+        self.second.send(b"relative:+1|g")
+
+        read = self.first.segment.read
+
+        def read_then_update(offset, count):
+            values = read(offset, count)
+            if count == 5:
+                self.second.send(b"relative:+5|g")
+            return values
+
+        with mock.patch.object(self.first.segment, "read", read_then_update):
+            self.assertEqual(self._flushed_lines(self.first), [b"relative:+1|g"])
+        self.assertEqual(self._flushed_lines(self.first), [b"relative:+5|g"])
+
+    def test_timers(self):
+        self.first.send(b"example:10|ms\nexample:10|ms")
+        self.second.send(b"example:10|ms|@0.5\nexample:200|ms")
+
+        self.assertEqual(self._flushed_lines(self.first), [
+            b"example:10|ms:10|ms:10|ms:10|ms:200|ms",
+        ])
+
+    def test_histograms(self):
+        self.assertTrue(self.first.summarizes_histograms)
+        for value in range(1, 101):
+            transport = self.first if value % 2 else self.second
+            transport.send("example:{:d}|h".format(value).encode())
+
+        lines = self._flushed_lines(self.first)
+        self.assertEqual(lines[0], b"example.count:100|c")
+        names = [line.split(b":")[0] for line in lines]
+        self.assertEqual(names, [b"example.count", b"example.max",
+                                 b"example.p50", b"example.p90",
+                                 b"example.p99"])
+        p50 = float(lines[2].split(b":")[1].split(b"|")[0])
+        self.assertAlmostEqual(p50, 50, delta=50 * .07)
+
+    def test_unaggregated(self):
+        long_name = b"x" * 300
+        self.first.send(long_name + b":1|c")
+        self.first.send(b"example:1|s\ngarbage")
+
+        self.assertEqual(self._flushed_lines(self.first), [
+            b"example:1|s",
+            b"garbage",
+            long_name + b":1|c",
+        ])
+
+    def test_no_free_slot(self):
+        third = self._make_transport()
+        self.assertIsNone(third.slot)
+
+        third.send(b"example:1|c")
+        self.assertEqual(self._flushed_lines(third), [b"example:1|c"])
+
+    def test_slot_full(self):
+        for i in range(6):
+            self.first.send("timer{:d}:1|ms".format(i).encode())
+
+        lines = self._flushed_lines(self.first)
+        self.assertEqual(len(lines), 6)
+        self.assertIn(b"timer4:1.1|ms", lines)
+        self.assertIn(b"timer5:1|ms", lines)
+
+    def test_forked(self):
+        lock = self.first.lock
+        threading.Thread.reset_mock()
+
+        with mock.patch("os.getpid", return_value=self.first.pid + 1):
+            self.first.send(b"example:1|c")
+            self.assertEqual(self.first.pid, os.getpid())
+        self.assertIsNot(self.first.lock, lock)
+        self.assertEqual(threading.Thread.call_count, 1)
+        self.assertTrue(threading.Thread.return_value.start.called)
+        self.assertEqual(self._flushed_lines(self.first), [b"example:1|c"])
+
+    def test_layout_mismatch(self):
+        with self.assertRaises(ValueError):
+            metrics.SharedMemoryTransport(
+                self.inner, self.path, slot_count=3, slot_size=16384)
+
+    def test_other_process(self):
+        self.path = os.path.join(self.tempdir, "other")
+
+        pid = os.fork()
+        if not pid:  # pragma: nocover
+            try:
+                child = self._make_transport()
+                child.send(b"example:2|c")
+            finally:
+                os._exit(0)
+        os.waitpid(pid, 0)
+
+        reader = self._make_transport()
+        self.assertEqual(reader.slot, 1)
+        reader.send(b"example:1|c")
+        self.assertEqual(self._flushed_lines(reader), [b"example:3|c"])
@@ -6,6 +6,7 @@ from __future__ import unicode_literals
 import itertools
 import unittest
 
+from baseplate.clock import FakeClock
 from baseplate.retry import (
     ExponentialBackoffRetryPolicy,
     IndefiniteRetryPolicy,
@@ -30,27 +31,27 @@ class RetryPolicyTests(unittest.TestCase):
         with self.assertRaises(StopIteration):
             next(retries)
 
-    @mock.patch("time.time", autospec=True)
-    def test_time_budget(self, time):
-        policy = TimeBudgetRetryPolicy(IndefiniteRetryPolicy(), budget=5)
+    def test_time_budget(self):
+        clock = FakeClock()
+        policy = TimeBudgetRetryPolicy(IndefiniteRetryPolicy(), budget=5, clock=clock)
 
-        time.return_value = 0
+        clock.time = 0
         retries = iter(policy)
         self.assertEqual(next(retries), 5)
 
-        time.return_value = 3
+        clock.time = 3
         for _ in range(100):
             self.assertEqual(next(retries), 2)
 
-        time.return_value = 7
+        clock.time = 7
         with self.assertRaises(StopIteration):
             next(retries)
 
-    @mock.patch("time.time", autospec=True)
-    def test_time_budget_always_executes_at_least_once(self, time):
-        policy = TimeBudgetRetryPolicy(IndefiniteRetryPolicy(), budget=0)
+    def test_time_budget_always_executes_at_least_once(self):
+        clock = FakeClock()
+        policy = TimeBudgetRetryPolicy(IndefiniteRetryPolicy(), budget=0, clock=clock)
 
-        time.return_value = 0
+        clock.time = 0
         retries = iter(policy)
         self.assertEqual(next(retries), 0)
 
@@ -101,27 +102,27 @@ class ComplexPolicyTests(unittest.TestCase):
         with self.assertRaises(StopIteration):
             next(retries)
 
-    @mock.patch("time.time", autospec=True)
     @mock.patch("time.sleep", autospec=True)
-    def test_budget_overrides_backoff(self, sleep, time):
-        policy = RetryPolicy.new(backoff=0.1, budget=1)
+    def test_budget_overrides_backoff(self, sleep):
+        clock = FakeClock()
+        policy = RetryPolicy.new(backoff=0.1, budget=1, clock=clock)
 
-        time.return_value = 0
+        clock.time = 0
         retries = iter(policy)
         time_remaining = next(retries)
         self.assertAlmostEqual(time_remaining, 1)
         self.assertEqual(sleep.call_count, 0)
 
-        time.return_value = .5
+        clock.time = .5
         time_remaining = next(retries)
         self.assertAlmostEqual(time_remaining, .4)
         sleep.assert_called_with(.1)
 
-        time.return_value = .9
+        clock.time = .9
         time_remaining = next(retries)
         self.assertAlmostEqual(time_remaining, 0)
         self.assertAlmostEqual(sleep.call_args[0][0], 0.1, places=2)
 
-        time.return_value = 1
+        clock.time = 1
         with self.assertRaises(StopIteration):
             next(retries)
@@ -3,10 +3,11 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import logging
 import socket
 import unittest
 
-from baseplate import config, server
+from baseplate import config, metrics, server
 
 from ... import mock
 
@@ -29,15 +30,15 @@ class ParseArgsTests(unittest.TestCase):
         self.assertEqual(mock_file.call_args, mock.call("filename"))
         self.assertEqual(args.config_file, mock_file.return_value)
 
-    @mock.patch("argparse.FileType", autospec=True)
-    def test_options(self, make_file):
-        args = server.parse_args([
-            "filename",
-            "--debug",
-            "--app-name", "app",
-            "--server-name", "server",
-            "--bind", "1.2.3.4:81",
-        ])
+    def test_options(self):
+        with mock.patch("argparse.FileType", autospec=True):
+            args = server.parse_args([
+                "filename",
+                "--debug",
+                "--app-name", "app",
+                "--server-name", "server",
+                "--bind", "1.2.3.4:81",
+            ])
         self.assertTrue(args.debug)
         self.assertEqual(args.app_name, "app")
         self.assertEqual(args.server_name, "server")
@@ -56,10 +57,10 @@ class MakeListenerTests(unittest.TestCase):
         self.assertEqual(listener, get_socket.return_value)
 
     @mock.patch.dict("os.environ", {}, clear=True)
-    @mock.patch("fcntl.fcntl")
     @mock.patch("socket.socket")
-    def test_manually_bound(self, mocket, fcntl):
-        listener = server.make_listener(EXAMPLE_ENDPOINT)
+    def test_manually_bound(self, mocket):
+        with mock.patch("fcntl.fcntl"):
+            listener = server.make_listener(EXAMPLE_ENDPOINT)
 
         self.assertEqual(mocket.call_args,
             mock.call(socket.AF_INET, socket.SOCK_STREAM))
@@ -82,3 +83,63 @@ class LoadFactoryTests(unittest.TestCase):
 
         self.assertEqual(import_module.call_args, mock.call("package.module"))
         self.assertEqual(factory, import_module.return_value.default_name)
+
+
+class ConfigureLoggingTests(unittest.TestCase):
+    def setUp(self):
+        root_logger = logging.getLogger()
+        self.addCleanup(setattr, root_logger, "handlers", root_logger.handlers[:])
+        self.addCleanup(root_logger.setLevel, root_logger.level)
+        self.addCleanup(logging.captureWarnings, False)
+
+    def configure(self, server_config):
+        server.configure_logging(server.Configuration(
+            filename="example.ini", server=server_config, app={},
+            has_logging_options=False), debug=False)
+        return logging.getLogger().handlers[-1]
+
+    def test_stream_handler(self):
+        handler = self.configure({})
+        self.assertIs(type(handler), logging.StreamHandler)
+
+    def test_no_server_config(self):
+        handler = self.configure(None)
+        self.assertIs(type(handler), logging.StreamHandler)
+
+    @mock.patch("baseplate.diagnostics.logging.NonBlockingHandler")
+    def test_queued(self, handler_cls):
+        handler = self.configure({"log_queue_size": "500"})
+
+        handler_cls.assert_called_once_with(max_queue_size=500)
+        self.assertEqual(handler, handler_cls.return_value)
+        self.assertTrue(handler.addFilter.called)
+        formatter = handler.setFormatter.call_args[0][0]
+        self.assertIn("%(trace_id)s", formatter._fmt)
+
+
+class StartWatchdogTests(unittest.TestCase):
+    def test_not_configured(self):
+        self.assertIsNone(server.start_watchdog({}, {}))
+
+    @mock.patch("baseplate.server.watchdog.HubBlockingWatchdog", autospec=True)
+    def test_configured(self, watchdog_cls):
+        watchdog = server.start_watchdog(
+            {"blocked_hub_threshold": "200 milliseconds"}, {})
+
+        watchdog_cls.assert_called_once_with(
+            threshold=.2, metrics_client=None)
+        self.assertEqual(watchdog, watchdog_cls.return_value)
+        watchdog.start.assert_called_once_with()
+
+    @mock.patch("baseplate.server.watchdog.HubBlockingWatchdog", autospec=True)
+    def test_plain_metrics_client(self, watchdog_cls):
+        server.start_watchdog({"blocked_hub_threshold": "200 milliseconds"}, {
+            "metrics.namespace": "example",
+            "metrics.endpoint": "127.0.0.1:8125",
+            "metrics.queue_size": "100",
+            "metrics.shared_memory_path": "/dev/shm/example",
+        })
+
+        metrics_client = watchdog_cls.call_args[1]["metrics_client"]
+        self.assertEqual(metrics_client.namespace, b"example")
+        self.assertIsInstance(metrics_client.transport, metrics.RawTransport)
@@ -0,0 +1,112 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import threading
+import unittest
+
+from baseplate.clock import FakeClock
+from baseplate.server.watchdog import HubBlockingWatchdog
+
+try:
+    from threading import get_ident
+except ImportError:  # pragma: nocover
+    from thread import get_ident
+
+from ... import mock
+
+
+def blocking_call(watchdog):
+    watchdog._check()
+
+
+class HubBlockingWatchdogTests(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.metrics_client = mock.MagicMock()
+        self.watchdog = HubBlockingWatchdog(
+            threshold=.1, metrics_client=self.metrics_client, log_interval=60,
+            clock=self.clock)
+        self.watchdog.main_thread_id = get_ident()
+
+        logger_patcher = mock.patch("baseplate.server.watchdog.logger")
+        self.addCleanup(logger_patcher.stop)
+        self.logger = logger_patcher.start()
+
+    @property
+    def batch(self):
+        return self.metrics_client.batch.return_value.__enter__.return_value
+
+    def test_not_blocked(self):
+        self.clock.advance(.05)
+        self.watchdog._check()
+        self.clock.advance(.01)
+        self.watchdog._on_heartbeat()
+
+        self.assertIsNone(self.watchdog.blocked_stack)
+        self.assertFalse(self.metrics_client.batch.called)
+        self.assertFalse(self.logger.warning.called)
+
+    def test_blocked(self):
+        self.clock.advance(.5)
+        blocking_call(self.watchdog)
+        self.assertIn("blocking_call", "".join(self.watchdog.blocked_stack))
+
+        self.clock.advance(.1)
+        self.watchdog._on_heartbeat()
+
+        self.batch.counter.assert_called_once_with("runtime.gevent.blocked")
+        self.batch.counter.return_value.increment.assert_called_once_with()
+        self.batch.timer.assert_called_once_with("runtime.gevent.blocked_time")
+        elapsed = self.batch.timer.return_value.send.call_args[0][0]
+        self.assertAlmostEqual(elapsed, .55)
+
+        self.assertEqual(self.logger.warning.call_count, 1)
+        self.assertIn("blocking_call", self.logger.warning.call_args[0][-1])
+        self.assertIsNone(self.watchdog.blocked_stack)
+
+    def test_captures_once_per_stall(self):
+        self.clock.advance(.5)
+        self.watchdog._check()
+        first_stack = self.watchdog.blocked_stack
+        blocking_call(self.watchdog)
+        self.assertIs(self.watchdog.blocked_stack, first_stack)
+
+    def test_captured_as_hub_unblocked(self):
+        self.watchdog.blocked_stack = ["innocent code"]
+        self.clock.advance(.06)
+        self.watchdog._on_heartbeat()
+
+        self.assertFalse(self.metrics_client.batch.called)
+        self.assertFalse(self.logger.warning.called)
+        self.assertIsNone(self.watchdog.blocked_stack)
+
+    def test_log_rate_limit(self):
+        for _ in range(3):
+            self.clock.advance(.5)
+            self.watchdog._check()
+            self.watchdog._on_heartbeat()
+
+        self.assertEqual(self.metrics_client.batch.call_count, 3)
+        self.assertEqual(self.logger.warning.call_count, 1)
+        self.assertEqual(self.watchdog.suppressed, 2)
+
+        self.clock.advance(60)
+        self.watchdog._check()
+        self.watchdog._on_heartbeat()
+
+        self.assertEqual(self.logger.warning.call_count, 2)
+        self.assertEqual(self.logger.warning.call_args[0][2], 2)
+        self.assertEqual(self.watchdog.suppressed, 0)
+
+    def test_other_thread_stack(self):
+        thread = threading.Thread(target=self.watchdog._check)
+
+        self.clock.advance(.5)
+        thread.start()
+        thread.join()
+
+        # the stack is the main thread's, not the watchdog thread's.
+        self.assertIn("test_other_thread_stack",
+                      "".join(self.watchdog.blocked_stack))
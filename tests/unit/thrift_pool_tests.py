@@ -8,6 +8,7 @@ import unittest
 
 from baseplate import config, thrift_pool
 from baseplate._compat import queue
+from baseplate.clock import FakeClock
 from thrift.Thrift import TException
 from thrift.transport import TTransport, THeaderTransport
 from thrift.protocol import THeaderProtocol
@@ -47,7 +48,9 @@ class MakeProtocolTests(unittest.TestCase):
 class ThriftConnectionPoolTests(unittest.TestCase):
     def setUp(self):
         self.mock_queue = mock.Mock(spec=queue.Queue)
-        self.pool = thrift_pool.ThriftConnectionPool(EXAMPLE_ENDPOINT)
+        self.clock = FakeClock()
+        self.pool = thrift_pool.ThriftConnectionPool(
+            EXAMPLE_ENDPOINT, clock=self.clock)
         self.pool.pool = self.mock_queue
 
     def test_pool_empty_timeout(self):
@@ -56,9 +59,8 @@ class ThriftConnectionPoolTests(unittest.TestCase):
         with self.assertRaises(TTransport.TTransportException):
             self.pool._acquire()
 
-    @mock.patch("time.time")
-    def test_pool_has_valid_connection(self, mock_time):
-        mock_time.return_value = 123
+    def test_pool_has_valid_connection(self):
+        self.clock.time = 123
         mock_prot = mock.Mock(spec=THeaderProtocol.THeaderProtocol)
         mock_prot.baseplate_birthdate = 122
         self.mock_queue.get.return_value = mock_prot
@@ -68,15 +70,14 @@ class ThriftConnectionPoolTests(unittest.TestCase):
         self.assertEqual(prot, mock_prot)
 
     @mock.patch("baseplate.thrift_pool._make_protocol")
-    @mock.patch("time.time")
-    def test_pool_closes_stale_connection(self, mock_time, mock_make_protocol):
+    def test_pool_closes_stale_connection(self, mock_make_protocol):
         stale_prot = mock.Mock(spec=THeaderProtocol.THeaderProtocol)
         stale_prot.trans = mock.Mock(spec=THeaderTransport.THeaderTransport)
         fresh_prot = mock.Mock(spec=THeaderProtocol.THeaderProtocol)
         fresh_prot.trans = mock.Mock(spec=THeaderTransport.THeaderTransport)
 
         stale_prot.baseplate_birthdate = 10
-        mock_time.return_value = 200
+        self.clock.time = 200
         self.mock_queue.get.return_value = stale_prot
         mock_make_protocol.return_value = fresh_prot
 
@@ -86,10 +87,9 @@ class ThriftConnectionPoolTests(unittest.TestCase):
         self.assertEqual(prot, fresh_prot)
 
     @mock.patch("baseplate.thrift_pool._make_protocol")
-    @mock.patch("time.time")
-    def test_retry_on_failed_connect(self, mock_time, mock_make_protocol):
+    def test_retry_on_failed_connect(self, mock_make_protocol):
         self.mock_queue.get.return_value = None
-        mock_time.return_value = 200
+        self.clock.time = 200
 
         broken_prot = mock.Mock(spec=THeaderProtocol.THeaderProtocol)
         broken_prot.baseplate_birthdate = 200
@@ -108,10 +108,9 @@ class ThriftConnectionPoolTests(unittest.TestCase):
         self.assertEqual(ok_prot.trans.open.call_count, 1)
 
     @mock.patch("baseplate.thrift_pool._make_protocol")
-    @mock.patch("time.time")
-    def test_max_retry_on_connect(self, mock_time, mock_make_protocol):
+    def test_max_retry_on_connect(self, mock_make_protocol):
         self.mock_queue.get.return_value = None
-        mock_time.return_value = 200
+        self.clock.time = 200
 
         broken_prot = mock.Mock(spec=THeaderProtocol.THeaderProtocol)
         broken_prot.baseplate_birthdate = 200
@@ -143,9 +142,8 @@ class ThriftConnectionPoolTests(unittest.TestCase):
         self.assertEqual(self.mock_queue.put.call_count, 1)
         self.assertEqual(self.mock_queue.put.call_args, mock.call(None))
 
-    @mock.patch("time.time")
-    def test_context_normal(self, mock_time):
-        mock_time.return_value = 123
+    def test_context_normal(self):
+        self.clock.time = 123
         mock_prot = mock.Mock(spec=THeaderProtocol.THeaderProtocol)
         mock_prot.baseplate_birthdate = 122
         mock_prot.trans = mock.Mock(spec=THeaderTransport.THeaderTransport)
@@ -160,9 +158,8 @@ class ThriftConnectionPoolTests(unittest.TestCase):
         self.assertEqual(self.mock_queue.put.call_count, 1)
         self.assertEqual(self.mock_queue.put.call_args, mock.call(mock_prot))
 
-    @mock.patch("time.time")
-    def test_context_thrift_exception(self, mock_time):
-        mock_time.return_value = 123
+    def test_context_thrift_exception(self):
+        self.clock.time = 123
         mock_prot = mock.Mock(spec=THeaderProtocol.THeaderProtocol)
         mock_prot.baseplate_birthdate = 122
         mock_prot.trans = mock.Mock(spec=THeaderTransport.THeaderTransport)
@@ -180,9 +177,8 @@ class ThriftConnectionPoolTests(unittest.TestCase):
         self.assertEqual(self.mock_queue.put.call_count, 1)
         self.assertEqual(self.mock_queue.put.call_args, mock.call(None))
 
-    @mock.patch("time.time")
-    def test_context_non_thrift_exception(self, mock_time):
-        mock_time.return_value = 123
+    def test_context_non_thrift_exception(self):
+        self.clock.time = 123
         mock_prot = mock.Mock(spec=THeaderProtocol.THeaderProtocol)
         mock_prot.baseplate_birthdate = 122
         mock_prot.trans = mock.Mock(spec=THeaderTransport.THeaderTransport)